@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-"""PostToolUse hook — pop pending, compute duration, log tool_end."""
+"""PostToolUse hook — pop pending, compute duration, log tool_end (or tool_span)."""
 
 import json
 import sys
@@ -9,14 +9,16 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
 
 from telemetry import (
-    read_hook_input, is_enabled, write_event,
+    Deadline, read_hook_input, load_plan, write_event,
     sanitize_tool_result, pop_pending,
 )
 
 
 def main():
-    hook_input = read_hook_input()
-    if not is_enabled():
+    deadline = Deadline("post_tool_use")
+    plan = load_plan()
+    hook_input = read_hook_input(plan)
+    if not plan.enabled:
         return
 
     session_id = hook_input.get("session_id", "unknown")
@@ -36,12 +38,26 @@ def main():
 
     result_info = sanitize_tool_result(tool_result)
 
-    write_event("tool_end", session_id, {
+    data = {
         "tool_name": tool_name,
         "correlation_id": correlation_id,
         "duration_ms": round(duration_ms, 1) if duration_ms is not None else None,
         "result_size": result_info.get("size"),
-    })
+    }
+
+    if plan.span_mode:
+        data["started_ts"] = pending.get("started_ts") if pending else None
+        data["input_preview"] = pending.get("input_preview") if pending else None
+        write_event(
+            "tool_span", session_id, data,
+            cwd=hook_input.get("cwd"), plan=plan, deadline=deadline,
+        )
+        return
+
+    write_event(
+        "tool_end", session_id, data,
+        cwd=hook_input.get("cwd"), plan=plan, deadline=deadline,
+    )
 
 
 if __name__ == "__main__":
@@ -7,17 +7,22 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
 
-from telemetry import read_hook_input, is_enabled, write_event
+from telemetry import Deadline, read_hook_input, load_plan, write_event
 
 
 def main():
-    hook_input = read_hook_input()
-    if not is_enabled():
+    deadline = Deadline("pre_compact")
+    plan = load_plan()
+    hook_input = read_hook_input(plan)
+    if not plan.enabled:
         return
 
     session_id = hook_input.get("session_id", "unknown")
 
-    write_event("pre_compact", session_id, {})
+    write_event(
+        "pre_compact", session_id, {},
+        cwd=hook_input.get("cwd"), plan=plan, deadline=deadline,
+    )
 
 
 if __name__ == "__main__":
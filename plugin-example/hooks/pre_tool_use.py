@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-"""PreToolUse hook — push to pending stack, log tool_start."""
+"""PreToolUse hook — push to pending stack, log tool_start (pair mode only)."""
 
 import json
 import sys
@@ -8,22 +8,29 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
 
 from telemetry import (
-    read_hook_input, is_enabled, load_config, write_event,
+    Deadline, read_hook_input, load_plan, write_event,
     sanitize_tool_input, push_pending, generate_correlation_id,
 )
 
 
 def main():
-    hook_input = read_hook_input()
-    if not is_enabled():
+    deadline = Deadline("pre_tool_use")
+    plan = load_plan()
+    hook_input = read_hook_input(plan)
+    if not plan.enabled:
         return
 
     session_id = hook_input.get("session_id", "unknown")
     tool_name = hook_input.get("tool_name", "unknown")
     tool_input = hook_input.get("tool_input")
 
-    config = load_config()
     correlation_id = generate_correlation_id()
+    input_preview = sanitize_tool_input(tool_input, plan)
+
+    # Span mode: only record the pending entry, PostToolUse writes the event
+    if plan.span_mode:
+        push_pending(session_id, tool_name, correlation_id, input_preview)
+        return
 
     # Push to pending stack for PostToolUse correlation
     push_pending(session_id, tool_name, correlation_id)
@@ -31,8 +38,8 @@ def main():
     write_event("tool_start", session_id, {
         "tool_name": tool_name,
         "correlation_id": correlation_id,
-        "input_preview": sanitize_tool_input(tool_input, config),
-    })
+        "input_preview": input_preview,
+    }, cwd=hook_input.get("cwd"), plan=plan, deadline=deadline)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
-"""SessionEnd hook — record session end, compute duration, run retention cleanup."""
+"""SessionEnd hook — record session end, compute duration, kick off due maintenance."""
 
 import json
-import os
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
@@ -10,14 +9,18 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
 
 from telemetry import (
-    read_hook_input, is_enabled, write_event, update_session_index,
-    load_config, cleanup_old_events, flush_push_queue, SESSIONS_PATH, PENDING_DIR,
+    Deadline, SESSION_HOOK_TIMEOUT_S,
+    read_hook_input, load_plan, write_event, update_session_index,
+    SESSIONS_PATH, PENDING_DIR,
 )
+from maintenance import maybe_spawn_maintenance
 
 
 def main():
-    hook_input = read_hook_input()
-    if not is_enabled():
+    deadline = Deadline("session_end", SESSION_HOOK_TIMEOUT_S)
+    plan = load_plan()
+    hook_input = read_hook_input(plan)
+    if not plan.enabled:
         return
 
     session_id = hook_input.get("session_id", "unknown")
@@ -38,13 +41,13 @@ def main():
 
     write_event("session_end", session_id, {
         "duration_ms": duration_ms,
-    })
+    }, cwd=hook_input.get("cwd"), plan=plan, deadline=deadline)
 
     update_session_index(session_id, {
         "ended_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
         "duration_ms": duration_ms,
         "status": "ended",
-    })
+    }, deadline=deadline, plan=plan)
 
     # Cleanup pending file for this session
     pending_file = PENDING_DIR / f"{session_id}.json"
@@ -54,23 +57,9 @@ def main():
         except OSError:
             pass
 
-    # Flush queued events to SaaS (non-blocking via fork)
-    config = load_config()
-    if config.get("api_key"):
-        try:
-            pid = os.fork()
-            if pid == 0:
-                try:
-                    flush_push_queue()
-                except Exception:
-                    pass
-                os._exit(0)
-        except OSError:
-            pass
-
-    # Retention cleanup
-    retention_days = config.get("retention_days", 30)
-    cleanup_old_events(retention_days)
+    # Push flush, retention, pending sweep, index compaction and cache
+    # warming run in a detached worker, each at most once per interval
+    maybe_spawn_maintenance(plan)
 
 
 if __name__ == "__main__":
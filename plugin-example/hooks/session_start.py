@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-"""SessionStart hook — record session begin + initialize session index."""
+"""SessionStart hook — set up defaults, record session begin + initialize session index."""
 
 import json
 import sys
@@ -7,12 +7,19 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
 
-from telemetry import read_hook_input, is_enabled, write_event, update_session_index
+from telemetry import (
+    Deadline, SESSION_HOOK_TIMEOUT_S,
+    read_hook_input, ensure_default_config, load_plan, write_event, update_session_index,
+)
 
 
 def main():
-    hook_input = read_hook_input()
-    if not is_enabled():
+    deadline = Deadline("session_start", SESSION_HOOK_TIMEOUT_S)
+    # Setup step: the only hook that may create the telemetry dir and config
+    ensure_default_config()
+    plan = load_plan()
+    hook_input = read_hook_input(plan)
+    if not plan.enabled:
         return
 
     session_id = hook_input.get("session_id", "unknown")
@@ -20,7 +27,7 @@ def main():
 
     write_event("session_start", session_id, {
         "cwd": cwd,
-    })
+    }, cwd=cwd, plan=plan, deadline=deadline)
 
     update_session_index(session_id, {
         "started_at": __import__("datetime").datetime.now(
@@ -28,7 +35,7 @@ def main():
         ).isoformat(timespec="milliseconds"),
         "cwd": cwd,
         "status": "active",
-    })
+    }, deadline=deadline, plan=plan)
 
 
 if __name__ == "__main__":
@@ -7,12 +7,14 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
 
-from telemetry import read_hook_input, is_enabled, write_event, parse_agent_transcript
+from telemetry import Deadline, read_hook_input, load_plan, write_event, parse_agent_transcript
 
 
 def main():
-    hook_input = read_hook_input()
-    if not is_enabled():
+    deadline = Deadline("subagent_stop")
+    plan = load_plan()
+    hook_input = read_hook_input(plan)
+    if not plan.enabled:
         return
 
     session_id = hook_input.get("session_id", "unknown")
@@ -23,15 +25,22 @@ def main():
     # Parse the agent's transcript to extract tool usage breakdown
     tool_summary = {}
     if transcript_path:
-        tool_summary = parse_agent_transcript(transcript_path)
+        tool_summary = parse_agent_transcript(transcript_path, deadline)
 
-    write_event("subagent_stop", session_id, {
+    data = {
         "agent_type": agent_type,
         "reason": stop_reason,
         "tool_counts": tool_summary.get("tool_counts", {}),
         "tool_count_total": tool_summary.get("total_tools", 0),
         "turns": tool_summary.get("turns", 0),
-    })
+    }
+    if tool_summary.get("truncated"):
+        data["transcript_truncated"] = True  # counts cover only part of the transcript
+
+    write_event(
+        "subagent_stop", session_id, data,
+        cwd=hook_input.get("cwd"), plan=plan, deadline=deadline,
+    )
 
 
 if __name__ == "__main__":
@@ -7,29 +7,28 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent / "lib"))
 
-from telemetry import read_hook_input, is_enabled, load_config, write_event
+from telemetry import Deadline, read_hook_input, load_plan, write_event
 
 
 def main():
-    hook_input = read_hook_input()
-    if not is_enabled():
+    deadline = Deadline("user_prompt_submit")
+    plan = load_plan()
+    hook_input = read_hook_input(plan)
+    if not plan.enabled:
         return
 
     session_id = hook_input.get("session_id", "unknown")
     prompt = hook_input.get("prompt", "")
 
-    config = load_config()
-    log_content = config.get("privacy", {}).get("log_prompt_content", False)
-
     data = {
         "prompt_length": len(prompt),
         "word_count": len(prompt.split()),
     }
 
-    if log_content:
+    if plan.log_prompt_content:
         data["prompt"] = prompt
 
-    write_event("prompt", session_id, data)
+    write_event("prompt", session_id, data, cwd=hook_input.get("cwd"), plan=plan, deadline=deadline)
 
 
 if __name__ == "__main__":
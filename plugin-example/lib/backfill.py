@@ -0,0 +1,283 @@
+"""
+Historical backfill — replays local day files to the SaaS.
+
+Streams ``events-YYYY-MM-DD.jsonl`` files from a saved byte offset, maps each
+event with ``to_saas_event`` and POSTs full batches through ``_post_batch``,
+holding at most one batch in memory. Progress is checkpointed after every
+accepted batch, so an interrupted run resumes where it stopped. Every event
+carries a stable ``event_id``; the server skips ids it already has, so
+re-sending a batch (or the whole history) never double-counts.
+
+Usage:
+    python3 backfill.py --days 90
+    python3 backfill.py --from 2026-01-01 --to 2026-03-31 --batch-size 1000
+    python3 backfill.py --reset --max-requests-per-min 60
+"""
+
+import argparse
+import json
+import time
+import urllib.error
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from telemetry import (
+    TELEMETRY_DIR, EventDecoder, SinkPlan, _post_batch, atomic_write, load_plan, to_saas_event,
+)
+
+BACKFILL_STATE_PATH = TELEMETRY_DIR / ".backfill_state.json"
+
+# Endpoint limits: 1000 events per request, 200 requests per minute per key.
+MAX_BATCH = 1000
+DEFAULT_MAX_REQUESTS_PER_MIN = 180
+MAX_RETRIES = 6
+MAX_BACKOFF_S = 60.0
+
+
+class BackfillAborted(Exception):
+    """Raised when the endpoint keeps failing; progress so far is saved."""
+
+
+# --- Checkpoint state ---
+
+def load_state(path: Path = BACKFILL_STATE_PATH) -> dict:
+    try:
+        state = json.loads(path.read_text())
+        if isinstance(state, dict):
+            state.setdefault("files", {})
+            state.setdefault("skipped_batches", [])
+            return state
+    except (json.JSONDecodeError, OSError):
+        pass
+    return {"files": {}, "skipped_batches": []}
+
+
+def save_state(state: dict, path: Path = BACKFILL_STATE_PATH, plan: SinkPlan | None = None) -> None:
+    """Write the checkpoint atomically so a crash never leaves it half-written."""
+    try:
+        atomic_write(path, json.dumps(state, indent=2), (plan or load_plan()).fsync)
+    except OSError:
+        pass
+
+
+# --- Reading ---
+
+def day_files_between(start: str, end: str, root: Path = TELEMETRY_DIR) -> list[Path]:
+    """Day files with start <= date <= end (YYYY-MM-DD), oldest first."""
+    return [
+        f for f in sorted(root.glob("events-*.jsonl"))
+        if start <= f.stem.replace("events-", "") <= end
+    ]
+
+
+def iter_batches(path: Path, offset: int, batch_size: int):
+    """Yield ``(saas_events, end_offset, corrupt_lines)`` from ``offset`` on.
+
+    Only newline-terminated lines are consumed, so a line still being
+    appended is left for the next run. Unparseable lines are counted and
+    skipped rather than ending the file. For v2 files the intern
+    declarations before ``offset`` are replayed first.
+    """
+    decoder = EventDecoder()
+    batch, corrupt = [], 0
+    with open(path, "rb") as f:
+        if offset:
+            seen = 0
+            for line in f:
+                seen += len(line)
+                if seen > offset:
+                    break
+                if line.startswith(b'{"i"'):
+                    try:
+                        decoder.feed(line)
+                    except ValueError:
+                        pass
+        f.seek(offset)
+        pos = offset
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            try:
+                event = decoder.feed(line)
+                if event is None:
+                    continue
+                batch.append(to_saas_event(event))
+            except (ValueError, KeyError, IndexError, TypeError):
+                corrupt += 1
+                continue
+            if len(batch) >= batch_size:
+                yield batch, pos, corrupt
+                batch, corrupt, offset = [], 0, pos
+        if pos != offset:
+            yield batch, pos, corrupt
+
+
+# --- Sending ---
+
+class _Pacer:
+    """Spaces requests to stay under both an events/s and a requests/min budget."""
+
+    def __init__(self, max_events_per_sec: float | None, max_requests_per_min: float | None):
+        self.max_eps = max_events_per_sec
+        self.max_rpm = max_requests_per_min
+        self._next_at = 0.0
+
+    def wait(self, batch_len: int) -> None:
+        now = time.monotonic()
+        if self._next_at > now:
+            time.sleep(self._next_at - now)
+        gap = 0.0
+        if self.max_rpm:
+            gap = max(gap, 60.0 / self.max_rpm)
+        if self.max_eps:
+            gap = max(gap, batch_len / self.max_eps)
+        self._next_at = max(now, self._next_at) + gap
+
+
+def _retry_after(err: urllib.error.HTTPError) -> float | None:
+    try:
+        body = json.loads(err.read())
+        return float(body["error"]["details"]["retryAfter"])
+    except (ValueError, KeyError, TypeError, OSError):
+        header = err.headers.get("Retry-After") if err.headers else None
+        try:
+            return float(header) if header else None
+        except ValueError:
+            return None
+
+
+def _send(api_url: str, api_key: str, batch: list, pacer: _Pacer, stats: dict) -> str | None:
+    """POST one batch, retrying 429s and transient failures.
+
+    Returns None once accepted, or the rejection reason for a 400 (the batch
+    is then skipped). Raises ``BackfillAborted`` on auth errors or when the
+    retry budget runs out.
+    """
+    attempt = 0
+    while True:
+        pacer.wait(len(batch))
+        stats["requests"] += 1
+        try:
+            data = _post_batch(api_url, api_key, batch)
+            stats["sent"] += data.get("inserted", len(batch))
+            stats["duplicates"] += data.get("skipped", 0)
+            return None
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                stats["rate_limited"] += 1
+                time.sleep(_retry_after(e) or 1.0)
+                continue
+            if e.code == 400:
+                try:
+                    return json.loads(e.read())["error"]["message"]
+                except (ValueError, KeyError, TypeError, OSError):
+                    return "HTTP 400"
+            if e.code in (401, 403):
+                raise BackfillAborted(f"API key rejected (HTTP {e.code})")
+            reason = f"HTTP {e.code}"
+        except (urllib.error.URLError, OSError, RuntimeError) as e:
+            reason = str(e)
+        attempt += 1
+        if attempt > MAX_RETRIES:
+            raise BackfillAborted(f"giving up after {MAX_RETRIES} retries: {reason}")
+        stats["retries"] += 1
+        time.sleep(min(2 ** (attempt - 1), MAX_BACKOFF_S))
+
+
+def backfill(
+    start: str,
+    end: str,
+    batch_size: int = MAX_BATCH,
+    max_events_per_sec: float | None = None,
+    max_requests_per_min: float | None = DEFAULT_MAX_REQUESTS_PER_MIN,
+    reset: bool = False,
+    root: Path = TELEMETRY_DIR,
+    state_path: Path = BACKFILL_STATE_PATH,
+) -> dict:
+    """Push every local event dated ``start``..``end`` to the SaaS. Returns stats."""
+    plan = load_plan()
+    api_url = plan.api_url
+    api_key = plan.api_key
+    if not api_url or not api_key:
+        return {"status": "skipped", "reason": "no api_url or api_key configured"}
+
+    batch_size = max(1, min(batch_size, MAX_BATCH))
+    state = {"files": {}, "skipped_batches": []} if reset else load_state(state_path)
+    pacer = _Pacer(max_events_per_sec, max_requests_per_min)
+    stats = {
+        "status": "ok", "files": 0, "sent": 0, "duplicates": 0, "corrupt": 0,
+        "skipped": 0, "requests": 0, "retries": 0, "rate_limited": 0,
+    }
+    started = time.monotonic()
+
+    try:
+        for path in day_files_between(start, end, root):
+            stats["files"] += 1
+            entry = state["files"].setdefault(path.name, {"offset": 0})
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            if entry["offset"] > size:  # file was rewritten; start over
+                entry["offset"] = 0
+            if entry["offset"] == size:
+                continue
+            for batch, end_offset, corrupt in iter_batches(path, entry["offset"], batch_size):
+                stats["corrupt"] += corrupt
+                if batch:
+                    reason = _send(api_url, api_key, batch, pacer, stats)
+                    if reason is not None:
+                        stats["skipped"] += len(batch)
+                        state["skipped_batches"].append({
+                            "file": path.name, "offset": entry["offset"],
+                            "end": end_offset, "events": len(batch), "reason": reason,
+                        })
+                entry["offset"] = end_offset
+                save_state(state, state_path, plan)
+    except BackfillAborted as e:
+        stats["status"] = "aborted"
+        stats["reason"] = str(e)
+    except OSError as e:
+        stats["status"] = "error"
+        stats["reason"] = str(e)
+    finally:
+        save_state(state, state_path, plan)
+
+    elapsed = time.monotonic() - started
+    stats["elapsed_s"] = round(elapsed, 2)
+    stats["events_per_s"] = round(stats["sent"] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+# --- CLI ---
+
+def main(argv: list[str] | None = None) -> None:
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    parser = argparse.ArgumentParser(description="Backfill local telemetry history to the SaaS.")
+    parser.add_argument("--from", dest="start", help="first day (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", default=today,
+                        help="last day (YYYY-MM-DD, default: today)")
+    parser.add_argument("--days", type=int, default=30,
+                        help="when --from is omitted, start this many days back (default: 30)")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-events-per-sec", type=float)
+    parser.add_argument("--max-requests-per-min", type=float, default=DEFAULT_MAX_REQUESTS_PER_MIN)
+    parser.add_argument("--reset", action="store_true", help="ignore saved progress and start over")
+    args = parser.parse_args(argv)
+
+    start = args.start or (
+        datetime.now(timezone.utc) - timedelta(days=args.days)
+    ).strftime("%Y-%m-%d")
+    stats = backfill(
+        start, args.end,
+        batch_size=args.batch_size,
+        max_events_per_sec=args.max_events_per_sec,
+        max_requests_per_min=args.max_requests_per_min,
+        reset=args.reset,
+    )
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Hook benchmark — latency of the real hook scripts at each durability level.
+
+Runs simulated sessions (session_start, a few PreToolUse/PostToolUse pairs,
+session_end) through the hook scripts as subprocesses, the way Claude Code
+invokes them, against a throwaway HOME per level. Several sessions run at
+once so "group_commit" gets to share fsyncs between processes. Background
+maintenance is disabled so only the hook itself is timed. Interpreter
+start-up dominates a hook's wall time, so the write path is also timed on
+its own: ``write_event`` in a loop, in a child process using the same HOME.
+
+Point --dir at the disk ~/.claude lives on: on a tmpfs fsync is free and
+every level looks the same.
+
+Usage:
+    python3 bench_hooks.py
+    python3 bench_hooks.py --dir ~/bench --sessions 40 --parallel 8 --push
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from telemetry import DEFAULT_CONFIG
+
+HOOKS_DIR = Path(__file__).resolve().parent.parent / "hooks"
+LEVELS = ("none", "buffered", "group_commit")
+HOOKS = ("session_start", "pre_tool_use", "post_tool_use", "session_end")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def _run_hook(hook: str, payload: dict, env: dict) -> float:
+    """Run one hook script; returns its wall time in ms."""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(HOOKS_DIR / f"{hook}.py")],
+        input=json.dumps(payload).encode(), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False,
+    )
+    return (time.perf_counter() - started) * 1000
+
+
+def _run_session(index: int, tools: int, env: dict) -> list[tuple[str, float]]:
+    session_id = f"bench-{index:04d}"
+    base = {"session_id": session_id, "cwd": "/tmp/bench"}
+    timings = [("session_start", _run_hook("session_start", base, env))]
+    for i in range(tools):
+        call = {
+            **base, "tool_name": "Bash",
+            "tool_input": {"command": f"echo {i}"},
+            "tool_response": {"stdout": "x" * 200},
+        }
+        timings.append(("pre_tool_use", _run_hook("pre_tool_use", call, env)))
+        timings.append(("post_tool_use", _run_hook("post_tool_use", call, env)))
+    timings.append(("session_end", _run_hook("session_end", base, env)))
+    return timings
+
+
+def _time_writes(events: int) -> dict:
+    """Child mode: time ``write_event`` under the HOME it was started with."""
+    from telemetry import load_plan, write_event
+    plan = load_plan()
+    timings = []
+    for i in range(events):
+        started = time.perf_counter()
+        write_event("tool_end", "bench-writes", {"tool_name": "Bash", "result_size": i}, plan=plan)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return {
+        "p50_us": round(_percentile(timings, 0.50), 1),
+        "p95_us": round(_percentile(timings, 0.95), 1),
+        "events_per_sec": round(len(timings) / (sum(timings) / 1e6), 1) if timings else 0.0,
+    }
+
+
+def run_level(
+    level: str, root: Path, sessions: int, tools: int, parallel: int, push: bool, events: int,
+) -> dict:
+    """Benchmark one durability level in a fresh HOME under ``root``."""
+    home = Path(tempfile.mkdtemp(prefix=f"bench-{level}-", dir=root))
+    telemetry_dir = home / ".claude" / "telemetry"
+    telemetry_dir.mkdir(parents=True)
+    config = {
+        "durability": level,
+        "maintenance_intervals_s": {task: None for task in DEFAULT_CONFIG["maintenance_intervals_s"]},
+    }
+    if push:
+        # Queued only: push_flush is disabled above, so nothing is sent
+        config.update(api_url="http://127.0.0.1:9", api_key="ct_live_bench")
+    (telemetry_dir / "config.json").write_text(json.dumps(config))
+    env = {**os.environ, "HOME": str(home)}
+
+    try:
+        _run_hook("session_start", {"session_id": "warmup", "cwd": "/tmp"}, env)  # plan snapshot, .pyc
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            results = list(pool.map(lambda i: _run_session(i, tools, env), range(sessions)))
+        elapsed = time.perf_counter() - started
+        writes = json.loads(subprocess.run(
+            [sys.executable, __file__, "--time-writes", str(events)],
+            env=env, capture_output=True, check=True,
+        ).stdout) if events else None
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+    by_hook = {hook: [] for hook in HOOKS}
+    for timings in results:
+        for hook, ms in timings:
+            by_hook[hook].append(ms)
+    calls = sum(len(v) for v in by_hook.values())
+    return {
+        "durability": level,
+        "calls": calls,
+        "calls_per_sec": round(calls / elapsed, 1) if elapsed > 0 else 0.0,
+        "writes": writes,
+        "hooks": {
+            hook: {
+                "p50": round(_percentile(ms, 0.50), 1),
+                "p95": round(_percentile(ms, 0.95), 1),
+                "max": round(max(ms), 1) if ms else 0.0,
+            }
+            for hook, ms in by_hook.items()
+        },
+    }
+
+
+def format_results(results: list[dict]) -> str:
+    lines = [
+        "| Durability | Hook | p50 (ms) | p95 (ms) | Max (ms) |",
+        "|------------|------|---------:|---------:|---------:|",
+    ]
+    for r in results:
+        for hook, lat in r["hooks"].items():
+            lines.append(f"| {r['durability']} | {hook} | {lat['p50']} | {lat['p95']} | {lat['max']} |")
+    lines.append("")
+    for r in results:
+        line = f"{r['durability']}: {r['calls']} hook calls, {r['calls_per_sec']} calls/s"
+        if r["writes"]:
+            w = r["writes"]
+            line += (f"; write_event p50 {w['p50_us']} us, p95 {w['p95_us']} us, "
+                     f"{w['events_per_sec']} events/s")
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark hook latency per durability level.")
+    parser.add_argument("--levels", default=",".join(LEVELS))
+    parser.add_argument("--sessions", type=int, default=20, help="simulated sessions per level")
+    parser.add_argument("--tools", type=int, default=5, help="tool calls per session")
+    parser.add_argument("--parallel", type=int, default=4, help="sessions running at once")
+    parser.add_argument("--push", action="store_true", help="also append to the push queue")
+    parser.add_argument("--events", type=int, default=2000, help="in-process write_event calls per level")
+    parser.add_argument("--dir", type=Path, help="where to create the benchmark HOMEs (default: temp dir)")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    parser.add_argument("--time-writes", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.time_writes is not None:
+        print(json.dumps(_time_writes(args.time_writes)))
+        return
+
+    levels = [level.strip() for level in args.levels.split(",") if level.strip()]
+    unknown = set(levels) - set(LEVELS)
+    if unknown:
+        parser.error(f"unknown durability level(s): {', '.join(sorted(unknown))}")
+    root = args.dir or Path(tempfile.gettempdir())
+    root.mkdir(parents=True, exist_ok=True)
+
+    results = [
+        run_level(level, root, args.sessions, args.tools, args.parallel, args.push, args.events)
+        for level in levels
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
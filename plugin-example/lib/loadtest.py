@@ -0,0 +1,487 @@
+"""
+Ingestion load test — replays telemetry through the SaaS push path.
+
+Simulates many plugin clients POSTing batches to /api/v1/events through the
+same `_post_batch` call used by `flush_push_queue`. A bundled stand-in
+server mimics the endpoint's auth, validation and per-key ingestion rate
+limit, so `push_batch_size` and deployment size can be tuned locally.
+
+Usage:
+    python3 loadtest.py --clients 16 --batch-sizes 50,100,500,1000
+    python3 loadtest.py --replay ~/.claude/telemetry/events-*.jsonl
+    python3 loadtest.py --url https://telemetry.example.com --api-key ct_live_...
+"""
+
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+import urllib.error
+import uuid
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from telemetry import _post_batch, iter_day_file, to_saas_event
+
+# Mirrors the zod enum in src/app/api/v1/events/route.ts
+VALID_EVENT_TYPES = {
+    "session_start", "session_end", "tool_use", "tool_result",
+    "prompt_submit", "assistant_stop", "subagent_stop", "pre_compact",
+    "error", "tool_rollup", "agent_rollup", "client_report",
+}
+MAX_BATCH = 1000
+
+# Event types summed into daily tool_uses / agent_calls by update_daily_aggregate
+TOOL_EVENT_TYPES = {"tool_use", "tool_result", "tool_rollup"}
+AGENT_EVENT_TYPES = {"subagent_stop", "agent_rollup"}
+
+# Ingestion tier in src/lib/api-middleware.ts: 200 requests per minute per key
+DEFAULT_RATE_LIMIT = 200
+DEFAULT_RATE_WINDOW_S = 60.0
+
+
+# --- Stand-in server ---
+
+def event_weight(e: dict) -> float:
+    """Raw client events ``e`` stands for in SaaS aggregates.
+
+    Mirrors ``eventWeight`` in src/lib/services/events.service.ts and
+    ``event_weight()`` in supabase/migrations.
+    """
+    event_type = e.get("event")
+    data = e.get("data") or {}
+    if event_type == "client_report":
+        return 0
+    if event_type in ("tool_rollup", "agent_rollup"):
+        count = data.get("event_count")
+        return count if isinstance(count, (int, float)) and count > 0 else 1
+    sample_weight = data.get("sample_weight")
+    if not (isinstance(sample_weight, (int, float)) and sample_weight > 0):
+        sample_weight = 1
+    return (2 if data.get("span") is True else 1) * sample_weight
+
+
+class StandInServer:
+    """Local HTTP server imitating the /api/v1/events ingestion endpoint.
+
+    Any ``ct_live_`` key is accepted. Checks run in the same order as
+    ``createApiHandler``: API key (401), rate limit (429), body (500 on
+    unparseable JSON, 400 on schema errors). Accepted batches sleep for
+    ``latency_ms`` plus ``per_event_us`` per event to model insert cost.
+    ``totals`` sums accepted events the way the daily aggregates do.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate_limit: int = DEFAULT_RATE_LIMIT,
+        window_s: float = DEFAULT_RATE_WINDOW_S,
+        latency_ms: float = 2.0,
+        per_event_us: float = 20.0,
+    ):
+        self.rate_limit = rate_limit
+        self.window_s = window_s
+        self.latency_ms = latency_ms
+        self.per_event_us = per_event_us
+        self.inserted = 0
+        self.duplicates = 0
+        self.statuses = Counter()
+        self.totals = Counter()  # events, tool_uses, agent_calls
+        self._event_ids = set()
+        self._windows = {}  # api key -> (count, reset_at)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_limits(self) -> None:
+        """Forget rate-limit windows and accepted event ids, e.g. between sweep rounds.
+
+        Each round replays the same events, which would otherwise all be
+        skipped as already stored from the second round on.
+        """
+        with self._lock:
+            self._windows.clear()
+            self._event_ids.clear()
+
+    def _check_rate(self, key: str) -> float:
+        """Count a request against the key's window. Returns retry-after seconds, 0 if allowed."""
+        now = time.monotonic()
+        with self._lock:
+            count, reset_at = self._windows.get(key, (0, 0.0))
+            if now >= reset_at:
+                count, reset_at = 0, now + self.window_s
+            count += 1
+            self._windows[key] = (count, reset_at)
+        if count <= self.rate_limit:
+            return 0.0
+        return reset_at - now
+
+    def _record(self, status: int, inserted: int = 0) -> None:
+        with self._lock:
+            self.statuses[status] += 1
+            self.inserted += inserted
+
+    def _tally(self, events: list) -> None:
+        with self._lock:
+            for e in events:
+                w = event_weight(e)
+                self.totals["events"] += w
+                if e.get("event") in TOOL_EVENT_TYPES:
+                    self.totals["tool_uses"] += w
+                elif e.get("event") in AGENT_EVENT_TYPES:
+                    self.totals["agent_calls"] += w
+
+    def _drop_known(self, events: list) -> list:
+        """Skip events whose ``event_id`` was already accepted, like ``ingestEvents``."""
+        fresh = []
+        with self._lock:
+            for e in events:
+                eid = e.get("event_id")
+                if eid:
+                    if eid in self._event_ids:
+                        self.duplicates += 1
+                        continue
+                    self._event_ids.add(eid)
+                fresh.append(e)
+        return fresh
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: dict) -> None:
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _error(self, status: int, code: str, message: str, details=None) -> None:
+                error = {"code": code, "message": message}
+                if details is not None:
+                    error["details"] = details
+                server._record(status)
+                self._reply(status, {"error": error})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+
+                if self.path != "/api/v1/events":
+                    return self._error(404, "NOT_FOUND", "Not found")
+
+                key = self.headers.get("X-API-Key", "")
+                if not key.startswith("ct_live_"):
+                    return self._error(401, "UNAUTHORIZED", "Invalid API key")
+
+                retry_after = server._check_rate(key)
+                if retry_after > 0:
+                    return self._error(
+                        429, "RATE_LIMITED", "Too many requests",
+                        {"retryAfter": int(retry_after + 0.999)},
+                    )
+
+                try:
+                    body = json.loads(raw)
+                except ValueError:
+                    return self._error(500, "INTERNAL_ERROR", "Internal server error")
+
+                problem = _validate_body(body)
+                if problem:
+                    return self._error(400, "BAD_REQUEST", problem)
+
+                events = server._drop_known(body["events"])
+                skipped = len(body["events"]) - len(events)
+                time.sleep((server.latency_ms + server.per_event_us * len(events) / 1000) / 1000)
+                server._tally(events)
+                server._record(201, len(events))
+                self._reply(201, {"data": {"inserted": len(events), "skipped": skipped}})
+
+        return Handler
+
+
+def _validate_body(body) -> str | None:
+    """Return a validation message in the endpoint's style, or None if valid."""
+    events = body.get("events") if isinstance(body, dict) else None
+    if not isinstance(events, list):
+        return "events: Required"
+    if not 1 <= len(events) <= MAX_BATCH:
+        return f"events: Array must contain between 1 and {MAX_BATCH} element(s)"
+    for i, e in enumerate(events):
+        if not isinstance(e, dict):
+            return f"events.{i}: Expected object"
+        if not isinstance(e.get("ts"), str):
+            return f"events.{i}.ts: Invalid datetime"
+        if e.get("event") not in VALID_EVENT_TYPES:
+            return f"events.{i}.event: Invalid enum value"
+        if not e.get("session_id"):
+            return f"events.{i}.session_id: Required"
+        seq = e.get("seq")
+        if not isinstance(seq, int) or seq < 0:
+            return f"events.{i}.seq: Expected non-negative integer"
+        eid = e.get("event_id")
+        if eid is not None and not (isinstance(eid, str) and 1 <= len(eid) <= 64):
+            return f"events.{i}.event_id: Invalid string"
+    return None
+
+
+# --- Event sources ---
+
+def synthetic_events(count: int, sessions: int = 50) -> list[dict]:
+    """Generate SaaS-shaped events with a realistic tool-heavy mix."""
+    tools = ["Read", "Read", "Read", "Grep", "Glob", "Edit", "Bash", "Bash", "Write", "Task"]
+    session_ids = [str(uuid.uuid4()) for _ in range(max(sessions, 1))]
+    start = datetime.now(timezone.utc) - timedelta(hours=1)
+    events = []
+    for i in range(count):
+        ts = (start + timedelta(milliseconds=i * 50)).isoformat(timespec="milliseconds")
+        session_id = random.choice(session_ids)
+        tool = random.choice(tools)
+        if i % 2 == 0:
+            events.append({
+                "ts": ts, "event": "tool_use", "session_id": session_id, "seq": 1,
+                "data": {"tool_name": tool, "correlation_id": uuid.uuid4().hex[:12],
+                         "input_preview": "{\"file_path\": \"/src/app/page.tsx\"}"},
+            })
+        else:
+            events.append({
+                "ts": ts, "event": "tool_result", "session_id": session_id, "seq": 1,
+                "data": {"tool_name": tool, "correlation_id": uuid.uuid4().hex[:12],
+                         "duration_ms": round(random.lognormvariate(4, 1.2), 1),
+                         "result_size": random.randint(10, 50_000)},
+            })
+    return events
+
+
+def replay_events(paths: list[str], limit: int | None = None) -> list[dict]:
+    """Load local day files and map them to SaaS events, as the push queue would."""
+    events = []
+    for p in paths:
+        for e in iter_day_file(Path(p).expanduser()):
+            try:
+                events.append(to_saas_event(e))
+            except KeyError:
+                continue
+            if limit and len(events) >= limit:
+                return events
+    return events
+
+
+# --- Load generator ---
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def run_load(
+    url: str,
+    api_keys: list[str],
+    events: list[dict],
+    batch_size: int,
+    clients: int,
+    client_rate: float | None = None,
+    honor_retry: bool = True,
+    max_retry_wait: float = 5.0,
+) -> dict:
+    """Push ``events`` through ``_post_batch`` from ``clients`` concurrent threads.
+
+    Client ``i`` uses ``api_keys[i % len(api_keys)]`` and, if ``client_rate``
+    is set, sends at most that many requests per second. Rate-limited batches
+    are retried after the server's retryAfter (capped at ``max_retry_wait``)
+    when ``honor_retry`` is set, otherwise counted as failed.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH))
+    work = queue.Queue()
+    for i in range(0, len(events), batch_size):
+        work.put(events[i:i + batch_size])
+
+    latencies = []
+    statuses = Counter()
+    sent = [0]
+    failed = [0]
+    lock = threading.Lock()
+
+    def client(idx: int) -> None:
+        key = api_keys[idx % len(api_keys)]
+        interval = 1.0 / client_rate if client_rate else 0.0
+        next_at = time.monotonic()
+        while True:
+            try:
+                batch = work.get_nowait()
+            except queue.Empty:
+                return
+            if interval:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_at = max(next_at, time.monotonic()) + interval
+
+            started = time.perf_counter()
+            status = 201
+            retry_after = 0.0
+            try:
+                _post_batch(url, key, batch)
+            except urllib.error.HTTPError as e:
+                status = e.code
+                if status == 429:
+                    try:
+                        retry_after = float(json.loads(e.read())["error"]["details"]["retryAfter"])
+                    except (ValueError, KeyError, TypeError):
+                        retry_after = 1.0
+            except Exception:
+                status = 0  # connection error / timeout
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            with lock:
+                statuses[status] += 1
+                latencies.append(elapsed_ms)
+                if status in (200, 201):
+                    sent[0] += len(batch)
+
+            if status == 429 and honor_retry:
+                time.sleep(min(retry_after, max_retry_wait))
+                work.put(batch)
+            elif status not in (200, 201):
+                with lock:
+                    failed[0] += len(batch)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "batch_size": batch_size,
+        "clients": clients,
+        "events_sent": sent[0],
+        "events_failed": failed[0],
+        "requests": sum(statuses.values()),
+        "statuses": dict(statuses),
+        "elapsed_s": round(elapsed, 3),
+        "events_per_sec": round(sent[0] / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 1),
+            "p90": round(_percentile(latencies, 90), 1),
+            "p99": round(_percentile(latencies, 99), 1),
+            "max": round(latencies[-1], 1) if latencies else 0.0,
+        },
+    }
+
+
+def format_results(results: list[dict]) -> str:
+    lines = [
+        "| Batch | Clients | Events/s | Requests | p50 (ms) | p90 (ms) | p99 (ms) | Max (ms) | Failed | Statuses |",
+        "|------:|--------:|---------:|---------:|---------:|---------:|---------:|---------:|-------:|----------|",
+    ]
+    for r in results:
+        lat = r["latency_ms"]
+        statuses = ", ".join(f"{code}:{n}" for code, n in sorted(r["statuses"].items()))
+        lines.append(
+            f"| {r['batch_size']} | {r['clients']} | {r['events_per_sec']} | {r['requests']} "
+            f"| {lat['p50']} | {lat['p90']} | {lat['p99']} | {lat['max']} "
+            f"| {r['events_failed']} | {statuses} |"
+        )
+    if results:
+        best = max(results, key=lambda r: r["events_per_sec"])
+        lines.append("")
+        lines.append(f"Best throughput: push_batch_size={best['batch_size']} "
+                     f"({best['events_per_sec']} events/s)")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the /api/v1/events ingestion path.")
+    parser.add_argument("--url", help="target SaaS URL (default: bundled stand-in server)")
+    parser.add_argument("--api-key", action="append", dest="api_keys",
+                        help="API key to use (repeatable; default: one stand-in key per client)")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--batch-sizes", default="50,100,250,500,1000")
+    parser.add_argument("--events", type=int, default=20_000, help="synthetic event count")
+    parser.add_argument("--sessions", type=int, default=50, help="synthetic session count")
+    parser.add_argument("--replay", nargs="+", metavar="DAY_FILE", help="replay local events-*.jsonl files")
+    parser.add_argument("--client-rate", type=float, help="max requests/sec per client")
+    parser.add_argument("--no-retry", action="store_true", help="do not retry rate-limited batches")
+    parser.add_argument("--server-rate-limit", type=int, default=DEFAULT_RATE_LIMIT)
+    parser.add_argument("--server-window", type=float, default=DEFAULT_RATE_WINDOW_S)
+    parser.add_argument("--server-latency-ms", type=float, default=2.0)
+    parser.add_argument("--server-per-event-us", type=float, default=20.0)
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        events = replay_events(args.replay, limit=args.events)
+    else:
+        events = synthetic_events(args.events, args.sessions)
+    if not events:
+        parser.error("no events to send")
+
+    server = None
+    url = args.url
+    if not url:
+        server = StandInServer(
+            rate_limit=args.server_rate_limit,
+            window_s=args.server_window,
+            latency_ms=args.server_latency_ms,
+            per_event_us=args.server_per_event_us,
+        ).start()
+        url = server.url
+    api_keys = args.api_keys or [f"ct_live_loadtest_{i}" for i in range(args.clients)]
+
+    results = []
+    try:
+        for size in [int(b) for b in args.batch_sizes.split(",") if b.strip()]:
+            if server:
+                server.reset_limits()
+            results.append(run_load(
+                url, api_keys, events, size,
+                clients=args.clients,
+                client_rate=args.client_rate,
+                honor_retry=not args.no_retry,
+            ))
+    finally:
+        if server:
+            server.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{len(events)} events -> {url}")
+        print()
+        print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Background maintenance — spill merge, push flush, retention, pending sweep,
+index compaction, cache warming, SQLite store sync.
+
+Hooks only call ``maybe_spawn_maintenance``: a stat of the queue plus one
+small JSON read deciding whether any task is due. Due work runs in a
+detached, single-instance worker (double fork + setsid, non-blocking flock
+on ``.maintenance.lock``), so it never counts against a hook's timeout.
+Each task records its last run in ``.maintenance.json`` and runs at most
+once per interval from ``maintenance_intervals_s``.
+
+Usage:
+    python3 maintenance.py            # run whatever is due
+    python3 maintenance.py --force    # run every enabled task now
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import sys
+import time
+
+from telemetry import (
+    TELEMETRY_DIR, SinkPlan,
+    atomic_write, cleanup_old_events, compact_session_index, flush_push_queue, has_spillover,
+    load_plan, merge_spillover, push_flush_due, sweep_stale_pending,
+)
+
+MAINTENANCE_STATE_PATH = TELEMETRY_DIR / ".maintenance.json"
+MAINTENANCE_LOCK_PATH = TELEMETRY_DIR / ".maintenance.lock"
+
+# Run order: merge writes hooks deferred, ship queued events, warm caches last
+TASKS = (
+    "spill_merge", "push_flush", "retention", "pending_sweep", "session_index",
+    "cache_warm", "store_sync",
+)
+
+
+# --- Tasks ---
+
+def _spill_merge(plan: SinkPlan) -> dict:
+    return merge_spillover(plan)
+
+
+def _push_flush(plan: SinkPlan) -> dict:
+    return flush_push_queue(plan)
+
+
+def _retention(plan: SinkPlan) -> dict:
+    return {"deleted": cleanup_old_events(plan.retention_days)}
+
+
+def _pending_sweep(plan: SinkPlan) -> dict:
+    return {"swept": sweep_stale_pending()}
+
+
+def _session_index(plan: SinkPlan) -> dict:
+    return compact_session_index(plan.retention_days, plan=plan)
+
+
+def _cache_warm(plan: SinkPlan) -> dict:
+    """Refresh the per-day aggregate cache so the next report only reads today."""
+    from reporter import aggregate_days
+    result = aggregate_days(7, plan=plan)
+    return {"events": result.get("total_events", 0)}
+
+
+def _store_sync(plan: SinkPlan) -> dict:
+    """Ingest newly appended day-file bytes into the SQLite store."""
+    from store import connect, sync
+    conn = connect(plan=plan)
+    try:
+        return sync(conn)
+    finally:
+        conn.close()
+
+
+_TASK_FUNCS = {
+    "spill_merge": _spill_merge,
+    "push_flush": _push_flush,
+    "retention": _retention,
+    "pending_sweep": _pending_sweep,
+    "session_index": _session_index,
+    "cache_warm": _cache_warm,
+    "store_sync": _store_sync,
+}
+
+
+# --- Scheduling ---
+
+def load_state() -> dict:
+    try:
+        state = json.loads(MAINTENANCE_STATE_PATH.read_text())
+        if isinstance(state, dict):
+            return state
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return {}
+
+
+def _save_state(state: dict) -> None:
+    try:
+        atomic_write(MAINTENANCE_STATE_PATH, json.dumps(state, indent=2, default=str) + "\n")
+    except OSError:
+        pass
+
+
+def enabled_tasks(plan: SinkPlan) -> list[str]:
+    """Tasks the plan allows: a null interval disables a task, and the push
+    flush and store sync only run when pushing or the SQLite store is on."""
+    return [
+        task for task in TASKS
+        if plan.interval(task) is not None
+        and not (task == "store_sync" and not plan.sqlite_store)
+        and not (task == "push_flush" and not plan.push)
+    ]
+
+
+def due_tasks(plan: SinkPlan, state: dict | None = None, now: float | None = None) -> list[str]:
+    """Enabled tasks whose interval has elapsed."""
+    state = load_state() if state is None else state
+    now = time.time() if now is None else now
+    due = []
+    spilled = has_spillover()  # spilled push lines reach the queue before the flush
+    for task in enabled_tasks(plan):
+        if task == "spill_merge" and not spilled:
+            continue
+        if task == "push_flush" and not (spilled or push_flush_due(now)):
+            continue
+        last = state.get(task, {}).get("last_run", 0)
+        if now - last >= plan.interval(task):
+            due.append(task)
+    return due
+
+
+def run_maintenance(force: bool = False, plan: SinkPlan | None = None) -> dict:
+    """Run due tasks (every enabled task with ``force``) unless another worker holds the lock."""
+    plan = plan or load_plan()
+    fd = os.open(str(MAINTENANCE_LOCK_PATH), os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return {"status": "busy"}
+
+        state = load_state()
+        tasks = enabled_tasks(plan) if force else due_tasks(plan, state)
+        results = {}
+        for task in tasks:
+            started = time.time()
+            try:
+                result = _TASK_FUNCS[task](plan)
+            except Exception as e:
+                result = {"status": "error", "reason": str(e)}
+            state[task] = {
+                "last_run": started,
+                "duration_s": round(time.time() - started, 3),
+                "result": result,
+            }
+            _save_state(state)  # record progress even if a later task hangs
+            results[task] = result
+        return {"status": "ok", "tasks": results}
+    finally:
+        os.close(fd)
+
+
+def spawn_maintenance() -> None:
+    """Start ``run_maintenance`` in a detached worker and return immediately.
+
+    The worker is double-forked into its own session with stdio on
+    /dev/null, so it neither holds the hook's pipes open nor becomes a
+    zombie of the hook process.
+    """
+    try:
+        pid = os.fork()
+    except OSError:
+        return
+    if pid:
+        try:
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+        return
+
+    # Intermediate child: new session, then fork the real worker and exit
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        run_maintenance()
+    except BaseException:
+        pass
+    os._exit(0)
+
+
+def maybe_spawn_maintenance(plan: SinkPlan) -> bool:
+    """Cheap hot-path check; spawns the worker when any task is due."""
+    if not due_tasks(plan):
+        return False
+    spawn_maintenance()
+    return True
+
+
+# --- CLI ---
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run telemetry maintenance tasks.")
+    parser.add_argument("--force", action="store_true", help="run every enabled task regardless of schedule")
+    args = parser.parse_args(argv)
+    result = run_maintenance(force=args.force)
+    print(json.dumps(result, indent=2, default=str))
+    if result["status"] == "busy":
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,41 +2,47 @@
 Reporting engine — JSONL loading, aggregation, text reports, HTML dashboard.
 """
 
+import hashlib
 import json
 import os
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
 from string import Template
 
+from sketches import HeavyHitters, HyperLogLog, LogHistogram, SpaceSaving
+from telemetry import SinkPlan, _ms_from_iso, atomic_write, iter_day_file, load_plan
+
 TELEMETRY_DIR = Path.home() / ".claude" / "telemetry"
 TEMPLATE_DIR = Path(__file__).parent.parent / "templates"
+CACHE_DIR = TELEMETRY_DIR / ".cache"
+CACHE_VERSION = 1
 
 
-def load_events(days: int = 7) -> list[dict]:
-    """Load events from the last N days of JSONL files."""
+def _day_files(days: int, root: Path = TELEMETRY_DIR) -> list[Path]:
+    """Day files covering the last N days, oldest first."""
     cutoff = datetime.now(timezone.utc) - timedelta(days=days)
     cutoff_str = cutoff.strftime("%Y-%m-%d")
-    events = []
+    return [
+        f for f in sorted(root.glob("events-*.jsonl"))
+        if f.stem.replace("events-", "") >= cutoff_str
+    ]
 
-    for f in sorted(TELEMETRY_DIR.glob("events-*.jsonl")):
-        date_part = f.stem.replace("events-", "")
-        if date_part < cutoff_str:
-            continue
-        try:
-            for line in f.read_text().splitlines():
-                line = line.strip()
-                if line:
-                    events.append(json.loads(line))
-        except (json.JSONDecodeError, OSError):
-            continue
 
+def load_events(days: int = 7) -> list[dict]:
+    """Load events from the last N days of JSONL files (v1 or compact v2)."""
+    events = []
+    for f in _day_files(days):
+        events.extend(iter_day_file(f))
     return events
 
 
-def load_sessions() -> dict:
+def load_sessions(root: Path = TELEMETRY_DIR) -> dict:
     """Load session index."""
-    sessions_path = TELEMETRY_DIR / "sessions.json"
+    sessions_path = root / "sessions.json"
     if sessions_path.exists():
         try:
             return json.loads(sessions_path.read_text())
@@ -45,113 +51,745 @@ def load_sessions() -> dict:
     return {}
 
 
-def aggregate(events: list[dict]) -> dict:
-    """Compute aggregate stats from events."""
-    tool_counts = Counter()
-    tool_durations = defaultdict(list)
-    event_type_counts = Counter()
-    sessions = set()
-    prompts = 0
-    prompt_words = 0
-    compacts = 0
-    stops = Counter()
-    agents = Counter()
-    agent_tools = defaultdict(Counter)  # agent_type -> {tool: count}
-    hourly = Counter()
-    daily = Counter()
-
-    for e in events:
+def load_degradations(days: int = 7, root: Path = TELEMETRY_DIR) -> dict:
+    """Hook steps skipped or deferred near their timeout: {kind: {hook: count}}."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d")
+    counts = defaultdict(Counter)
+    try:
+        with open(root / ".degraded.jsonl") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if entry["ts"][:10] >= cutoff:
+                        counts[entry["kind"]][entry["hook"]] += 1
+                except (ValueError, KeyError, TypeError):
+                    continue
+    except OSError:
+        pass
+    return {kind: dict(hooks.most_common()) for kind, hooks in counts.items()}
+
+
+# --- Aggregation ---
+
+@lru_cache(maxsize=None)
+def _day_name(day: int) -> str:
+    """YYYY-MM-DD (UTC) of a day number since the epoch."""
+    return (datetime(1970, 1, 1) + timedelta(days=day)).strftime("%Y-%m-%d")
+
+
+class Aggregator:
+    """Mergeable accumulator behind ``aggregate``.
+
+    Exact mode keeps every session id, working directory and duration.
+    Approximate mode replaces those unbounded parts with sketches
+    (HyperLogLog for distinct counts, Space-Saving / Count-Min for top
+    tools, agents and cwd x tool pairs, log histograms for durations) so
+    memory stays constant regardless of the window. Both modes merge
+    across days or machines and serialize into the aggregate cache.
+
+    Counts are weighted by each event's sampling ``weight`` (see the
+    ``rules`` config) so they estimate the unsampled totals. Tool calls are
+    attributed to a cwd through ``session_cwds`` (session id -> cwd), which
+    session_start events extend as they are seen.
+    """
+
+    # Result keys whose values are sketch estimates in approximate mode
+    ESTIMATED = ["unique_sessions", "unique_cwds", "tool_counts", "tool_stats",
+                 "agent_counts", "top_cwd_tools"]
+
+    def __init__(self, approximate: bool = False, session_cwds: dict | None = None):
+        self.approximate = approximate
+        self.session_cwds = session_cwds if session_cwds is not None else {}
+        self.total_events = 0
+        self.stored_events = 0
+        self.prompts = 0
+        self.prompt_words = 0
+        self.compacts = 0
+        self.event_type_counts = Counter()
+        self.stops = Counter()
+        self.hourly = Counter()
+        self.daily = Counter()
+        self.agent_tools = defaultdict(Counter)  # agent_type -> {tool: count}
+        self._last_session = None
+        if approximate:
+            self.sessions = HyperLogLog()
+            self.cwds = HyperLogLog()
+            self.tool_counts = SpaceSaving(256)
+            self.agents = SpaceSaving(64)
+            self.cwd_tools = HeavyHitters(32)
+            self.tool_durations = {}  # tool -> LogHistogram
+        else:
+            self.sessions = set()
+            self.cwds = set()
+            self.tool_counts = Counter()
+            self.agents = Counter()
+            self.cwd_tools = Counter()
+            self.tool_durations = defaultdict(list)
+
+    def _count(self, counter, key: str, w: float) -> None:
+        if self.approximate:
+            counter.add(key, w)
+        else:
+            counter[key] += w
+
+    def add(self, e: dict) -> None:
         event_type = e.get("event", "")
-        event_type_counts[event_type] += 1
+        w = e.get("weight", 1)
+        self.total_events += w
+        self.stored_events += 1
+        self.event_type_counts[event_type] += w
         session_id = e.get("session_id", "")
         data = e.get("data", {})
         ts = e.get("ts", "")
 
-        sessions.add(session_id)
+        if session_id != self._last_session:
+            self.sessions.add(session_id)
+            self._last_session = session_id
 
-        if ts:
+        ts_ms = e.get("ts_ms")
+        if ts_ms is not None:
+            day, ms = divmod(ts_ms, 86_400_000)
+            self.hourly[ms // 3_600_000] += w
+            self.daily[_day_name(day)] += w
+        elif ts:
             try:
                 dt = datetime.fromisoformat(ts)
-                hourly[dt.hour] += 1
-                daily[dt.strftime("%Y-%m-%d")] += 1
+                self.hourly[dt.hour] += w
+                self.daily[dt.strftime("%Y-%m-%d")] += w
             except ValueError:
                 pass
 
-        if event_type == "tool_end":
+        if event_type in ("tool_end", "tool_span"):
             tool_name = data.get("tool_name", "unknown")
-            tool_counts[tool_name] += 1
+            self._count(self.tool_counts, tool_name, w)
             dur = data.get("duration_ms")
             if dur is not None:
-                tool_durations[tool_name].append(dur)
+                if self.approximate:
+                    hist = self.tool_durations.get(tool_name)
+                    if hist is None:
+                        hist = self.tool_durations[tool_name] = LogHistogram()
+                    hist.add(dur)
+                else:
+                    self.tool_durations[tool_name].append(dur)
+            cwd = self.session_cwds.get(session_id)
+            if cwd:
+                self._count(self.cwd_tools, f"{cwd}\t{tool_name}", w)
+
+        elif event_type == "session_start":
+            cwd = data.get("cwd")
+            if cwd:
+                self.session_cwds[session_id] = cwd
+                self.cwds.add(cwd)
 
         elif event_type == "prompt":
-            prompts += 1
-            prompt_words += data.get("word_count", 0)
+            self.prompts += w
+            self.prompt_words += data.get("word_count", 0) * w
 
         elif event_type == "pre_compact":
-            compacts += 1
+            self.compacts += w
 
         elif event_type == "stop":
-            stops[data.get("reason", "unknown")] += 1
+            self.stops[data.get("reason", "unknown")] += w
 
         elif event_type == "subagent_stop":
             agent_type = data.get("agent_type") or data.get("agent_name") or "unknown"
-            agents[agent_type] += 1
+            self._count(self.agents, agent_type, w)
             # Accumulate per-agent tool breakdown from transcript parsing
             tc = data.get("tool_counts", {})
             if tc:
                 for tool, count in tc.items():
-                    agent_tools[agent_type][tool] += count
-
-    # Compute tool duration stats
-    tool_stats = {}
-    for tool, durations in tool_durations.items():
-        if durations:
-            tool_stats[tool] = {
-                "count": tool_counts[tool],
-                "avg_ms": round(sum(durations) / len(durations), 1),
-                "min_ms": round(min(durations), 1),
-                "max_ms": round(max(durations), 1),
-                "p50_ms": round(sorted(durations)[len(durations) // 2], 1),
-            }
+                    self.agent_tools[agent_type][tool] += count * w
+
+    def merge(self, other: "Aggregator") -> None:
+        if other.approximate != self.approximate:
+            raise ValueError("cannot merge exact and approximate aggregates")
+        self.total_events += other.total_events
+        self.stored_events += other.stored_events
+        self.prompts += other.prompts
+        self.prompt_words += other.prompt_words
+        self.compacts += other.compacts
+        self.event_type_counts.update(other.event_type_counts)
+        self.stops.update(other.stops)
+        self.hourly.update(other.hourly)
+        self.daily.update(other.daily)
+        for agent, tools in other.agent_tools.items():
+            self.agent_tools[agent].update(tools)
+        if self.approximate:
+            for sketch in ("sessions", "cwds", "tool_counts", "agents", "cwd_tools"):
+                getattr(self, sketch).merge(getattr(other, sketch))
+            for tool, hist in other.tool_durations.items():
+                if tool in self.tool_durations:
+                    self.tool_durations[tool].merge(hist)
+                else:
+                    self.tool_durations[tool] = LogHistogram.from_dict(hist.to_dict())
+        else:
+            self.sessions |= other.sessions
+            self.cwds |= other.cwds
+            self.tool_counts.update(other.tool_counts)
+            self.agents.update(other.agents)
+            self.cwd_tools.update(other.cwd_tools)
+            for tool, durations in other.tool_durations.items():
+                self.tool_durations[tool].extend(durations)
+
+    def to_dict(self) -> dict:
+        d = {
+            "approximate": self.approximate,
+            "total_events": self.total_events,
+            "stored_events": self.stored_events,
+            "prompts": self.prompts,
+            "prompt_words": self.prompt_words,
+            "compacts": self.compacts,
+            "event_type_counts": dict(self.event_type_counts),
+            "stops": dict(self.stops),
+            "hourly": dict(self.hourly),
+            "daily": dict(self.daily),
+            "agent_tools": {a: dict(t) for a, t in self.agent_tools.items()},
+        }
+        if self.approximate:
+            for sketch in ("sessions", "cwds", "tool_counts", "agents", "cwd_tools"):
+                d[sketch] = getattr(self, sketch).to_dict()
+            d["tool_durations"] = {t: h.to_dict() for t, h in self.tool_durations.items()}
+        else:
+            d["sessions"] = sorted(self.sessions)
+            d["cwds"] = sorted(self.cwds)
+            d["tool_counts"] = dict(self.tool_counts)
+            d["agents"] = dict(self.agents)
+            d["cwd_tools"] = dict(self.cwd_tools)
+            d["tool_durations"] = dict(self.tool_durations)
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict, session_cwds: dict | None = None) -> "Aggregator":
+        agg = cls(d["approximate"], session_cwds)
+        agg.total_events = d["total_events"]
+        agg.stored_events = d["stored_events"]
+        agg.prompts = d["prompts"]
+        agg.prompt_words = d["prompt_words"]
+        agg.compacts = d["compacts"]
+        agg.event_type_counts = Counter(d["event_type_counts"])
+        agg.stops = Counter(d["stops"])
+        agg.hourly = Counter({int(h): c for h, c in d["hourly"].items()})
+        agg.daily = Counter(d["daily"])
+        for agent, tools in d["agent_tools"].items():
+            agg.agent_tools[agent] = Counter(tools)
+        if agg.approximate:
+            agg.sessions = HyperLogLog.from_dict(d["sessions"])
+            agg.cwds = HyperLogLog.from_dict(d["cwds"])
+            agg.tool_counts = SpaceSaving.from_dict(d["tool_counts"])
+            agg.agents = SpaceSaving.from_dict(d["agents"])
+            agg.cwd_tools = HeavyHitters.from_dict(d["cwd_tools"])
+            agg.tool_durations = {t: LogHistogram.from_dict(h) for t, h in d["tool_durations"].items()}
+        else:
+            agg.sessions = set(d["sessions"])
+            agg.cwds = set(d["cwds"])
+            agg.tool_counts = Counter(d["tool_counts"])
+            agg.agents = Counter(d["agents"])
+            agg.cwd_tools = Counter(d["cwd_tools"])
+            agg.tool_durations.update(d["tool_durations"])
+        return agg
+
+    def _tool_stats(self, tool_counts: dict) -> dict:
+        tool_stats = {}
+        for tool, durations in self.tool_durations.items():
+            if self.approximate:
+                if not durations.count:
+                    continue
+                tool_stats[tool] = {
+                    "count": tool_counts.get(tool, round(durations.count)),
+                    "avg_ms": round(durations.total / durations.count, 1),
+                    "min_ms": round(durations.min, 1),
+                    "max_ms": round(durations.max, 1),
+                    "p50_ms": round(durations.quantile(0.5), 1),
+                }
+            elif durations:
+                tool_stats[tool] = {
+                    "count": tool_counts.get(tool, 0),
+                    "avg_ms": round(sum(durations) / len(durations), 1),
+                    "min_ms": round(min(durations), 1),
+                    "max_ms": round(max(durations), 1),
+                    "p50_ms": round(sorted(durations)[len(durations) // 2], 1),
+                }
+        return tool_stats
+
+    def result(self) -> dict:
+        """Render the aggregate as the stats dict returned by ``aggregate``."""
+        if self.approximate:
+            unique_sessions = self.sessions.count()
+            unique_cwds = self.cwds.count()
+            tool_counts = _rounded(self.tool_counts.top())
+            agent_counts = _rounded(self.agents.top())
+            cwd_tools = self.cwd_tools.top(10)
+        else:
+            unique_sessions = len(self.sessions)
+            unique_cwds = len(self.cwds)
+            tool_counts = _rounded(self.tool_counts.most_common())
+            agent_counts = _rounded(self.agents.most_common())
+            cwd_tools = self.cwd_tools.most_common(10)
+
+        top_cwd_tools = []
+        for key, count in cwd_tools:
+            cwd, _, tool = key.rpartition("\t")
+            top_cwd_tools.append({"cwd": cwd, "tool": tool, "count": round(count)})
+
+        return {
+            "total_events": round(self.total_events),
+            "stored_events": self.stored_events,
+            "unique_sessions": unique_sessions,
+            "unique_cwds": unique_cwds,
+            "total_prompts": round(self.prompts),
+            "total_prompt_words": round(self.prompt_words),
+            "total_compacts": round(self.compacts),
+            "tool_counts": tool_counts,
+            "tool_stats": self._tool_stats(tool_counts),
+            "stop_reasons": _rounded(self.stops.items()),
+            "agent_counts": agent_counts,
+            "agent_tools": {agent: _rounded(tools.most_common()) for agent, tools in self.agent_tools.items()},
+            "top_cwd_tools": top_cwd_tools,
+            "event_type_counts": _rounded(self.event_type_counts.items()),
+            "hourly_distribution": _rounded(sorted(self.hourly.items())),
+            "daily_counts": _rounded(sorted(self.daily.items())),
+            "estimated": list(self.ESTIMATED) if self.approximate else [],
+        }
+
+
+def aggregate(events: list[dict], approximate: bool = False) -> dict:
+    """Compute aggregate stats from events.
+
+    With ``approximate=True`` distinct counts and top-k lists come from
+    sketches; the keys listed under ``"estimated"`` in the result are then
+    estimates (about 1% error) rather than exact figures.
+    """
+    agg = Aggregator(approximate)
+    for e in events:
+        agg.add(e)
+    return agg.result()
+
+
+def _rounded(items) -> dict:
+    """Round (possibly weighted) counts back to integers."""
+    return {k: round(v) for k, v in items}
+
+
+# --- Aggregate cache ---
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cwds_digest(session_ids: list[str], session_cwds: dict) -> str:
+    """Digest of the cwds a day file's sessions are attributed to."""
+    cwds = json.dumps([session_cwds.get(sid) for sid in session_ids])
+    return hashlib.sha1(cwds.encode()).hexdigest()[:16]
+
+
+def _cached_day_aggregate(
+    path: Path, approximate: bool, session_cwds: dict, cache_dir: Path = CACHE_DIR,
+) -> tuple[Aggregator, list[str], str | None]:
+    """Aggregate one day file, reusing the cached partial if the file is unchanged.
+
+    Returns the partial, the file's session ids and a content digest (used
+    to spot the same file collected under two roots). The partial is also
+    rebuilt when the cwd of one of its sessions changed in ``session_cwds``.
+    """
+    mode = "approx" if approximate else "exact"
+    cache_path = cache_dir / f"{path.stem}.{mode}.json"
+    try:
+        st = path.stat()
+    except OSError:
+        return Aggregator(approximate, session_cwds), [], None
+    fingerprint = [CACHE_VERSION, st.st_size, st.st_mtime_ns]
+
+    try:
+        cached = json.loads(cache_path.read_text())
+        if (cached.get("fingerprint") == fingerprint
+                and cached.get("cwds") == _cwds_digest(cached["session_ids"], session_cwds)):
+            agg = Aggregator.from_dict(cached["state"], session_cwds)
+            return agg, cached["session_ids"], cached["digest"]
+    except (json.JSONDecodeError, OSError, KeyError, ValueError):
+        pass
+
+    known_cwds = dict(session_cwds)  # the scan adds cwds from session_start events
+    agg = Aggregator(approximate, session_cwds)
+    session_ids = set()
+    for e in iter_day_file(path, iso=False):
+        agg.add(e)
+        session_ids.add(e.get("session_id", ""))
+    session_ids = sorted(session_ids)
+    try:
+        digest = _file_digest(path)
+    except OSError:
+        digest = None
+
+    try:
+        atomic_write(cache_path, json.dumps({
+            "fingerprint": fingerprint,
+            "session_ids": session_ids,
+            "cwds": _cwds_digest(session_ids, known_cwds),
+            "digest": digest,
+            "state": agg.to_dict(),
+        }))
+    except OSError:
+        pass
+    return agg, session_ids, digest
+
+
+def _session_cwds(root: Path = TELEMETRY_DIR) -> dict:
+    return {sid: s["cwd"] for sid, s in load_sessions(root).items() if s.get("cwd")}
+
+
+def aggregate_days(
+    days: int = 7, approximate: bool = False, plan: SinkPlan | None = None,
+) -> dict:
+    """Aggregate the last N days from per-day cached partial aggregates.
+
+    Only day files that changed since their partial was cached are
+    re-scanned, so long windows cost little more than today's file. With
+    ``sqlite_store`` enabled, exact aggregates are computed in SQL instead.
+    """
+    plan = plan or load_plan()
+    if not approximate and plan.sqlite_store:
+        return _store_aggregates({"window": window(days)}, plan)["window"]
+    session_cwds = _session_cwds()
+    total = Aggregator(approximate, session_cwds)
+    for f in _day_files(days):
+        total.merge(_cached_day_aggregate(f, approximate, session_cwds)[0])
+    return total.result()
+
+
+# --- Multi-window aggregation ---
+
+# Keys accepted by ``aggregate_windows(group_by=...)``
+GROUP_KEYS = ("cwd", "agent_type", "tool_name", "session_id", "event")
+
+
+def window(days: int, offset: int = 0) -> tuple[str, str]:
+    """(first, last) UTC dates of a ``days``-day window ending ``offset`` days ago.
+
+    With offset 0 this is the span of ``load_events(days)``: today plus the
+    N days before it. ``window(days, days + 1)`` is the adjacent previous period.
+    """
+    end = datetime.now(timezone.utc) - timedelta(days=offset)
+    start = end - timedelta(days=days)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+
+def _group_value(e: dict, key: str, session_cwds: dict):
+    if key in ("session_id", "event"):
+        return e.get(key)
+    data = e.get("data") or {}
+    if key == "cwd":
+        return session_cwds.get(e.get("session_id")) or data.get("cwd")
+    return data.get(key)
+
+
+def aggregate_windows(
+    windows, group_by=None, approximate: bool = False, plan: SinkPlan | None = None,
+) -> dict:
+    """Aggregate several date windows, optionally grouped, in one pass.
+
+    ``windows`` maps labels to ``window(...)`` date pairs; a list of day
+    counts is shorthand for ``{"7d": window(7), ...}``. Day files covering
+    the union of the windows are read once and each day feeds every window
+    containing it. Without ``group_by`` days come from the per-day
+    aggregate cache (or SQL, with ``sqlite_store`` and exact stats); with
+    it (a key from ``GROUP_KEYS`` or a list of them) events are scanned
+    into one aggregate per window and group.
+
+    Returns ``{label: stats}``, or ``{label: {group: stats}}`` when grouped
+    (group values are tuples for several keys, None when an event lacks the key).
+    """
+    if not isinstance(windows, dict):
+        windows = {f"{d}d": window(d) for d in windows}
+    keys = [group_by] if isinstance(group_by, str) else list(group_by or ())
+    for key in keys:
+        if key not in GROUP_KEYS:
+            raise ValueError(f"unknown group_by key: {key!r}")
+
+    first = min(start for start, _ in windows.values())
+    last = max(end for _, end in windows.values())
+    files = [
+        f for f in sorted(TELEMETRY_DIR.glob("events-*.jsonl"))
+        if first <= f.stem.replace("events-", "") <= last
+    ]
+    session_cwds = _session_cwds()
+
+    def labels_for(path: Path) -> list[str]:
+        date = path.stem.replace("events-", "")
+        return [label for label, (start, end) in windows.items() if start <= date <= end]
+
+    if not keys and not approximate and (plan or load_plan()).sqlite_store:
+        return _store_aggregates(windows, plan)
+    if not keys:
+        totals = {label: Aggregator(approximate, session_cwds) for label in windows}
+        for f in files:
+            day = _cached_day_aggregate(f, approximate, session_cwds)[0]
+            for label in labels_for(f):
+                totals[label].merge(day)
+        return {label: agg.result() for label, agg in totals.items()}
+
+    groups = {label: {} for label in windows}
+    for f in files:
+        targets = [groups[label] for label in labels_for(f)]
+        for e in iter_day_file(f, iso=False):
+            g = tuple(_group_value(e, key, session_cwds) for key in keys)
+            if len(keys) == 1:
+                g = g[0]
+            for by_group in targets:
+                agg = by_group.get(g)
+                if agg is None:
+                    agg = by_group[g] = Aggregator(approximate, session_cwds)
+                agg.add(e)
 
     return {
-        "total_events": len(events),
-        "unique_sessions": len(sessions),
-        "total_prompts": prompts,
-        "total_prompt_words": prompt_words,
-        "total_compacts": compacts,
-        "tool_counts": dict(tool_counts.most_common()),
-        "tool_stats": tool_stats,
-        "stop_reasons": dict(stops),
-        "agent_counts": dict(agents.most_common()),
-        "agent_tools": {agent: dict(tools.most_common()) for agent, tools in agent_tools.items()},
-        "event_type_counts": dict(event_type_counts),
-        "hourly_distribution": dict(sorted(hourly.items())),
-        "daily_counts": dict(sorted(daily.items())),
+        label: dict(sorted(
+            ((g, agg.result()) for g, agg in by_group.items()),
+            key=lambda kv: kv[1]["total_events"], reverse=True,
+        ))
+        for label, by_group in groups.items()
     }
 
 
-def text_report(days: int = 7) -> str:
-    """Generate a text summary report."""
-    events = load_events(days)
-    if not events:
-        return f"No telemetry events found in the last {days} days."
+# --- SQLite store ---
+
+def query(sql: str, params=(), plan: SinkPlan | None = None) -> list[dict]:
+    """Run ad hoc SQL against the local store (see ``store.py`` for the schema).
+
+    The store is brought up to date first, which only ingests bytes
+    appended since the previous sync.
+    """
+    import store
+    return store.query(sql, params, plan=plan)
+
+
+def _store_aggregates(windows: dict, plan: SinkPlan | None = None) -> dict:
+    """Exact ``{label: stats}`` for date windows, pushed down into the SQLite store."""
+    import store
+    conn = store.connect(plan=plan)
+    try:
+        store.sync(conn)
+        return {label: store.aggregate(start, end, conn) for label, (start, end) in windows.items()}
+    finally:
+        conn.close()
+
+
+# --- Multi-root (team-wide) aggregation ---
+
+def _root_cache_dir(root: Path) -> Path:
+    """Per-root cache location; kept locally so shared roots may be read-only."""
+    key = hashlib.sha1(str(root.resolve()).encode()).hexdigest()[:16]
+    return CACHE_DIR / "roots" / key
+
+
+def _root_day_partials(root: str, days: int, approximate: bool) -> list[tuple]:
+    """Worker: (date, path, session ids, digest, partial) for each day file of one root."""
+    root = Path(root)
+    session_cwds = _session_cwds(root)
+    cache_dir = _root_cache_dir(root)
+    partials = []
+    for f in _day_files(days, root):
+        agg, session_ids, digest = _cached_day_aggregate(f, approximate, session_cwds, cache_dir)
+        partials.append((f.stem.replace("events-", ""), f, session_ids, digest, agg))
+    return partials
+
+
+def _event_key(e: dict) -> tuple:
+    """Identity of an event across copies of the same telemetry directory.
+
+    The timestamp is taken in epoch ms, so a v1 and a v2 copy of one event match.
+    """
+    data = e.get("data") or {}
+    ts = e.get("ts_ms")
+    if ts is None:
+        try:
+            ts = _ms_from_iso(e.get("ts", ""))
+        except (TypeError, ValueError):
+            ts = e.get("ts")
+    return (e.get("session_id"), e.get("seq"), ts, e.get("event"), data.get("correlation_id"))
+
+
+def _dedup_scan(paths: list[Path], approximate: bool, session_cwds: dict) -> Aggregator:
+    agg = Aggregator(approximate, session_cwds)
+    seen = set()
+    for path in paths:
+        for e in iter_day_file(path, iso=False):
+            key = _event_key(e)
+            if key in seen:
+                continue
+            seen.add(key)
+            agg.add(e)
+    return agg
+
+
+def aggregate_roots(
+    roots: list, days: int = 7, approximate: bool = False, workers: int | None = None,
+) -> dict:
+    """Aggregate telemetry directories collected from many machines.
+
+    Roots are processed in parallel, each through its own per-day
+    aggregate cache, so adding a machine only scans that machine's files.
+    Day files that are byte-identical across roots are counted once; when
+    different roots share sessions on the same day (partially re-collected
+    data), those files are re-scanned together and events deduplicated by
+    (session_id, seq, ts, event, correlation_id).
+    """
+    roots = [str(Path(r).expanduser()) for r in roots]
+    workers = workers or min(len(roots), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            per_root = list(pool.map(_root_day_partials, roots, repeat(days), repeat(approximate)))
+    else:
+        per_root = [_root_day_partials(r, days, approximate) for r in roots]
+
+    session_cwds = {}
+    for root in roots:
+        session_cwds.update(_session_cwds(Path(root)))
+
+    by_date = defaultdict(list)
+    for partials in per_root:
+        for date, path, session_ids, digest, agg in partials:
+            agg.session_cwds = session_cwds
+            by_date[date].append((path, set(session_ids), digest, agg))
+
+    total = Aggregator(approximate, session_cwds)
+    for date in sorted(by_date):
+        entries = []
+        digests = set()
+        for entry in by_date[date]:
+            digest = entry[2]
+            if digest is not None and digest in digests:
+                continue  # same file collected twice
+            digests.add(digest)
+            entries.append(entry)
+
+        owners = Counter(sid for _, session_ids, _, _ in entries for sid in session_ids)
+        shared = {sid for sid, n in owners.items() if n > 1}
+        overlapping = []
+        for path, session_ids, _, agg in entries:
+            if shared & session_ids:
+                overlapping.append(path)
+            else:
+                total.merge(agg)
+        if overlapping:
+            total.merge(_dedup_scan(overlapping, approximate, session_cwds))
+
+    stats = total.result()
+    stats["roots"] = len(roots)
+    return stats
+
 
-    stats = aggregate(events)
-    sessions = load_sessions()
+def _current_and_previous(days: int, approximate: bool) -> tuple[dict, dict | None]:
+    """Stats for the last N days and the equally long period before, from a single pass.
+
+    The previous period is None (and not aggregated) when it has no day files.
+    """
+    current, previous = window(days), window(days, days + 1)
+    if not any(
+        previous[0] <= f.stem.replace("events-", "") <= previous[1]
+        for f in TELEMETRY_DIR.glob("events-*.jsonl")
+    ):
+        return aggregate_windows({"current": current}, approximate=approximate)["current"], None
+    both = aggregate_windows({"current": current, "previous": previous}, approximate=approximate)
+    return both["current"], both["previous"]
+
+
+def _previous_label(days: int) -> str:
+    """Dates of the comparison period, which like ``window`` spans N + 1 calendar days."""
+    start, end = window(days, days + 1)
+    return f"{start} to {end}"
+
+
+def _change(now: float, before: float) -> str:
+    if not before:
+        return "new" if now else "–"
+    return f"{(now - before) / before * 100:+.0f}%"
+
+
+def _comparison_rows(stats: dict, previous: dict) -> list[tuple]:
+    return [
+        ("Events", stats["total_events"], previous["total_events"]),
+        ("Sessions", stats["unique_sessions"], previous["unique_sessions"]),
+        ("Prompts", stats["total_prompts"], previous["total_prompts"]),
+        ("Tool calls", sum(stats["tool_counts"].values()), sum(previous["tool_counts"].values())),
+        ("Compactions", stats["total_compacts"], previous["total_compacts"]),
+    ]
+
+
+def _tool_movers(stats: dict, previous: dict, n: int) -> list[tuple]:
+    """Tools with the largest absolute change in call count: (tool, now, before)."""
+    now, before = stats["tool_counts"], previous["tool_counts"]
+    rows = [(t, now.get(t, 0), before.get(t, 0)) for t in set(now) | set(before)]
+    rows = [r for r in rows if r[1] != r[2]]
+    return sorted(rows, key=lambda r: abs(r[1] - r[2]), reverse=True)[:n]
+
+
+def text_report(days: int = 7, approximate: bool = False, roots: list | None = None) -> str:
+    """Generate a text summary report.
+
+    The window and the previous period of equal length are aggregated in
+    one pass and compared; a period without day files is not read at all. With ``approximate=True`` the days are merged
+    from cached per-day sketches and estimated figures are prefixed with
+    ``~``. ``roots`` reports across many collected telemetry directories
+    instead of the local one (see ``aggregate_roots``), without the comparison.
+    """
+    if roots:
+        stats = aggregate_roots(roots, days, approximate)
+        if not stats["stored_events"]:
+            return f"No telemetry events found in the last {days} days."
+        sessions = {}
+        degraded = defaultdict(Counter)
+        for root in roots:
+            sessions.update(load_sessions(Path(root).expanduser()))
+            for kind, hooks in load_degradations(days, Path(root).expanduser()).items():
+                degraded[kind].update(hooks)
+        previous = None
+    else:
+        stats, previous = _current_and_previous(days, approximate)
+        if not stats["stored_events"]:
+            return f"No telemetry events found in the last {days} days."
+        sessions = load_sessions()
+        degraded = load_degradations(days)
+
+    def est(key: str) -> str:
+        return "~" if key in stats["estimated"] else ""
 
     lines = [
-        f"# Claude Code Telemetry Report ({days}-day window)",
+        f"# Claude Code Telemetry Report ({days}-day window"
+        + (f", {len(roots)} telemetry roots)" if roots else ")"),
         "",
         "## Overview",
-        f"- **Total events:** {stats['total_events']}",
-        f"- **Unique sessions:** {stats['unique_sessions']}",
+        f"- **Total events:** {stats['total_events']}"
+        + (f" (estimated from {stats['stored_events']} sampled events)"
+           if stats["stored_events"] != stats["total_events"] else ""),
+        f"- **Unique sessions:** {est('unique_sessions')}{stats['unique_sessions']}",
+        f"- **Working directories:** {est('unique_cwds')}{stats['unique_cwds']}",
         f"- **Total prompts:** {stats['total_prompts']}",
         f"- **Total prompt words:** {stats['total_prompt_words']}",
         f"- **Context compactions:** {stats['total_compacts']}",
         "",
     ]
+    if stats["estimated"]:
+        lines.append("_Figures prefixed with ~ are sketch estimates (about 1% error)._")
+        lines.append("")
+
+    # This period vs the previous one
+    if previous and previous["stored_events"]:
+        lines.append(f"## Compared to the Previous Period ({_previous_label(days)})")
+        lines.append("")
+        lines.append("| Metric | Now | Before | Change |")
+        lines.append("|--------|----:|-------:|-------:|")
+        for label, now, before in _comparison_rows(stats, previous):
+            lines.append(f"| {label} | {now} | {before} | {_change(now, before)} |")
+        movers = _tool_movers(stats, previous, 5)
+        if movers:
+            lines.append("")
+            lines.append("Biggest tool changes: " + ", ".join(
+                f"{tool} {now - before:+d} ({_change(now, before)})" for tool, now, before in movers
+            ))
+        lines.append("")
 
     # Tool usage
     if stats["tool_counts"]:
@@ -162,9 +800,17 @@ def text_report(days: int = 7) -> str:
         for tool, count in stats["tool_counts"].items():
             ts = stats["tool_stats"].get(tool, {})
             avg = ts.get("avg_ms", "-")
-            p50 = ts.get("p50_ms", "-")
+            p50 = f"{est('tool_stats')}{ts['p50_ms']}" if "p50_ms" in ts else "-"
             mx = ts.get("max_ms", "-")
-            lines.append(f"| {tool} | {count} | {avg} | {p50} | {mx} |")
+            lines.append(f"| {tool} | {est('tool_counts')}{count} | {avg} | {p50} | {mx} |")
+        lines.append("")
+
+    # Directory x tool hot spots
+    if stats["top_cwd_tools"]:
+        lines.append("## Top Directory × Tool Pairs")
+        lines.append("")
+        for pair in stats["top_cwd_tools"]:
+            lines.append(f"- {pair['cwd']} — {pair['tool']}: {est('top_cwd_tools')}{pair['count']}")
         lines.append("")
 
     # Agents
@@ -175,9 +821,9 @@ def text_report(days: int = 7) -> str:
             tools = stats.get("agent_tools", {}).get(agent, {})
             if tools:
                 top_tools = ", ".join(f"{t}({c})" for t, c in list(tools.items())[:5])
-                lines.append(f"- **{agent}:** {count} invocations — tools: {top_tools}")
+                lines.append(f"- **{agent}:** {est('agent_counts')}{count} invocations — tools: {top_tools}")
             else:
-                lines.append(f"- **{agent}:** {count} invocations")
+                lines.append(f"- **{agent}:** {est('agent_counts')}{count} invocations")
         lines.append("")
 
     # Stop reasons
@@ -206,6 +852,16 @@ def text_report(days: int = 7) -> str:
             lines.append(f"- {hour:02d}:00 — {count} {bar}")
         lines.append("")
 
+    if degraded:
+        lines.append("## Hook Degradations")
+        lines.append("")
+        lines.append("_Steps hooks skipped or deferred to stay within their timeout._")
+        lines.append("")
+        for kind, hooks in sorted(degraded.items(), key=lambda x: -sum(x[1].values())):
+            by_hook = ", ".join(f"{hook} {n}" for hook, n in Counter(hooks).most_common())
+            lines.append(f"- {kind}: {sum(hooks.values())} ({by_hook})")
+        lines.append("")
+
     # Recent sessions
     active = [(sid, s) for sid, s in sessions.items() if s.get("status") == "active"]
     ended = [(sid, s) for sid, s in sessions.items() if s.get("status") == "ended"]
@@ -230,10 +886,13 @@ def text_report(days: int = 7) -> str:
     return "\n".join(lines)
 
 
-def html_dashboard(days: int = 7) -> str:
-    """Generate an HTML dashboard using Chart.js."""
-    events = load_events(days)
-    stats = aggregate(events)
+def html_dashboard(days: int = 7, approximate: bool = False, roots: list | None = None) -> str:
+    """Generate an HTML dashboard using Chart.js, with changes vs the previous period."""
+    if roots:
+        stats = aggregate_roots(roots, days, approximate)
+        previous = None
+    else:
+        stats, previous = _current_and_previous(days, approximate)
 
     template_path = TEMPLATE_DIR / "dashboard.html"
     if not template_path.exists():
@@ -244,6 +903,15 @@ def html_dashboard(days: int = 7) -> str:
     # Prepare data for Chart.js
     tool_labels = json.dumps(list(stats["tool_counts"].keys())[:15])
     tool_values = json.dumps(list(stats["tool_counts"].values())[:15])
+    tool_prev_values = json.dumps(
+        [previous["tool_counts"].get(t, 0) for t in list(stats["tool_counts"])[:15]]
+        if previous and previous["stored_events"] else []
+    )
+
+    deltas = {}
+    if previous and previous["stored_events"]:
+        for label, now, before in _comparison_rows(stats, previous):
+            deltas[label] = f"{_change(now, before)} vs {_previous_label(days)} ({before})"
 
     hourly_labels = json.dumps([f"{h:02d}:00" for h in range(24)])
     hourly_values = json.dumps([stats["hourly_distribution"].get(h, 0) for h in range(24)])
@@ -267,6 +935,16 @@ def html_dashboard(days: int = 7) -> str:
         "/*TOOL_LABELS*/", tool_labels
     ).replace(
         "/*TOOL_VALUES*/", tool_values
+    ).replace(
+        "/*TOOL_PREV_VALUES*/", tool_prev_values
+    ).replace(
+        "/*EVENTS_DELTA*/", deltas.get("Events", "")
+    ).replace(
+        "/*SESSIONS_DELTA*/", deltas.get("Sessions", "")
+    ).replace(
+        "/*PROMPTS_DELTA*/", deltas.get("Prompts", "")
+    ).replace(
+        "/*COMPACTS_DELTA*/", deltas.get("Compactions", "")
     ).replace(
         "/*HOURLY_LABELS*/", hourly_labels
     ).replace(
@@ -0,0 +1,278 @@
+"""
+Mergeable probabilistic sketches for approximate, constant-memory reports.
+
+- HyperLogLog: distinct counts (sessions, working directories), ~0.8% error
+- SpaceSaving: top-k heavy hitters with bounded overestimation
+- CountMinSketch / HeavyHitters: frequencies over large key spaces (cwd x tool)
+- LogHistogram: relative-error quantiles for durations
+
+Every sketch supports ``merge`` (across days and machines) and round-trips
+through ``to_dict`` / ``from_dict`` so it can live in the aggregate cache.
+"""
+
+import base64
+import hashlib
+import math
+import zlib
+from array import array
+
+
+def _hash64(item: str) -> int:
+    digest = hashlib.blake2b(item.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _pack(data: bytes) -> str:
+    return base64.b64encode(zlib.compress(data)).decode()
+
+
+def _unpack(text: str) -> bytes:
+    return zlib.decompress(base64.b64decode(text))
+
+
+class HyperLogLog:
+    """Distinct-count estimator with 2**p one-byte registers."""
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, item: str) -> None:
+        h = _hash64(item)
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        regs = self.registers
+        for i, r in enumerate(other.registers):
+            if r > regs[i]:
+                regs[i] = r
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        z = sum(2.0 ** -r for r in self.registers)
+        estimate = alpha * m * m / z
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+    def to_dict(self) -> dict:
+        return {"p": self.p, "registers": _pack(bytes(self.registers))}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "HyperLogLog":
+        hll = cls(d["p"])
+        hll.registers = bytearray(_unpack(d["registers"]))
+        return hll
+
+
+class SpaceSaving:
+    """Top-k summary (Metwally et al.). Counts overestimate by at most ``error``."""
+
+    def __init__(self, k: int = 64):
+        self.k = k
+        self.counts = {}  # item -> [count, error]
+
+    def add(self, item: str, weight: float = 1) -> None:
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[0] += weight
+        elif len(self.counts) < self.k:
+            self.counts[item] = [weight, 0]
+        else:
+            victim = min(self.counts, key=lambda x: self.counts[x][0])
+            floor = self.counts.pop(victim)[0]
+            self.counts[item] = [floor + weight, floor]
+
+    def _floor(self) -> float:
+        if len(self.counts) < self.k:
+            return 0
+        return min(c for c, _ in self.counts.values())
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Mergeable-summaries combine: absent items count as the other side's minimum."""
+        mine, theirs = self._floor(), other._floor()
+        merged = {}
+        for item in set(self.counts) | set(other.counts):
+            a = self.counts.get(item, [mine, mine])
+            b = other.counts.get(item, [theirs, theirs])
+            merged[item] = [a[0] + b[0], a[1] + b[1]]
+        top = sorted(merged.items(), key=lambda kv: kv[1][0], reverse=True)[:self.k]
+        self.counts = dict(top)
+
+    def top(self, n: int | None = None) -> list[tuple[str, float]]:
+        ranked = sorted(self.counts.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(item, c) for item, (c, _) in ranked[:n]]
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SpaceSaving":
+        ss = cls(d["k"])
+        ss.counts = {item: list(v) for item, v in d["counts"].items()}
+        return ss
+
+
+class CountMinSketch:
+    """Frequency estimator; estimates never undercount."""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = array("d", bytes(8 * width * depth))
+
+    def _cells(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=4 * self.depth).digest()
+        for row in range(self.depth):
+            col = int.from_bytes(digest[4 * row:4 * row + 4], "big") % self.width
+            yield row * self.width + col
+
+    def add(self, item: str, weight: float = 1) -> float:
+        """Add ``weight`` (conservative update) and return the updated estimate."""
+        table = self.table
+        cells = list(self._cells(item))
+        est = min(table[cell] for cell in cells) + weight
+        for cell in cells:
+            if table[cell] < est:
+                table[cell] = est
+        return est
+
+    def estimate(self, item: str) -> float:
+        return min(self.table[cell] for cell in self._cells(item))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("cannot merge CountMinSketches of different shape")
+        table = self.table
+        for i, v in enumerate(other.table):
+            if v:
+                table[i] += v
+
+    def to_dict(self) -> dict:
+        return {"width": self.width, "depth": self.depth, "table": _pack(self.table.tobytes())}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "CountMinSketch":
+        cms = cls(d["width"], d["depth"])
+        cms.table = array("d")
+        cms.table.frombytes(_unpack(d["table"]))
+        return cms
+
+
+class HeavyHitters:
+    """Count-Min sketch plus a bounded candidate set of the k heaviest keys."""
+
+    def __init__(self, k: int = 32, width: int = 2048, depth: int = 4):
+        self.k = k
+        self.cms = CountMinSketch(width, depth)
+        self.candidates = {}  # item -> estimate
+
+    def add(self, item: str, weight: float = 1) -> None:
+        est = self.cms.add(item, weight)
+        cand = self.candidates
+        if item in cand or len(cand) < self.k:
+            cand[item] = est
+            return
+        victim = min(cand, key=cand.get)
+        if est > cand[victim]:
+            del cand[victim]
+            cand[item] = est
+
+    def merge(self, other: "HeavyHitters") -> None:
+        self.cms.merge(other.cms)
+        pool = set(self.candidates) | set(other.candidates)
+        ranked = sorted(((x, self.cms.estimate(x)) for x in pool), key=lambda kv: kv[1], reverse=True)
+        self.candidates = dict(ranked[:self.k])
+
+    def top(self, n: int | None = None) -> list[tuple[str, float]]:
+        return sorted(self.candidates.items(), key=lambda kv: kv[1], reverse=True)[:n]
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "cms": self.cms.to_dict(), "candidates": self.candidates}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "HeavyHitters":
+        hh = cls(d["k"])
+        hh.cms = CountMinSketch.from_dict(d["cms"])
+        hh.candidates = dict(d["candidates"])
+        return hh
+
+
+class LogHistogram:
+    """Log-bucketed histogram with ``rel_error`` relative accuracy on quantiles."""
+
+    def __init__(self, rel_error: float = 0.01):
+        self.rel_error = rel_error
+        self.gamma = (1 + rel_error) / (1 - rel_error)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}  # bucket index -> weight
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, weight: float = 1) -> None:
+        if value > 0:
+            idx = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[idx] = self.buckets.get(idx, 0) + weight
+        else:
+            self.zeros += weight
+        self.count += weight
+        self.total += value * weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LogHistogram") -> None:
+        for idx, w in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + w
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float | None:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = self.zeros
+        if seen > rank:
+            return 0.0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen > rank:
+                return min(max(2 * self.gamma ** idx / (self.gamma + 1), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "rel_error": self.rel_error,
+            "buckets": {str(i): w for i, w in self.buckets.items()},
+            "zeros": self.zeros,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LogHistogram":
+        h = cls(d["rel_error"])
+        h.buckets = {int(i): w for i, w in d["buckets"].items()}
+        h.zeros = d["zeros"]
+        h.count = d["count"]
+        h.total = d["total"]
+        if d["min"] is not None:
+            h.min = d["min"]
+            h.max = d["max"]
+        return h
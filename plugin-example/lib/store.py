@@ -0,0 +1,407 @@
+"""
+Local SQLite analytics store — day files mirrored into indexed tables.
+
+``sync`` ingests only the bytes appended to each ``events-YYYY-MM-DD.jsonl``
+since the last run (v1 or v2), tracking a byte offset and the v2 intern
+table per file in ``files``. Rewritten files are re-ingested and files
+removed by retention are dropped, so the store always mirrors the day
+files on disk. Ad hoc questions then run as SQL instead of re-scanning
+the history:
+
+    events      one row per event (ts is epoch ms, data the raw JSON)
+    tool_spans  completed tool calls (tool_end / tool_span) with duration
+    sessions    one row per session: cwd, start, end, duration, status
+
+Usage:
+    python3 store.py --sync
+    python3 store.py "SELECT tool_name, COUNT(*) FROM tool_spans GROUP BY 1"
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from telemetry import _EPOCH, SESSIONS_PATH, TELEMETRY_DIR, EventDecoder, SinkPlan, load_plan
+
+STORE_PATH = TELEMETRY_DIR / "telemetry.db"
+SCHEMA_VERSION = 1
+
+# Rows buffered before an executemany
+_INSERT_BATCH = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    ino INTEGER,
+    names TEXT              -- v2 intern table (id -> name) at offset
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    ts INTEGER NOT NULL,    -- epoch milliseconds, UTC
+    day TEXT NOT NULL,      -- YYYY-MM-DD, the day file it came from
+    hour INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER,
+    tool_name TEXT,
+    weight REAL NOT NULL DEFAULT 1,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (session_id);
+CREATE INDEX IF NOT EXISTS events_tool_ts ON events (tool_name, ts);
+CREATE INDEX IF NOT EXISTS events_type_ts ON events (event_type, ts);
+CREATE INDEX IF NOT EXISTS events_day ON events (day);
+CREATE TABLE IF NOT EXISTS tool_spans (
+    ts INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    tool_name TEXT NOT NULL,
+    correlation_id TEXT,
+    duration_ms REAL,
+    result_size INTEGER,
+    weight REAL NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS tool_spans_tool_ts ON tool_spans (tool_name, ts);
+CREATE INDEX IF NOT EXISTS tool_spans_session ON tool_spans (session_id);
+CREATE INDEX IF NOT EXISTS tool_spans_day ON tool_spans (day);
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    cwd TEXT,
+    started_ts INTEGER,
+    ended_ts INTEGER,
+    duration_ms INTEGER,
+    status TEXT
+);
+"""
+
+
+def connect(path: Path = STORE_PATH, plan: SinkPlan | None = None) -> sqlite3.Connection:
+    """Open (creating if needed) the store. Rows come back as ``sqlite3.Row``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # The store is rebuilt from the day files if lost, so even "group_commit"
+    # only syncs each ingest transaction's WAL frames
+    synchronous = {"none": "OFF", "buffered": "NORMAL"}.get((plan or load_plan()).durability, "FULL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        conn.executescript(_SCHEMA)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    return conn
+
+
+# --- Incremental ingestion ---
+
+def _ts_ms(event: dict) -> int:
+    ms = event.get("ts_ms")
+    if ms is None:
+        ms = (datetime.fromisoformat(event["ts"]) - _EPOCH) // timedelta(milliseconds=1)
+    return ms
+
+
+def _drop_day(conn: sqlite3.Connection, name: str) -> None:
+    day = name[len("events-"):len("events-YYYY-MM-DD")]
+    conn.execute("DELETE FROM events WHERE day = ?", (day,))
+    conn.execute("DELETE FROM tool_spans WHERE day = ?", (day,))
+    conn.execute("DELETE FROM files WHERE name = ?", (name,))
+
+
+def _flush(conn: sqlite3.Connection, events: list, spans: list) -> None:
+    conn.executemany(
+        "INSERT INTO events (ts, day, hour, event_type, session_id, seq, tool_name, weight, data)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+    conn.executemany(
+        "INSERT INTO tool_spans (ts, day, session_id, tool_name, correlation_id,"
+        " duration_ms, result_size, weight) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", spans)
+    events.clear()
+    spans.clear()
+
+
+def _session_row(conn: sqlite3.Connection, event: dict, ts: int) -> None:
+    data = event.get("data") or {}
+    if event["event"] == "session_start":
+        conn.execute(
+            "INSERT INTO sessions (session_id, cwd, started_ts, status) VALUES (?, ?, ?, 'active')"
+            " ON CONFLICT (session_id) DO UPDATE SET"
+            " cwd = COALESCE(excluded.cwd, cwd), started_ts = excluded.started_ts",
+            (event["session_id"], data.get("cwd") or None, ts))
+    else:
+        conn.execute(
+            "INSERT INTO sessions (session_id, ended_ts, duration_ms, status) VALUES (?, ?, ?, 'ended')"
+            " ON CONFLICT (session_id) DO UPDATE SET ended_ts = excluded.ended_ts,"
+            " duration_ms = excluded.duration_ms, status = 'ended'",
+            (event["session_id"], ts, data.get("duration_ms")))
+
+
+def _ingest_file(conn: sqlite3.Connection, path: Path) -> tuple[int, int]:
+    """Ingest the complete lines appended to ``path`` since the last sync.
+
+    Runs in one write transaction, so concurrent syncs never ingest the
+    same bytes twice. Returns (events, bytes) ingested.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        st = path.stat()
+        row = conn.execute("SELECT offset, ino, names FROM files WHERE name = ?", (path.name,)).fetchone()
+        offset, names = 0, {}
+        if row is not None:
+            if row["ino"] != st.st_ino or row["offset"] > st.st_size:
+                _drop_day(conn, path.name)  # file was rewritten; start over
+            else:
+                offset, names = row["offset"], json.loads(row["names"] or "{}")
+        if offset == st.st_size:
+            conn.execute("COMMIT")
+            return 0, 0
+
+        decoder = EventDecoder(iso=False)
+        decoder.names = names
+        day = path.stem[len("events-"):]
+        events, spans, count = [], [], 0
+        pos = offset
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being appended; picked up next time
+                pos += len(line)
+                try:
+                    event = decoder.feed(line)
+                    if event is None:
+                        continue
+                    ts = _ts_ms(event)
+                    event_type = event["event"]
+                    data = event.get("data") or {}
+                    weight = event.get("weight", 1)
+                    tool_name = data.get("tool_name")
+                    events.append((
+                        ts, day, ts % 86_400_000 // 3_600_000, event_type, event["session_id"],
+                        event.get("seq"), tool_name, weight, json.dumps(data, default=str),
+                    ))
+                except (ValueError, KeyError, IndexError, TypeError):
+                    continue
+                count += 1
+                if event_type in ("tool_end", "tool_span"):
+                    spans.append((
+                        ts, day, event["session_id"], tool_name or "unknown",
+                        data.get("correlation_id"), data.get("duration_ms"),
+                        data.get("result_size"), weight,
+                    ))
+                elif event_type in ("session_start", "session_end"):
+                    _session_row(conn, event, ts)
+                if len(events) >= _INSERT_BATCH:
+                    _flush(conn, events, spans)
+        _flush(conn, events, spans)
+
+        conn.execute(
+            "INSERT OR REPLACE INTO files (name, offset, ino, names) VALUES (?, ?, ?, ?)",
+            (path.name, pos, st.st_ino, json.dumps(decoder.names)))
+        conn.execute("COMMIT")
+        return count, pos - offset
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _merge_session_index(conn: sqlite3.Connection, sessions_path: Path) -> None:
+    """Fill cwd and status from sessions.json (skipped while it is unchanged)."""
+    try:
+        st = sessions_path.stat()
+        fingerprint = json.dumps([st.st_mtime_ns, st.st_size])
+        row = conn.execute("SELECT value FROM meta WHERE key = 'sessions_json'").fetchone()
+        if row is not None and row["value"] == fingerprint:
+            return
+        sessions = json.loads(sessions_path.read_text())
+    except (OSError, json.JSONDecodeError):
+        return
+    rows = [
+        (sid, s.get("cwd") or None, s.get("status"))
+        for sid, s in sessions.items() if isinstance(s, dict)
+    ]
+    conn.executemany(
+        "INSERT INTO sessions (session_id, cwd, status) VALUES (?, ?, ?)"
+        " ON CONFLICT (session_id) DO UPDATE SET cwd = COALESCE(cwd, excluded.cwd),"
+        " status = COALESCE(excluded.status, status)", rows)
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sessions_json', ?)", (fingerprint,))
+
+
+def sync(conn: sqlite3.Connection | None = None, root: Path = TELEMETRY_DIR) -> dict:
+    """Bring the store up to date with the day files under ``root``. Returns stats."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        on_disk = {f.name: f for f in sorted(root.glob("events-*.jsonl"))}
+        stats = {"files": 0, "events": 0, "bytes": 0, "dropped_files": 0}
+        for (name,) in conn.execute("SELECT name FROM files").fetchall():
+            if name not in on_disk:
+                conn.execute("BEGIN IMMEDIATE")
+                _drop_day(conn, name)
+                conn.execute("COMMIT")
+                stats["dropped_files"] += 1
+        for path in on_disk.values():
+            try:
+                count, size = _ingest_file(conn, path)
+            except FileNotFoundError:
+                continue
+            if size:
+                stats["files"] += 1
+                stats["events"] += count
+                stats["bytes"] += size
+        conn.execute("BEGIN IMMEDIATE")
+        _merge_session_index(conn, root / SESSIONS_PATH.name)
+        conn.execute("COMMIT")
+        return stats
+    finally:
+        if own:
+            conn.close()
+
+
+def query(
+    sql: str, params=(), refresh: bool = True, plan: SinkPlan | None = None,
+) -> list[dict]:
+    """Run ``sql`` against the store (synced first unless ``refresh=False``)."""
+    conn = connect(plan=plan)
+    try:
+        if refresh:
+            sync(conn)
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+
+# --- Aggregation pushdown ---
+
+def _rounded(rows) -> dict:
+    return {k: round(v) for k, v in rows}
+
+
+def aggregate(start: str, end: str, conn: sqlite3.Connection | None = None) -> dict:
+    """Exact stats for days ``start``..``end`` (YYYY-MM-DD), computed in SQL.
+
+    Returns the same shape as ``reporter.aggregate``; only the result rows
+    leave SQLite. Ties in ranked lists may be ordered differently.
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        w = (start, end)
+        in_window = "day BETWEEN ? AND ?"
+
+        def rows(sql: str, params=w) -> list:
+            return conn.execute(sql, params).fetchall()
+
+        totals = rows(f"""
+            SELECT COALESCE(SUM(weight), 0), COUNT(*), COUNT(DISTINCT session_id),
+                   COALESCE(SUM(CASE WHEN event_type = 'prompt' THEN weight END), 0),
+                   COALESCE(SUM(CASE WHEN event_type = 'prompt'
+                       THEN COALESCE(json_extract(data, '$.word_count'), 0) * weight END), 0),
+                   COALESCE(SUM(CASE WHEN event_type = 'pre_compact' THEN weight END), 0)
+            FROM events WHERE {in_window}""")[0]
+        unique_cwds = rows(f"""
+            SELECT COUNT(DISTINCT json_extract(data, '$.cwd')) FROM events
+            WHERE event_type = 'session_start' AND {in_window}
+              AND COALESCE(json_extract(data, '$.cwd'), '') != ''""")[0][0]
+
+        tool_counts = _rounded(rows(f"""
+            SELECT tool_name, SUM(weight) AS n FROM tool_spans WHERE {in_window}
+            GROUP BY tool_name ORDER BY n DESC"""))
+        p50 = dict(rows(f"""
+            SELECT tool_name, duration_ms FROM (
+                SELECT tool_name, duration_ms,
+                       ROW_NUMBER() OVER (PARTITION BY tool_name ORDER BY duration_ms) AS rn,
+                       COUNT(*) OVER (PARTITION BY tool_name) AS n
+                FROM tool_spans WHERE {in_window} AND duration_ms IS NOT NULL)
+            WHERE rn = n / 2 + 1"""))
+        tool_stats = {
+            tool: {
+                "count": tool_counts.get(tool, 0),
+                "avg_ms": round(avg, 1),
+                "min_ms": round(lo, 1),
+                "max_ms": round(hi, 1),
+                "p50_ms": round(p50[tool], 1),
+            }
+            for tool, avg, lo, hi in rows(f"""
+                SELECT tool_name, AVG(duration_ms), MIN(duration_ms), MAX(duration_ms)
+                FROM tool_spans WHERE {in_window} AND duration_ms IS NOT NULL
+                GROUP BY tool_name""")
+        }
+
+        agent = """COALESCE(NULLIF(json_extract(data, '$.agent_type'), ''),
+                            NULLIF(json_extract(data, '$.agent_name'), ''), 'unknown')"""
+        agent_counts = _rounded(rows(f"""
+            SELECT {agent} AS agent, SUM(weight) AS n FROM events
+            WHERE event_type = 'subagent_stop' AND {in_window}
+            GROUP BY agent ORDER BY n DESC"""))
+        agent_tools = {}
+        for agent_type, tool, n in rows(f"""
+                SELECT {agent} AS agent, t.key, SUM(t.value * weight) AS n
+                FROM events, json_each(events.data, '$.tool_counts') AS t
+                WHERE event_type = 'subagent_stop' AND {in_window}
+                GROUP BY agent, t.key ORDER BY n DESC"""):
+            agent_tools.setdefault(agent_type, {})[tool] = round(n)
+
+        top_cwd_tools = [
+            {"cwd": cwd, "tool": tool, "count": round(n)}
+            for cwd, tool, n in rows(f"""
+                SELECT s.cwd, t.tool_name, SUM(t.weight) AS n
+                FROM tool_spans t JOIN sessions s USING (session_id)
+                WHERE t.{in_window} AND COALESCE(s.cwd, '') != ''
+                GROUP BY s.cwd, t.tool_name ORDER BY n DESC LIMIT 10""")
+        ]
+
+        return {
+            "total_events": round(totals[0]),
+            "stored_events": totals[1],
+            "unique_sessions": totals[2],
+            "unique_cwds": unique_cwds,
+            "total_prompts": round(totals[3]),
+            "total_prompt_words": round(totals[4]),
+            "total_compacts": round(totals[5]),
+            "tool_counts": tool_counts,
+            "tool_stats": tool_stats,
+            "stop_reasons": _rounded(rows(f"""
+                SELECT COALESCE(json_extract(data, '$.reason'), 'unknown') AS reason, SUM(weight)
+                FROM events WHERE event_type = 'stop' AND {in_window} GROUP BY reason""")),
+            "agent_counts": agent_counts,
+            "agent_tools": agent_tools,
+            "top_cwd_tools": top_cwd_tools,
+            "event_type_counts": _rounded(rows(f"""
+                SELECT event_type, SUM(weight) FROM events WHERE {in_window} GROUP BY event_type""")),
+            "hourly_distribution": _rounded(rows(f"""
+                SELECT hour, SUM(weight) FROM events WHERE {in_window} GROUP BY hour ORDER BY hour""")),
+            "daily_counts": _rounded(rows(f"""
+                SELECT day, SUM(weight) FROM events WHERE {in_window} GROUP BY day ORDER BY day""")),
+            "estimated": [],
+        }
+    finally:
+        if own:
+            conn.close()
+
+
+# --- CLI ---
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Query the local telemetry SQLite store.")
+    parser.add_argument("sql", nargs="?", help="SQL to run after syncing")
+    parser.add_argument("--sync", action="store_true", help="only sync the store and print stats")
+    args = parser.parse_args(argv)
+    if args.sync or not args.sql:
+        print(json.dumps(sync(), indent=2))
+        return
+    try:
+        for row in query(args.sql):
+            print(json.dumps(row, default=str))
+    except sqlite3.Error as e:
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
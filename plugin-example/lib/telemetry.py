@@ -9,20 +9,32 @@ Design goals:
 """
 
 import fcntl
+import fnmatch
 import json
 import os
+import random
+import re
 import sys
 import time
 import uuid
+from dataclasses import dataclass, field, fields
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 
 # Paths
 TELEMETRY_DIR = Path.home() / ".claude" / "telemetry"
 CONFIG_PATH = TELEMETRY_DIR / "config.json"
+PLAN_PATH = TELEMETRY_DIR / ".plan.json"  # validated snapshot of config.json
 SESSIONS_PATH = TELEMETRY_DIR / "sessions.json"
 PENDING_DIR = TELEMETRY_DIR / ".pending"
-PUSH_QUEUE_PATH = TELEMETRY_DIR / ".push_queue.jsonl"
+PUSH_QUEUE_PATH = TELEMETRY_DIR / ".push_queue.jsonl"  # active segment, appended by hooks
+PUSH_SEGMENTS_DIR = TELEMETRY_DIR / ".push_segments"  # sealed, gzipped segments
+PUSH_STATE_PATH = TELEMETRY_DIR / ".push_state.json"  # segment progress, backoff, drop counts
+PUSH_DROPPED_PATH = TELEMETRY_DIR / ".push_dropped.jsonl"  # drops not yet folded into the state
+CACHE_DIR = TELEMETRY_DIR / ".cache"  # reporter's per-day aggregate cache
+SPILL_DIR = TELEMETRY_DIR / ".spill"  # writes deferred by hooks short on time
+DEGRADED_PATH = TELEMETRY_DIR / ".degraded.jsonl"  # one line per degraded hook step
+SYNC_DIR = TELEMETRY_DIR / ".sync"  # group commit: time and size of each log's last fsync
 
 # Defaults
 DEFAULT_CONFIG = {
@@ -37,19 +49,81 @@ DEFAULT_CONFIG = {
     "api_url": None,        # SaaS endpoint, e.g. https://telemetry.pando.codes
     "api_key": None,         # ct_live_... key from the SaaS
     "push_batch_size": 100,  # events per batch POST
+    # Push queue bounds (bytes on disk, events) and what to do when they are hit:
+    # "drop_oldest", "drop_low_priority" (tool events first) or "stop" (drop new events)
+    "push_queue_max_bytes": 50_000_000,
+    "push_queue_max_events": 500_000,
+    "push_overflow_policy": "drop_oldest",
+    # Minimum seconds between background maintenance runs, per task
+    "maintenance_intervals_s": {
+        "spill_merge": 0,         # whenever a hook deferred writes
+        "push_flush": 0,          # whenever events are queued
+        "retention": 86400,
+        "pending_sweep": 3600,
+        "session_index": 86400,
+        "cache_warm": 3600,
+        "store_sync": 300,        # only with sqlite_store
+    },
+    "sqlite_store": False,   # mirror day files into telemetry.db for SQL reports
+    # What survives a crash or power loss: "none" (no fsync), "buffered"
+    # (snapshots such as sessions.json and the push state are fsynced) or
+    # "group_commit" (also fsync day files and the push queue, at most once
+    # per interval or per so many bytes, shared by all hook processes)
+    "durability": "buffered",
+    "group_commit_interval_ms": 1000,
+    "group_commit_bytes": 65536,
+    "event_format": "v1",    # day file lines: "v1" (verbose JSON) or "v2" (compact, interned)
+    "tool_event_mode": "pair",  # "pair" (tool_start + tool_end) or "span" (one tool_span)
+    "push_mode": "raw",      # "raw" or "rollup" (per-session, per-tool rollups)
+    "push_raw_sample_rate": 0.01,  # rollup mode: fraction of sessions shipped raw
+    # Keep/drop/sample rules, first match wins, e.g.
+    # {"event": "tool_*", "tool_name": "Read|Grep|Glob", "action": "sample", "rate": 0.1}
+    "rules": [],
 }
 
 # Map local event types to SaaS-expected types
 _EVENT_TYPE_MAP = {
     "tool_start": "tool_use",
     "tool_end": "tool_result",
+    "tool_span": "tool_result",
     "prompt": "prompt_submit",
     "stop": "assistant_stop",
 }
 
+# Upper bounds (ms) of the duration histogram buckets used in rollups.
+# A rollup histogram has one extra trailing bucket for anything slower.
+DURATION_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# SaaS event types that are always shipped as-is in rollup mode
+_ROLLUP_PASSTHROUGH = {
+    "session_start", "session_end", "prompt_submit", "assistant_stop",
+    "pre_compact", "error", "tool_rollup", "agent_rollup",
+}
+
+# Hook time budgets (seconds), mirroring the timeouts in hooks/hooks.json
+HOOK_TIMEOUT_S = 5
+SESSION_HOOK_TIMEOUT_S = 10
+DEADLINE_MARGIN_S = 1.0     # interpreter exit and slack for a slow disk
+OPTIONAL_RESERVE_S = 1.0    # optional work is skipped below this much time left
+LOCK_WAIT_BUDGET_S = 1.0    # all of a hook's lock waits together, before spilling
+OPTIONAL_LOCK_WAIT_S = 0.2  # longest wait for the push queue lock
+SPILL_RESERVE_S = 0.25      # kept back so a timed-out write can still spill
+
+# Push queue: SaaS event types dropped first by the "drop_low_priority" policy
+LOW_PRIORITY_EVENTS = {"tool_use", "tool_result"}
+PUSH_SEAL_BYTES = 1 << 20     # seal the active segment early once it is this large
+PUSH_BACKOFF_BASE_S = 60
+PUSH_BACKOFF_MAX_S = 6 * 3600
+
 # Module-level sequence counter (per-process)
 _seq_counter = 0
 
+# Sink plan loaded by this process, with the config.json fingerprint it was built from
+_plan_cache = None
+
+# Intern sidecars read by this process, by day file: (sidecar, stat key, day file size, ids)
+_intern_cache = {}
+
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
@@ -60,20 +134,200 @@ def _today_str() -> str:
 
 
 def load_config() -> dict:
-    """Load config, creating defaults if missing."""
-    TELEMETRY_DIR.mkdir(parents=True, exist_ok=True)
-    if CONFIG_PATH.exists():
-        try:
-            return json.loads(CONFIG_PATH.read_text())
-        except (json.JSONDecodeError, OSError):
-            pass
-    # Write defaults
-    CONFIG_PATH.write_text(json.dumps(DEFAULT_CONFIG, indent=2) + "\n")
+    """Load the raw config dict, falling back to defaults. Never writes."""
+    try:
+        config = json.loads(CONFIG_PATH.read_text())
+        if isinstance(config, dict):
+            return config
+    except (json.JSONDecodeError, OSError):
+        pass
     return dict(DEFAULT_CONFIG)
 
 
-def is_enabled() -> bool:
-    return load_config().get("enabled", True)
+def ensure_default_config() -> bool:
+    """Setup step: create the telemetry dir and a default config if missing.
+
+    Returns True if a config was written. Hooks on the hot path never call
+    this; SessionStart and the connect command do.
+    """
+    TELEMETRY_DIR.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(str(CONFIG_PATH), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        f.write(json.dumps(DEFAULT_CONFIG, indent=2) + "\n")
+    return True
+
+
+# --- Sink plan ---
+
+@dataclass(frozen=True)
+class SinkPlan:
+    """Validated, immutable view of config.json, loaded once per invocation.
+
+    Hooks build it with ``load_plan`` and pass it to every telemetry call.
+    Invalid or missing settings fall back to their defaults.
+    """
+
+    enabled: bool = True
+    log_prompt_content: bool = False
+    tool_input_preview_chars: int = 100
+    log_tool_results: bool = False
+    retention_days: int = 30
+    webhook_url: str | None = None
+    api_url: str | None = None
+    api_key: str | None = None
+    push_batch_size: int = 100
+    push_queue_max_bytes: int = 50_000_000
+    push_queue_max_events: int = 500_000
+    push_overflow_policy: str = "drop_oldest"
+    push_mode: str = "raw"
+    push_raw_sample_rate: float = 0.01
+    tool_event_mode: str = "pair"
+    event_format: str = "v1"
+    sqlite_store: bool = False
+    durability: str = "buffered"
+    group_commit_interval_ms: int = 1000
+    group_commit_bytes: int = 65536
+    maintenance_intervals_s: tuple = ()  # ((task, seconds or None), ...)
+    rules: tuple = ()
+    matcher: "RuleMatcher | None" = field(default=None, compare=False, repr=False)
+
+    @property
+    def push(self) -> bool:
+        """Events are queued for the SaaS."""
+        return bool(self.api_key)
+
+    @property
+    def span_mode(self) -> bool:
+        return self.tool_event_mode == "span"
+
+    @property
+    def fsync(self) -> bool:
+        """Snapshots are fsynced before they replace the old file."""
+        return self.durability != "none"
+
+    @property
+    def group_commit(self) -> bool:
+        """Appends to day files and the push queue are fsynced in batches."""
+        return self.durability == "group_commit"
+
+    def interval(self, task: str) -> float | None:
+        # Tasks missing from an older snapshot keep their default
+        default = DEFAULT_CONFIG["maintenance_intervals_s"].get(task)
+        return dict(self.maintenance_intervals_s).get(task, default)
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "matcher"}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "SinkPlan":
+        """Rebuild a plan from ``to_dict`` output (already validated)."""
+        d = dict(d)
+        d["maintenance_intervals_s"] = tuple(tuple(kv) for kv in d.get("maintenance_intervals_s", ()))
+        d["rules"] = tuple(d.get("rules", ()))
+        return cls(**d, matcher=compile_rules(list(d["rules"])))
+
+
+def _choice(value, allowed: tuple, default):
+    return value if value in allowed else default
+
+
+def _number(value, default, lo=None, hi=None, kind=float):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default
+    value = kind(value)
+    if lo is not None and value < lo:
+        value = lo
+    if hi is not None and value > hi:
+        value = hi
+    return value
+
+
+def _text(value) -> str | None:
+    return value if isinstance(value, str) and value else None
+
+
+def plan_from_config(config: dict) -> SinkPlan:
+    """Validate a raw config dict into a SinkPlan."""
+    privacy = config.get("privacy")
+    privacy = privacy if isinstance(privacy, dict) else {}
+    intervals = dict(DEFAULT_CONFIG["maintenance_intervals_s"])
+    if isinstance(config.get("maintenance_intervals_s"), dict):
+        for task, seconds in config["maintenance_intervals_s"].items():
+            intervals[task] = None if seconds is None else _number(seconds, intervals.get(task), lo=0)
+    rules = config.get("rules")
+    rules = tuple(r for r in rules if isinstance(r, dict)) if isinstance(rules, list) else ()
+    return SinkPlan(
+        enabled=config.get("enabled", True) is not False,
+        log_prompt_content=privacy.get("log_prompt_content") is True,
+        tool_input_preview_chars=_number(
+            privacy.get("tool_input_preview_chars"), 100, lo=0, kind=int),
+        log_tool_results=privacy.get("log_tool_results") is True,
+        retention_days=_number(config.get("retention_days"), 30, lo=1, kind=int),
+        webhook_url=_text(config.get("webhook_url")),
+        api_url=_text(config.get("api_url")),
+        api_key=_text(config.get("api_key")),
+        push_batch_size=_number(config.get("push_batch_size"), 100, lo=1, hi=1000, kind=int),
+        push_queue_max_bytes=_number(
+            config.get("push_queue_max_bytes"), 50_000_000, lo=65536, kind=int),
+        push_queue_max_events=_number(config.get("push_queue_max_events"), 500_000, lo=1, kind=int),
+        push_overflow_policy=_choice(
+            config.get("push_overflow_policy"), ("drop_oldest", "drop_low_priority", "stop"),
+            "drop_oldest"),
+        push_mode=_choice(config.get("push_mode"), ("raw", "rollup"), "raw"),
+        push_raw_sample_rate=_number(config.get("push_raw_sample_rate"), 0.01, lo=0.0, hi=1.0),
+        tool_event_mode=_choice(config.get("tool_event_mode"), ("pair", "span"), "pair"),
+        event_format=_choice(config.get("event_format"), ("v1", "v2"), "v1"),
+        sqlite_store=config.get("sqlite_store") is True,
+        durability=_choice(
+            config.get("durability"), ("none", "buffered", "group_commit"), "buffered"),
+        group_commit_interval_ms=_number(
+            config.get("group_commit_interval_ms"), 1000, lo=0, kind=int),
+        group_commit_bytes=_number(config.get("group_commit_bytes"), 65536, lo=0, kind=int),
+        maintenance_intervals_s=tuple(sorted(intervals.items())),
+        rules=rules,
+        matcher=compile_rules(list(rules)),
+    )
+
+
+def load_plan() -> SinkPlan:
+    """The current SinkPlan. The common case costs one ``stat`` of config.json.
+
+    Within a process the plan is reused while config.json's (mtime, size,
+    inode) is unchanged. A new process reads the validated ``.plan.json``
+    snapshot when its fingerprint matches, and otherwise parses and
+    validates config.json and refreshes the snapshot. A missing config
+    yields defaults without touching the disk.
+    """
+    global _plan_cache
+    try:
+        st = os.stat(CONFIG_PATH)
+        fingerprint = [st.st_mtime_ns, st.st_size, st.st_ino]
+    except OSError:
+        fingerprint = None
+    if _plan_cache is not None and _plan_cache[0] == fingerprint:
+        return _plan_cache[1]
+
+    plan = None
+    if fingerprint is None:
+        plan = plan_from_config({})
+    else:
+        try:
+            snapshot = json.loads(PLAN_PATH.read_text())
+            if snapshot.get("fingerprint") == fingerprint:
+                plan = SinkPlan.from_dict(snapshot["plan"])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        if plan is None:
+            plan = plan_from_config(load_config())
+            try:
+                atomic_write(PLAN_PATH, json.dumps({"fingerprint": fingerprint, "plan": plan.to_dict()}))
+            except OSError:
+                pass
+    _plan_cache = (fingerprint, plan)
+    return plan
 
 
 def _get_seq() -> int:
@@ -82,13 +336,169 @@ def _get_seq() -> int:
     return _seq_counter
 
 
-def sanitize_tool_input(tool_input, config: dict) -> str | None:
-    """Return a truncated preview of tool input."""
-    max_chars = config.get("privacy", {}).get("tool_input_preview_chars", 100)
+# --- Sampling / drop rules ---
+
+def _compile_pattern(pattern):
+    """Compile a glob (alternatives separated by "|") into a matcher, or None for any."""
+    if pattern in (None, "", "*"):
+        return None
+    if isinstance(pattern, str):
+        pattern = pattern.split("|")
+    regex = "|".join(fnmatch.translate(p) for p in pattern)
+    return re.compile(regex).match
+
+
+class RuleMatcher:
+    """Keep/drop/sample rules compiled into a first-match decision table.
+
+    ``decide`` returns the sampling weight to store on an event (1.0 for a
+    plain keep, 1/rate for a sampled keep) or None when the event is dropped.
+    Rule outcomes are memoized per (event, tool_name, cwd).
+    """
+
+    def __init__(self, rules: list):
+        self._rules = []
+        for rule in rules or []:
+            action = rule.get("action", "keep")
+            if action not in ("keep", "drop", "sample"):
+                continue
+            rate = float(rule.get("rate", 1.0)) if action == "sample" else 1.0
+            if action == "sample" and rate <= 0:
+                action = "drop"
+            elif action == "sample" and rate >= 1:
+                action = "keep"
+            self._rules.append((
+                _compile_pattern(rule.get("event")),
+                _compile_pattern(rule.get("tool_name")),
+                _compile_pattern(rule.get("cwd")),
+                action,
+                rate,
+            ))
+        self._memo = {}
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    def _lookup(self, event_type: str, tool_name: str, cwd: str):
+        key = (event_type, tool_name, cwd)
+        hit = self._memo.get(key)
+        if hit is None:
+            hit = ("keep", 1.0)
+            for event_m, tool_m, cwd_m, action, rate in self._rules:
+                if event_m and not event_m(event_type):
+                    continue
+                if tool_m and not tool_m(tool_name):
+                    continue
+                if cwd_m and not cwd_m(cwd):
+                    continue
+                hit = (action, rate)
+                break
+            self._memo[key] = hit
+        return hit
+
+    def decide(self, event_type: str, data: dict, cwd: str | None = None) -> float | None:
+        action, rate = self._lookup(event_type, data.get("tool_name") or "", cwd or "")
+        if action == "keep":
+            return 1.0
+        if action == "drop":
+            return None
+        # Sample tool_start/tool_end pairs together via their correlation id
+        try:
+            draw = int(data["correlation_id"][:8], 16) / 2**32
+        except (KeyError, TypeError, ValueError):
+            draw = random.random()
+        return 1.0 / rate if draw < rate else None
+
+
+def compile_rules(rules: list) -> RuleMatcher:
+    return RuleMatcher(rules)
+
+
+_JSON_TOKEN = re.compile(r'''\s*(?:("(?:[^"\\]|\\.)*")|([^\s"{}\[\]:,]+)|([{}\[\]:,]))''')
+
+
+def _truncated_dumps(obj, limit: int) -> str:
+    """json.dumps(obj) that stops encoding once ``limit`` chars are exceeded."""
+    out = []
+    n = 0
+    for chunk in json.JSONEncoder(default=str).iterencode(obj):
+        out.append(chunk)
+        n += len(chunk)
+        if n > limit:
+            break
+    return "".join(out)
+
+
+def _truncated_reencode(prefix: str, limit: int, encode=json.dumps) -> str:
+    """Re-encode a JSON text prefix until ``limit`` chars are exceeded.
+
+    Strings and scalars go through ``encode`` (json.dumps style, or ``repr``
+    for ``str(value)`` style); punctuation is spaced like both.
+    """
+    out = []
+    n = 0
+    pos = 0
+    while n <= limit:
+        m = _JSON_TOKEN.match(prefix, pos)
+        if not m:
+            # Trailing string cut off mid-way: encode what we have of it
+            rest = prefix[pos:].lstrip()
+            if rest.startswith('"'):
+                body = rest[1:]
+                # Drop a dangling partial escape (at most 5 chars of "\\uXXXX")
+                for cut in range(6):
+                    try:
+                        out.append(encode(json.loads('"' + body[:len(body) - cut] + '"'))[:-1])
+                        break
+                    except ValueError:
+                        continue
+            break
+        pos = m.end()
+        string, scalar, punct = m.groups()
+        if string is not None or scalar is not None:
+            try:
+                token = encode(json.loads(string or scalar))
+            except ValueError:
+                token = string or scalar
+        else:
+            token = {":": ": ", ",": ", "}.get(punct, punct)
+        out.append(token)
+        n += len(token)
+    return "".join(out)
+
+
+def _raw_preview(prefix: str, limit: int) -> str:
+    """Preview text of a ``RawJSON`` prefix, as the parsed value would give it.
+
+    An object is re-encoded in json.dumps style, like a parsed dict; a
+    string is decoded and a list re-encoded in repr style, like ``str(value)``.
+    """
+    if prefix.startswith("{"):
+        return _truncated_reencode(prefix, limit)
+    if not prefix.startswith('"'):
+        return _truncated_reencode(prefix, limit, repr)
+    body = prefix[1:].encode()
+    quote = _closing_quote(body, 0)
+    body = body[:quote] if quote >= 0 else body[:_string_cut(body, 0)]
+    try:
+        return json.loads(b'"' + body + b'"')
+    except ValueError:
+        return body.decode("utf-8", "ignore")
+
+
+def sanitize_tool_input(tool_input, plan: SinkPlan) -> str | None:
+    """Return a truncated preview of tool input.
+
+    Encoding stops as soon as the preview length is reached, so large
+    inputs (e.g. a full Write payload) are never serialized in full.
+    """
+    max_chars = plan.tool_input_preview_chars
     if tool_input is None:
         return None
-    if isinstance(tool_input, dict):
-        text = json.dumps(tool_input, default=str)
+    if isinstance(tool_input, RawJSON):
+        text = _raw_preview(tool_input.prefix, max_chars)
+    elif isinstance(tool_input, dict):
+        text = _truncated_dumps(tool_input, max_chars)
     else:
         text = str(tool_input)
     if len(text) > max_chars:
@@ -100,121 +510,1282 @@ def sanitize_tool_result(tool_result) -> dict:
     """Return size info about tool result, never the content."""
     if tool_result is None:
         return {"size": 0}
+    if isinstance(tool_result, RawJSON):
+        return {"size": tool_result.size}
     if isinstance(tool_result, str):
         return {"size": len(tool_result)}
     text = json.dumps(tool_result, default=str)
     return {"size": len(text)}
 
 
-def write_event(event_type: str, session_id: str, data: dict) -> None:
-    """Append a single event to today's JSONL file with flock."""
-    TELEMETRY_DIR.mkdir(parents=True, exist_ok=True)
+# --- Compact v2 encoding ---
+#
+# A v2 day file starts with a {"v":2} marker. Event lines use short keys and
+# epoch-millisecond timestamps (also for a span's started_ts, "b"):
+#   {"t":1760868000123,"e":3,"s":1,"q":7,"k":2,"d":{"c":"9f2c...","m":12.5,"r":840}}
+# Session ids and tool names are interned: {"i":{"1":"<session uuid>","2":"Read"}}
+# declares ids before their first use, and later declarations of the same id
+# win from that point on. v1 lines may appear in the same file (format
+# switched mid-day); readers tell them apart per line.
+
+EVENT_FORMAT_VERSION = 2
+
+# Fixed event type codes; unknown types are stored as their name
+_V2_EVENT_TYPES = (
+    "session_start", "session_end", "tool_start", "tool_end", "tool_span",
+    "prompt", "stop", "subagent_stop", "pre_compact", "error",
+)
+_V2_EVENT_CODES = {name: i for i, name in enumerate(_V2_EVENT_TYPES)}
+
+# Abbreviated keys for the per-tool-call data fields
+_V2_DATA_KEYS = {
+    "correlation_id": "c",
+    "duration_ms": "m",
+    "result_size": "r",
+    "input_preview": "p",
+    "started_ts": "b",
+}
+_V2_DATA_NAMES = {short: name for name, short in _V2_DATA_KEYS.items()}
 
-    event = {
-        "ts": _now_iso(),
-        "event": event_type,
-        "session_id": session_id,
-        "seq": _get_seq(),
-        "data": data,
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _iso_from_ms(ms: int) -> str:
+    """Exact inverse of the millisecond timestamps written by v2 (same text as ``_now_iso``)."""
+    return (_EPOCH + timedelta(milliseconds=ms)).isoformat(timespec="milliseconds")
+
+
+def _ms_from_iso(ts: str) -> int:
+    """Epoch milliseconds of an ISO timestamp as written by ``_now_iso``."""
+    return int((datetime.fromisoformat(ts) - _EPOCH) / timedelta(milliseconds=1))
+
+
+def _intern_path(event_file: Path) -> Path:
+    """Writer-side cache of a day file's intern table (name -> id)."""
+    return event_file.with_name(f".{event_file.stem}.intern.json")
+
+
+def _scan_interned(fd: int) -> dict:
+    """Rebuild a day file's intern table from its declaration lines."""
+    table = {}
+    with os.fdopen(os.dup(fd), "rb") as f:
+        f.seek(0)
+        for line in f:
+            if line.startswith(b'{"i"'):
+                try:
+                    for ref, name in json.loads(line)["i"].items():
+                        table[name] = int(ref)
+                except (ValueError, KeyError, AttributeError):
+                    continue
+    return table
+
+
+def _load_interned(event_file: Path, fd: int, size: int) -> dict:
+    """Intern table for a locked day file of ``size`` bytes.
+
+    The sidecar is only re-read when its stat changes, which is once per
+    newly declared name rather than once per event. Returns a copy the
+    caller may extend.
+    """
+    if size == 0:
+        return {}
+    name = str(event_file)
+    cached = _intern_cache.get(name)
+    sidecar = cached[0] if cached else str(_intern_path(event_file))
+    try:
+        st = os.stat(sidecar)
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if cached is None or cached[1] != key:
+            with open(sidecar, "rb") as f:
+                parsed = json.loads(f.read())
+            cached = _intern_cache[name] = (sidecar, key, parsed["size"], dict(parsed["ids"]))
+        if cached[2] <= size:
+            return dict(cached[3])
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        pass
+    return _scan_interned(fd)
+
+
+def _save_interned(event_file: Path, size: int, table: dict) -> None:
+    """Write the sidecar and remember it; call with the day file's flock held,
+    which every sidecar writer takes, so the stat is of this write."""
+    sidecar = str(_intern_path(event_file))
+    try:
+        atomic_write(Path(sidecar), json.dumps({"size": size, "ids": table}))
+        st = os.stat(sidecar)
+    except OSError:
+        _intern_cache.pop(str(event_file), None)
+        return
+    _intern_cache[str(event_file)] = (sidecar, (st.st_mtime_ns, st.st_size, st.st_ino), size, table)
+
+
+def encode_event_v2(event: dict, table: dict, declared: dict) -> str:
+    """One v2 line for ``event``. New names are added to ``table`` and ``declared``."""
+    def ref(name: str) -> int:
+        i = table.get(name)
+        if i is None:
+            i = table[name] = max(table.values(), default=0) + 1
+            declared[str(i)] = name
+        return i
+
+    ms = event.get("ts_ms")
+    if ms is None:
+        ms = _ms_from_iso(event["ts"])
+    event_type = event["event"]
+    line = {
+        "t": ms,
+        "e": _V2_EVENT_CODES.get(event_type, event_type),
+        "s": ref(event["session_id"]),
+        "q": event["seq"],
     }
+    data = event.get("data") or {}
+    tool_name = data.get("tool_name")
+    if isinstance(tool_name, str):
+        line["k"] = ref(tool_name)
+        data = {k: v for k, v in data.items() if k != "tool_name"}
+    if data:
+        if any(k in _V2_DATA_NAMES for k in data):
+            line["D"] = data  # would be ambiguous abbreviated; store verbatim
+        else:
+            line["d"] = {_V2_DATA_KEYS.get(k, k): v for k, v in data.items()}
+            started = data.get("started_ts")
+            if isinstance(started, str):
+                try:
+                    line["d"]["b"] = _ms_from_iso(started)
+                except (TypeError, ValueError):
+                    pass  # not one of our timestamps: kept as written
+    if "weight" in event:
+        line["w"] = event["weight"]
+    return json.dumps(line, default=str, separators=(",", ":"))
+
+
+class EventDecoder:
+    """Turns day file lines (v1 or v2) back into v1-shaped event dicts.
+
+    Keeps the running intern table, so lines must be fed in file order.
+    v2 events also carry ``ts_ms``; pass ``iso=False`` to skip rebuilding
+    the ISO ``ts`` string when only ``ts_ms`` is needed.
+    """
+
+    def __init__(self, iso: bool = True):
+        self.iso = iso
+        self.names = {}  # intern id (str) -> name
+
+    def decode(self, obj: dict) -> dict | None:
+        """Return the event for a parsed line, or None for marker/declaration lines."""
+        if "t" in obj:
+            names = self.names
+            event_type = obj["e"]
+            if isinstance(event_type, int):
+                event_type = _V2_EVENT_TYPES[event_type]
+            ms = obj["t"]
+            data = obj.get("D")
+            if data is None:
+                data = {_V2_DATA_NAMES.get(k, k): v for k, v in obj.get("d", {}).items()}
+                if isinstance(data.get("started_ts"), int):
+                    data["started_ts"] = _iso_from_ms(data["started_ts"])
+            if "k" in obj:
+                data = {"tool_name": names[str(obj["k"])], **data}
+            event = {
+                "ts": _iso_from_ms(ms) if self.iso else None,
+                "ts_ms": ms,
+                "event": event_type,
+                "session_id": names[str(obj["s"])],
+                "seq": obj["q"],
+                "data": data,
+            }
+            if "w" in obj:
+                event["weight"] = obj["w"]
+            return event
+        if "i" in obj:
+            self.names.update(obj["i"])
+            return None
+        if "v" in obj:
+            return None
+        return obj
+
+    def feed(self, line: bytes | str) -> dict | None:
+        """Parse and decode one raw line (blank lines decode to None)."""
+        line = line.strip()
+        if not line:
+            return None
+        return self.decode(json.loads(line))
+
+
+def iter_day_file(path: Path, iso: bool = True):
+    """Yield events from one v1 or v2 day file, stopping at the first corrupt line."""
+    decoder = EventDecoder(iso)
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                event = decoder.feed(line)
+                if event is not None:
+                    yield event
+    except (ValueError, KeyError, IndexError, TypeError, OSError):
+        return
 
-    line = json.dumps(event, default=str) + "\n"
-    event_file = TELEMETRY_DIR / f"events-{_today_str()}.jsonl"
 
-    fd = os.open(str(event_file), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+# --- Hook deadlines ---
+
+def _process_age() -> float:
+    """Seconds since this process started; 0.0 where /proc is unavailable."""
     try:
+        with open("/proc/self/stat", "rb") as f:
+            started = int(f.read().rsplit(b")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        return max(time.clock_gettime(time.CLOCK_BOOTTIME) - started, 0.0)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+
+class Deadline:
+    """Time budget for one hook invocation.
+
+    Built at the top of a hook from its hooks.json timeout, less
+    ``DEADLINE_MARGIN_S``, counted from process start so interpreter
+    start-up is inside the budget. Telemetry calls given a deadline bound
+    their lock waits by it, all of them together by ``LOCK_WAIT_BUDGET_S``,
+    and skip or spill optional work once it runs low, recording each such
+    step with ``degrade``. Calls without one block as before (maintenance
+    worker, backfill, CLI tools).
+    """
+
+    def __init__(self, hook: str, timeout_s: float = HOOK_TIMEOUT_S):
+        self.hook = hook
+        budget = max(timeout_s - DEADLINE_MARGIN_S - min(_process_age(), timeout_s), 0.0)
+        self.expires = time.monotonic() + budget
+        self.waited = 0.0
+        self.degraded = []
+
+    def remaining(self) -> float:
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def low(self) -> bool:
+        """True once optional work should be skipped or deferred."""
+        return self.remaining() < OPTIONAL_RESERVE_S
+
+    def lock_wait(self, optional: bool = False) -> float:
+        """Seconds a lock may be waited for: briefly for optional writes,
+        otherwise until only the spill reserve is left, and never past what
+        is left of the hook's lock-wait budget."""
+        if optional:
+            wait = min(OPTIONAL_LOCK_WAIT_S, self.remaining() - OPTIONAL_RESERVE_S)
+        else:
+            wait = self.remaining() - SPILL_RESERVE_S
+        return max(min(wait, LOCK_WAIT_BUDGET_S - self.waited), 0.0)
+
+    def charge(self, started: float) -> None:
+        """Count a bounded locked write begun at ``started`` against the lock-wait budget."""
+        self.waited += time.monotonic() - started
+
+    def degrade(self, kind: str) -> None:
+        """Count a skipped or deferred step in ``.degraded.jsonl``."""
+        self.degraded.append(kind)
+        line = json.dumps({"ts": _now_iso(), "hook": self.hook, "kind": kind}) + "\n"
+        try:
+            fd = _open_append(DEGRADED_PATH)
+            try:
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+
+def _flock(fd: int, wait_s: float | None = None) -> bool:
+    """Take an exclusive flock on ``fd``.
+
+    ``wait_s=None`` blocks. Otherwise polls with LOCK_NB for at most
+    ``wait_s`` seconds and returns False if the lock stayed busy.
+    """
+    if wait_s is None:
         fcntl.flock(fd, fcntl.LOCK_EX)
-        os.write(fd, line.encode())
+        return True
+    give_up = time.monotonic() + wait_s
+    delay = 0.001
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            left = give_up - time.monotonic()
+            if left <= 0:
+                return False
+            time.sleep(min(delay, left))
+            delay = min(delay * 2, 0.05)
+
+
+def _spill(kind: str, text: str, plan: SinkPlan) -> None:
+    """Park deferred lines in a new ``SPILL_DIR`` file for ``merge_spillover``.
+
+    ``kind`` names the destination: a day file stem, "push" or "sessions".
+    Spill files are private to the writer, so this never waits on a lock;
+    the atomic write keeps the merger from seeing a partial file.
+    """
+    name = f"{kind}.{os.getpid()}.{time.time_ns()}"
+    try:
+        atomic_write(SPILL_DIR / f"{name}.jsonl", text, fsync=plan.fsync)
+    except OSError:
+        pass
+
+
+def _append_locked(
+    path: Path, text: str, wait_s: float | None = None, plan: SinkPlan | None = None,
+) -> bool:
+    """Append ``text`` to ``path`` under flock; False if the lock wait timed out."""
+    fd = _open_append(path)
+    try:
+        if not _flock(fd, wait_s):
+            return False
+        os.write(fd, text.encode())
+        if plan is not None and plan.group_commit:
+            _group_commit(fd, path, plan, force=True)
+        return True
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def merge_spillover(plan: SinkPlan | None = None) -> dict:
+    """Fold spilled hook writes back into the day files, push queue and session index.
+
+    Runs from the maintenance worker with blocking locks. Files are applied
+    in the order they were written and deleted once merged.
+    """
+    plan = plan or load_plan()
+    counts = {"events": 0, "push": 0, "sessions": 0}
+    session_updates = []
+    merged = []
+    for f in sorted(SPILL_DIR.glob("*.jsonl"), key=lambda f: int(f.name.split(".")[-2])):
+        kind = f.name.split(".")[0]
+        try:
+            text = f.read_text()
+        except OSError:
+            continue
+        lines = [line for line in text.splitlines() if line.strip()]
+        if kind.startswith("events-"):
+            # Spilled events are v1 lines; readers accept them in v2 files too
+            _append_locked(TELEMETRY_DIR / f"{kind}.jsonl", "\n".join(lines) + "\n", plan=plan)
+            counts["events"] += len(lines)
+        elif kind == "push":
+            _append_locked(PUSH_QUEUE_PATH, "\n".join(lines) + "\n", plan=plan)
+            counts["push"] += len(lines)
+        elif kind == "sessions":
+            for line in lines:
+                try:
+                    update = json.loads(line)
+                    session_updates.append((update["session_id"], update["data"]))
+                except (ValueError, KeyError, TypeError):
+                    continue
+        merged.append(f)
+
+    if session_updates:
+        sessions = _load_session_index()
+        for session_id, data in session_updates:
+            sessions.setdefault(session_id, {}).update(data)
+        atomic_write(SESSIONS_PATH, json.dumps(sessions, indent=2, default=str) + "\n", plan.fsync)
+        counts["sessions"] = len(session_updates)
+
+    for f in merged:
+        f.unlink(missing_ok=True)
+    return counts
+
+
+def has_spillover() -> bool:
+    try:
+        with os.scandir(SPILL_DIR) as it:
+            return any(entry.name.endswith(".jsonl") for entry in it)
+    except FileNotFoundError:
+        return False
+
+
+def _open_append(path: Path, flags: int = os.O_WRONLY) -> int:
+    """Open ``path`` for appending; the directory is only created if it is missing."""
+    flags |= os.O_CREAT | os.O_APPEND
+    try:
+        return os.open(str(path), flags, 0o644)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return os.open(str(path), flags, 0o644)
+
+
+def _write_text(path: Path, text: str) -> None:
+    """``path.write_text`` that creates the directory only when it is missing."""
+    try:
+        path.write_text(text)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+# --- Durability ---
+#
+# Every file that is rewritten as a whole (session index, pending stacks,
+# push state, spill files, caches) goes through ``atomic_write``: readers
+# and a crashed writer leave either the old or the new contents, never a
+# torn file. The plan's ``durability`` decides what is fsynced: snapshots
+# holding events or session state unless it is "none", append-only logs
+# only in "group_commit" mode. Caches and pending stacks, which are rebuilt
+# or swept anyway, are never fsynced, keeping tool hooks off the disk.
+
+def _fsync_dir(path: Path) -> None:
+    """Persist a rename in ``path``; best effort on filesystems that refuse it."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, data: str | bytes, fsync: bool = False) -> None:
+    """Replace ``path`` with ``data`` through a temp file and a rename.
+
+    With ``fsync`` the data and the rename reach the disk before this
+    returns. Creates the directory only when it is missing; raises OSError.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    try:
+        fd = os.open(str(tmp), flags, 0o644)
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(tmp), flags, 0o644)
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            if fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if fsync:
+        _fsync_dir(path.parent)
+
+
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+
+def _group_commit(fd: int, path: Path, plan: SinkPlan, force: bool = False) -> None:
+    """fsync an append-only log in batches; call with the log's flock held.
+
+    The log is synced once ``group_commit_interval_ms`` have passed or
+    ``group_commit_bytes`` were appended since its last sync, whichever
+    comes first. The last sync is recorded in ``SYNC_DIR`` so concurrent
+    hook processes share one fsync per batch instead of one per event.
+    """
+    mark = SYNC_DIR / path.name
+    size = os.fstat(fd).st_size
+    now = time.time()
+    if not force:
+        try:
+            synced_at, synced_size = mark.read_text().split()
+            if ((now - float(synced_at)) * 1000 < plan.group_commit_interval_ms
+                    and size - int(synced_size) < plan.group_commit_bytes):
+                return
+        except (OSError, ValueError):
+            pass
+    _fdatasync(fd)
+    try:
+        _write_text(mark, f"{now} {size}\n")
+    except OSError:
+        pass
+
+
+# Outcomes of the appends made under a day file or push queue lock
+_APPENDED = "appended"
+_LOCK_BUSY = "lock_busy"  # the lock stayed busy for ``wait_s``; nothing was written
+_OVERFLOW_DROPPED = "overflow_dropped"  # the push overflow policy dropped the line
+
+
+def _append_event_line(
+    event_file: Path, event: dict, plan: SinkPlan, wait_s: float | None = None,
+) -> str:
+    """Append ``event`` to a day file under flock, in the plan's event format.
+
+    Returns ``_APPENDED``, or ``_LOCK_BUSY``, writing nothing, if the lock
+    stayed busy for ``wait_s``.
+    A session's last event is always synced in "group_commit" mode, so
+    nothing it wrote waits on a later writer's batch.
+    """
+    fd = _open_append(event_file, os.O_RDWR)
+    try:
+        if not _flock(fd, wait_s):
+            return _LOCK_BUSY
+        if plan.event_format != "v2":
+            os.write(fd, (json.dumps(event, default=str) + "\n").encode())
+            if plan.group_commit:
+                _group_commit(fd, event_file, plan, force=event["event"] == "session_end")
+            return _APPENDED
+        size = os.fstat(fd).st_size
+        table = _load_interned(event_file, fd, size)
+        declared = {}
+        line = encode_event_v2(event, table, declared)
+        parts = []
+        if size == 0:
+            parts.append(json.dumps({"v": EVENT_FORMAT_VERSION}))
+        if declared:
+            parts.append(json.dumps({"i": declared}, separators=(",", ":")))
+        parts.append(line)
+        payload = ("\n".join(parts) + "\n").encode()
+        os.write(fd, payload)
+        if plan.group_commit:
+            _group_commit(fd, event_file, plan, force=event["event"] == "session_end")
+        if declared:
+            # Cache the table only after the declarations are in the file;
+            # it is rebuilt from the file if lost, so it is never fsynced
+            _save_interned(event_file, size + len(payload), table)
+        return _APPENDED
     finally:
         fcntl.flock(fd, fcntl.LOCK_UN)
         os.close(fd)
 
+
+def write_event(
+    event_type: str, session_id: str, data: dict,
+    cwd: str | None = None, plan: SinkPlan | None = None,
+    deadline: Deadline | None = None,
+) -> None:
+    """Append a single event to today's JSONL file with flock.
+
+    Events are first run through the plan's sampling rules; dropped
+    events are never serialized, sampled ones carry their ``weight``.
+    With a ``deadline``, a day file lock that stays busy spills the event
+    instead, and the push append and webhook are deferred or skipped
+    once the budget runs low.
+    """
+    plan = plan or load_plan()
+    matcher = plan.matcher
+    weight = matcher.decide(event_type, data, cwd) if matcher else 1.0
+    if weight is None:
+        return
+
+    fmt = plan.event_format
+    if fmt == "v2":
+        ts_ms = time.time_ns() // 1_000_000
+        ts = _iso_from_ms(ts_ms)
+    else:
+        ts = _now_iso()
+
+    event = {
+        "ts": ts,
+        "event": event_type,
+        "session_id": session_id,
+        "seq": _get_seq(),
+        "data": data,
+    }
+    if weight != 1.0:
+        event["weight"] = weight
+
+    event_file = TELEMETRY_DIR / f"events-{ts[:10]}.jsonl"
+    wait_s = deadline.lock_wait() if deadline else None
+    started = time.monotonic()
+    status = _append_event_line(
+        event_file, {**event, "ts_ms": ts_ms} if fmt == "v2" else event, plan, wait_s,
+    )
+    if deadline:
+        deadline.charge(started)
+    if status == _LOCK_BUSY:
+        _spill(event_file.stem, json.dumps(event, default=str) + "\n", plan)
+        if deadline:
+            deadline.degrade("event_spilled")
+
     # Queue for SaaS push if api_key configured
-    config = load_config()
-    if config.get("api_key"):
-        _queue_for_push(event)
+    if plan.push:
+        _queue_for_push(event, plan, deadline)
 
     # Fire webhook if configured (legacy per-event webhook)
-    webhook_url = config.get("webhook_url")
-    if webhook_url:
-        _fire_webhook(webhook_url, event)
+    if plan.webhook_url:
+        if deadline and deadline.low():
+            deadline.degrade("webhook_skipped")
+        else:
+            _fire_webhook(plan.webhook_url, event)
+
+
+def event_id(event: dict) -> str:
+    """Stable identity of a local event, used by the SaaS to drop re-sent copies."""
+    import hashlib
+    key = json.dumps(
+        [event["ts"], event["event"], event["session_id"], event["seq"], event.get("data", {})],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha1(key.encode()).hexdigest()[:32]
 
 
-def _queue_for_push(event: dict) -> None:
-    """Append event to the push queue for batch flush on session_end."""
+def to_saas_event(event: dict) -> dict:
+    """Map a local event to the shape expected by the SaaS ingestion API."""
     saas_event = {
         "ts": event["ts"],
         "event": _EVENT_TYPE_MAP.get(event["event"], event["event"]),
         "session_id": event["session_id"],
         "seq": event["seq"],
         "data": event.get("data", {}),
+        "event_id": event_id(event),
     }
+    if event["event"] == "tool_span":
+        # Stands for a tool_use + tool_result pair in the SaaS counts
+        saas_event["data"] = {**saas_event["data"], "span": True}
+    if "weight" in event:
+        saas_event["data"] = {**saas_event["data"], "sample_weight": event["weight"]}
+    return saas_event
+
+
+# --- Push queue ---
+#
+# Hooks append SaaS-shaped lines to the active segment, .push_queue.jsonl.
+# The flusher seals it into a gzipped segment under .push_segments/ (rolled
+# up first in rollup mode), applies the queue limits with the configured
+# overflow policy and streams segments to the SaaS oldest first, one batch
+# in memory at a time. A hook that finds the active segment full moves it
+# aside as .push_segments/.sealing-*.jsonl for the next flush to seal.
+# Per-segment progress, the failure backoff and the counts of dropped
+# events live in .push_state.json.
+
+# First "event" key of a queued line; to_saas_event writes it right after "ts"
+_QUEUED_EVENT_TYPE = re.compile(rb'"event": "([^"]*)"')
+
+
+def _queued_lines(path: Path):
+    """Non-blank raw lines of an unsealed segment, streamed."""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def _queued_event_types(path: Path) -> dict:
+    """Event types in an unsealed segment, without parsing every line."""
+    from collections import Counter
+    counts = Counter()
+    for line in _queued_lines(path):
+        m = _QUEUED_EVENT_TYPE.search(line)
+        counts[m.group(1).decode() if m else "unknown"] += 1
+    return dict(counts)
+
+
+def _rotate_full_queue(plan: SinkPlan, event_type: str, active_size: int) -> bool:
+    """Make room for an ``event_type`` line in the full active segment.
+
+    Call with the active segment's lock held. The segment is moved aside
+    unsealed. Segments moved aside are bounded by ``push_queue_max_bytes``
+    too; past that the overflow policy applies before the next flush
+    can: "stop" and, for ``LOW_PRIORITY_EVENTS``, "drop_low_priority"
+    drop the new line (returns False), otherwise the oldest unsealed
+    segments are dropped.
+    """
+    pending = []
+    for path in sorted(PUSH_SEGMENTS_DIR.glob(".sealing-*.jsonl")):
+        try:
+            pending.append((path, path.stat().st_size))
+        except FileNotFoundError:
+            continue  # sealed by the flusher meanwhile
+    backlog = sum(size for _, size in pending)
+    if pending and backlog + active_size > plan.push_queue_max_bytes:
+        policy = plan.push_overflow_policy
+        if policy == "stop" or (policy == "drop_low_priority" and event_type in LOW_PRIORITY_EVENTS):
+            return False
+        for path, size in pending:
+            if backlog + active_size <= plan.push_queue_max_bytes:
+                break
+            try:
+                dropped = _queued_event_types(path)
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            backlog -= size
+            _record_drops(dropped, "queue_full")
+    PUSH_SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+    os.rename(PUSH_QUEUE_PATH, PUSH_SEGMENTS_DIR / f".sealing-{time.time_ns():020d}.jsonl")
+    return True
+
+
+def _append_queue_line(
+    line: str, plan: SinkPlan, wait_s: float | None = None, event_type: str = "",
+) -> str:
+    """Append one ``event_type`` line to the active segment.
+
+    Returns ``_APPENDED``, ``_OVERFLOW_DROPPED`` when the overflow policy
+    drops the line (see ``_rotate_full_queue``) or ``_LOCK_BUSY`` if the
+    lock wait timed out. The
+    flusher and a writer finding the segment full rename it away while
+    holding its lock, so a writer that was waiting on the old file reopens
+    the path and retries, within what is left of the same ``wait_s``.
+    """
+    data = line.encode()
+    give_up = None if wait_s is None else time.monotonic() + wait_s
+    while True:
+        fd = _open_append(PUSH_QUEUE_PATH)
+        try:
+            if not _flock(fd, None if give_up is None else max(give_up - time.monotonic(), 0.0)):
+                return _LOCK_BUSY
+            st = os.fstat(fd)
+            try:
+                if os.stat(PUSH_QUEUE_PATH).st_ino != st.st_ino:
+                    continue
+            except FileNotFoundError:
+                continue
+            if st.st_size and st.st_size + len(data) > plan.push_queue_max_bytes:
+                if not _rotate_full_queue(plan, event_type, st.st_size):
+                    return _OVERFLOW_DROPPED
+                continue
+            os.write(fd, data)
+            if plan.group_commit:
+                _group_commit(fd, PUSH_QUEUE_PATH, plan)
+            return _APPENDED
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+def _record_drops(by_event: dict, reason: str) -> None:
+    """Count dropped events; folded into the push state and reported on the next flush."""
+    line = json.dumps({"ts": _now_iso(), "reason": reason, "events": by_event}) + "\n"
+    try:
+        fd = _open_append(PUSH_DROPPED_PATH)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _queue_for_push(event: dict, plan: SinkPlan, deadline: Deadline | None = None) -> None:
+    """Append event to the push queue for batch flush on session_end.
+
+    Short on time, or if the queue lock stays busy, the line is spilled
+    and reaches the queue on the next maintenance run. A full active
+    segment is moved aside for the flusher; lines the overflow policy
+    drops meanwhile are counted.
+    """
+    saas_event = to_saas_event(event)
     line = json.dumps(saas_event, default=str) + "\n"
+    event_type = saas_event["event"]
+    if deadline and deadline.low():
+        status = _LOCK_BUSY  # not worth waiting for
+    else:
+        wait_s = deadline.lock_wait(optional=True) if deadline else None
+        started = time.monotonic()
+        status = _append_queue_line(line, plan, wait_s, event_type)
+        if deadline:
+            deadline.charge(started)
+    if status == _OVERFLOW_DROPPED:
+        _record_drops({event_type: 1}, "queue_full")
+    elif status == _LOCK_BUSY:
+        _spill("push", line, plan)
+        if deadline:
+            deadline.degrade("push_deferred")
+
+
+def _load_push_state() -> dict:
+    try:
+        state = json.loads(PUSH_STATE_PATH.read_text())
+        if isinstance(state, dict):
+            state.setdefault("segments", {})
+            state.setdefault("failures", 0)
+            state.setdefault("next_attempt_at", 0)
+            state.setdefault("dropped", {})
+            return state
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return {"segments": {}, "failures": 0, "next_attempt_at": 0, "dropped": {}}
+
 
-    fd = os.open(str(PUSH_QUEUE_PATH), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+def _save_push_state(state: dict, plan: SinkPlan) -> None:
     try:
-        fcntl.flock(fd, fcntl.LOCK_EX)
-        os.write(fd, line.encode())
-    finally:
-        fcntl.flock(fd, fcntl.LOCK_UN)
-        os.close(fd)
+        atomic_write(PUSH_STATE_PATH, json.dumps(state, indent=2, default=str) + "\n", plan.fsync)
+    except OSError:
+        pass
 
 
-def flush_push_queue() -> dict:
-    """Flush queued events to the SaaS API in batches. Returns stats."""
-    config = load_config()
-    api_url = config.get("api_url")
-    api_key = config.get("api_key")
+def _push_segments() -> list[Path]:
+    """Sealed segments, oldest first."""
+    return sorted(PUSH_SEGMENTS_DIR.glob("*.jsonl.gz"))
+
+
+def _segment_lines(seg: Path, skip: int = 0):
+    """Raw lines of a segment after the first ``skip``."""
+    import gzip
+    from itertools import islice
+    with gzip.open(seg, "rb") as f:
+        yield from islice(f, skip, None)
+
+
+def _segment_info(state: dict, seg: Path) -> dict:
+    """Progress entry for ``seg``, recounted if the state lost it."""
+    info = state["segments"].get(seg.name)
+    if info is None:
+        info = state["segments"][seg.name] = {"events": sum(1 for _ in _segment_lines(seg)), "sent": 0}
+    return info
+
+
+def _write_segment(name: str, lines, plan: SinkPlan) -> int:
+    """Write ``lines`` (bytes) to a new gzipped segment. Returns the line count.
+
+    Streamed rather than built in memory, so this is ``atomic_write`` by hand.
+    """
+    import gzip
+    PUSH_SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+    seg = PUSH_SEGMENTS_DIR / name
+    tmp = seg.with_name(f".{name}.tmp")
+    count = 0
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+            for line in lines:
+                f.write(line if line.endswith(b"\n") else line + b"\n")
+                count += 1
+        if plan.fsync:
+            raw.flush()
+            os.fsync(raw.fileno())
+    os.replace(tmp, seg)
+    if plan.fsync:
+        _fsync_dir(PUSH_SEGMENTS_DIR)
+    return count
+
+
+def _queued_events(lines):
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def _seal_active_segment(plan: SinkPlan, state: dict) -> int:
+    """Move the active segment into a gzipped one, streamed. Returns events sealed."""
+    while True:
+        try:
+            fd = os.open(str(PUSH_QUEUE_PATH), os.O_RDWR)
+        except FileNotFoundError:
+            break
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            st = os.fstat(fd)
+            try:
+                if os.stat(PUSH_QUEUE_PATH).st_ino != st.st_ino:
+                    continue  # a writer moved it aside while we waited
+            except FileNotFoundError:
+                break
+            if st.st_size:
+                PUSH_SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+                os.rename(PUSH_QUEUE_PATH, PUSH_SEGMENTS_DIR / f".sealing-{time.time_ns():020d}.jsonl")
+            break
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    sealed = 0
+    # Also picks up segments writers moved aside and files left behind by a
+    # worker that died mid-seal
+    for src in sorted(PUSH_SEGMENTS_DIR.glob(".sealing-*.jsonl")):
+        name = src.name[len(".sealing-"):] + ".gz"
+        try:
+            f = open(src, "rb")
+        except FileNotFoundError:
+            continue  # dropped by a writer under the overflow policy
+        with f:
+            lines = (line for line in f if line.strip())
+            if plan.push_mode == "rollup":
+                rolled = rollup_events(_queued_events(lines), plan.push_raw_sample_rate)
+                lines = [(json.dumps(e, default=str) + "\n").encode() for e in rolled]
+            count = _write_segment(name, lines, plan)
+        state["segments"][name] = {"events": count, "sent": 0}
+        src.unlink(missing_ok=True)
+        sealed += count
+    return sealed
+
+
+def _event_types(lines) -> dict:
+    from collections import Counter
+    counts = Counter()
+    for line in lines:
+        try:
+            counts[json.loads(line).get("event", "unknown")] += 1
+        except (json.JSONDecodeError, AttributeError):
+            counts["unknown"] += 1
+    return dict(counts)
 
-    if not api_url or not api_key:
-        return {"status": "skipped", "reason": "no api_url or api_key configured"}
 
-    if not PUSH_QUEUE_PATH.exists():
-        return {"status": "ok", "pushed": 0}
+def _drop_segment(state: dict, seg: Path) -> dict:
+    """Delete a whole segment; returns the event types of its unsent lines."""
+    info = _segment_info(state, seg)
+    dropped = _event_types(_segment_lines(seg, info["sent"]))
+    seg.unlink(missing_ok=True)
+    del state["segments"][seg.name]
+    return dropped
 
-    # Read all queued events
-    events = []
+
+def _rewrite_segment(state: dict, seg: Path, keep, plan: SinkPlan) -> dict:
+    """Rewrite a segment's unsent lines, keeping those where ``keep(i, line)``.
+
+    Returns the event types of the lines dropped.
+    """
+    info = _segment_info(state, seg)
+    kept, dropped = [], []
+    for i, line in enumerate(_segment_lines(seg, info["sent"])):
+        (kept if keep(i, line) else dropped).append(line)
+    if dropped:
+        state["segments"][seg.name] = {"events": _write_segment(seg.name, kept, plan), "sent": 0}
+    return _event_types(dropped)
+
+
+def _is_high_priority(i: int, line: bytes) -> bool:
     try:
-        with open(PUSH_QUEUE_PATH, "r") as f:
+        return json.loads(line).get("event") not in LOW_PRIORITY_EVENTS
+    except (json.JSONDecodeError, AttributeError):
+        return False
+
+
+def _enforce_queue_limits(plan: SinkPlan, state: dict) -> dict:
+    """Bring sealed segments within the queue limits. Returns {event type: dropped}."""
+    from collections import Counter
+    dropped = Counter()
+    segments = _push_segments()
+
+    def excess() -> tuple[int, int]:
+        size = sum(seg.stat().st_size for seg in segments)
+        events = 0
+        for seg in segments:
+            info = _segment_info(state, seg)
+            events += info["events"] - info["sent"]
+        return size - plan.push_queue_max_bytes, events - plan.push_queue_max_events
+
+    def over() -> bool:
+        return max(excess()) > 0
+
+    if plan.push_overflow_policy == "drop_low_priority":
+        for seg in segments:
+            if not over():
+                break
+            dropped.update(_rewrite_segment(state, seg, _is_high_priority, plan))
+
+    # "stop" keeps what was queued first and drops the newest events
+    newest_first = plan.push_overflow_policy == "stop"
+    while segments and over():
+        seg = segments[-1] if newest_first else segments[0]
+        extra_bytes, extra_events = excess()
+        info = _segment_info(state, seg)
+        unsent = info["events"] - info["sent"]
+        size = max(seg.stat().st_size, 1)
+        if unsent <= extra_events or size <= extra_bytes:
+            dropped.update(_drop_segment(state, seg))
+            segments.remove(seg)
+            continue
+        # Trimming part of this segment is enough (bytes estimated pro rata)
+        cut = max(extra_events, -(-unsent * max(extra_bytes, 0) // size))
+        if newest_first:
+            dropped.update(_rewrite_segment(state, seg, lambda i, line: i < unsent - cut, plan))
+        else:
+            dropped.update(_rewrite_segment(state, seg, lambda i, line: i >= cut, plan))
+        break
+    return dict(dropped)
+
+
+def _fold_drops(state: dict, by_event: dict, reason: str) -> None:
+    if not by_event:
+        return
+    dropped = state["dropped"]
+    dropped.setdefault("since", _now_iso())
+    dropped["total"] = dropped.get("total", 0) + sum(by_event.values())
+    by_reason = dropped.setdefault("by_reason", {})
+    by_reason[reason] = by_reason.get(reason, 0) + sum(by_event.values())
+    totals = dropped.setdefault("by_event", {})
+    for event_type, n in by_event.items():
+        totals[event_type] = totals.get(event_type, 0) + n
+
+
+def _fold_hook_drops(state: dict) -> None:
+    """Move drops recorded by hooks into the state."""
+    taken = PUSH_DROPPED_PATH.with_name(f"{PUSH_DROPPED_PATH.name}.{os.getpid()}.taken")
+    try:
+        os.rename(PUSH_DROPPED_PATH, taken)
+    except FileNotFoundError:
+        return
+    try:
+        with open(taken) as f:
             for line in f:
-                line = line.strip()
-                if line:
-                    events.append(json.loads(line))
-    except (json.JSONDecodeError, OSError):
-        return {"status": "error", "reason": "failed to read push queue"}
+                try:
+                    entry = json.loads(line)
+                    _fold_drops(state, entry["events"], entry["reason"])
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue
+    finally:
+        taken.unlink(missing_ok=True)
+
+
+def _drop_report(dropped: dict, policy: str) -> dict:
+    """The ``client_report`` event telling the SaaS how many events never reached it.
+
+    The SaaS stores client reports without creating a session for their
+    ``session_id`` and leaves them out of every aggregate.
+    """
+    event = {
+        "ts": _now_iso(),
+        "event": "client_report",
+        "session_id": "telemetry-push-queue",
+        "seq": 0,
+        "data": {"kind": "push_queue_dropped", "policy": policy, **dropped},
+    }
+    return {**event, "event_id": event_id(event)}
+
+
+def _backoff(state: dict, reason: str) -> None:
+    state["failures"] += 1
+    delay = min(PUSH_BACKOFF_BASE_S * 2 ** (state["failures"] - 1), PUSH_BACKOFF_MAX_S)
+    state["next_attempt_at"] = time.time() + delay * random.uniform(0.8, 1.2)
+    state["last_error"] = reason
 
-    if not events:
-        _clear_push_queue()
-        return {"status": "ok", "pushed": 0}
 
-    batch_size = config.get("push_batch_size", 100)
-    total_pushed = 0
-    errors = []
+def push_flush_due(now: float | None = None) -> bool:
+    """Anything to ship with no backoff in effect, or an active segment due for sealing."""
+    now = time.time() if now is None else now
+    try:
+        active = PUSH_QUEUE_PATH.stat().st_size
+    except FileNotFoundError:
+        active = 0
+    if active >= PUSH_SEAL_BYTES or any(PUSH_SEGMENTS_DIR.glob(".sealing-*.jsonl")):
+        return True
+    if not active and not _push_segments():
+        return False
+    return _load_push_state()["next_attempt_at"] <= now
+
+
+def flush_push_queue(plan: SinkPlan | None = None, force: bool = False) -> dict:
+    """Seal, bound and ship the push queue in batches. Returns stats.
+
+    While the endpoint keeps failing, attempts back off exponentially
+    (``force`` ignores the backoff); the queue is still sealed and held
+    within its limits meanwhile. Events dropped by the overflow policy are
+    reported as one ``client_report`` event after the next successful flush.
+    """
+    plan = plan or load_plan()
+    api_url = plan.api_url
+    api_key = plan.api_key
+
+    if not api_url or not api_key:
+        return {"status": "skipped", "reason": "no api_url or api_key configured"}
 
-    for i in range(0, len(events), batch_size):
-        batch = events[i:i + batch_size]
+    state = _load_push_state()
+    try:
+        _seal_active_segment(plan, state)
+        on_disk = {seg.name for seg in _push_segments()}
+        state["segments"] = {k: v for k, v in state["segments"].items() if k in on_disk}
+        dropped = _enforce_queue_limits(plan, state)
+    except OSError as e:
+        _save_push_state(state, plan)
+        return {"status": "error", "reason": f"failed to seal push queue: {e}"}
+    _fold_drops(state, dropped, plan.push_overflow_policy)
+    _fold_hook_drops(state)
+
+    result = {"status": "ok", "pushed": 0}
+    if dropped:
+        result["dropped"] = sum(dropped.values())
+    if not force and state["next_attempt_at"] > time.time():
+        _save_push_state(state, plan)
+        return {**result, "status": "backoff",
+                "retry_in_s": round(state["next_attempt_at"] - time.time())}
+
+    from itertools import islice
+    error = None
+    for seg in _push_segments():
+        info = _segment_info(state, seg)
+        lines = _segment_lines(seg, info["sent"])
+        while error is None:
+            chunk = list(islice(lines, plan.push_batch_size))
+            if not chunk:
+                break
+            batch = []
+            for line in chunk:
+                try:
+                    batch.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+            try:
+                if batch:
+                    _post_batch(api_url, api_key, batch)
+            except Exception as e:
+                error = f"{seg.name}: {e}"
+                break
+            info["sent"] += len(chunk)
+            result["pushed"] += len(batch)
+            _save_push_state(state, plan)  # a crash re-sends at most one batch
+        if error is not None:
+            break
+        lines.close()
+        seg.unlink(missing_ok=True)
+        state["segments"].pop(seg.name, None)
+
+    if error is None and state["dropped"].get("total"):
         try:
-            _post_batch(api_url, api_key, batch)
-            total_pushed += len(batch)
+            _post_batch(api_url, api_key, [_drop_report(state["dropped"], plan.push_overflow_policy)])
+            result["reported_dropped"] = state["dropped"]["total"]
+            state["dropped"] = {}
         except Exception as e:
-            errors.append(f"batch {i // batch_size}: {e}")
-
-    if total_pushed == len(events):
-        _clear_push_queue()
-    elif total_pushed > 0:
-        # Partial success — keep only unsent events
-        remaining = events[total_pushed:]
-        _rewrite_push_queue(remaining)
-
-    result = {"status": "ok", "pushed": total_pushed, "total": len(events)}
-    if errors:
-        result["errors"] = errors
-        result["status"] = "partial" if total_pushed > 0 else "error"
+            error = f"drop report: {e}"
+
+    if error is None:
+        state["failures"] = 0
+        state["next_attempt_at"] = 0
+        state.pop("last_error", None)
+    else:
+        _backoff(state, error)
+        result["errors"] = [error]
+        result["status"] = "partial" if result["pushed"] else "error"
+        result["retry_in_s"] = round(state["next_attempt_at"] - time.time())
+    result["remaining"] = sum(i["events"] - i["sent"] for i in state["segments"].values())
+    _save_push_state(state, plan)
     return result
 
 
-def _post_batch(api_url: str, api_key: str, events: list) -> None:
-    """POST a batch of events to the SaaS ingestion endpoint."""
+# --- Rollup shipping ---
+
+def _session_sampled(session_id: str, rate: float) -> bool:
+    """Deterministically decide whether a session is shipped as raw events."""
+    if rate <= 0:
+        return False
+    if rate >= 1:
+        return True
+    import hashlib
+    digest = hashlib.sha1(session_id.encode()).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32 < rate
+
+
+def _duration_bucket(duration_ms: float) -> int:
+    for i, bound in enumerate(DURATION_BUCKETS_MS):
+        if duration_ms <= bound:
+            return i
+    return len(DURATION_BUCKETS_MS)
+
+
+def _rollup_id(kind: str, key: tuple, source_ids: list) -> str:
+    """Stable ``event_id`` of a rollup: the same source events give the same id,
+    so a segment re-sealed or re-sent after a crash is dropped by the SaaS."""
+    import hashlib
+    digest = hashlib.sha1(json.dumps([kind, *key], separators=(",", ":")).encode())
+    for source_id in sorted(source_ids):
+        digest.update(b"\n" + source_id.encode())
+    return digest.hexdigest()[:32]
+
+
+def rollup_events(events, raw_sample_rate: float = 0.01) -> list:
+    """Collapse queued SaaS events into per-session, per-tool hourly rollups.
+
+    Sessions selected by ``raw_sample_rate`` keep their raw events. For the
+    rest, tool events become one ``tool_rollup`` per (session, tool, hour)
+    and subagent stops one ``agent_rollup`` per (session, agent, hour);
+    low-volume lifecycle events are passed through unchanged. Each rollup's
+    ``event_id`` is derived from its key and the ids of the events it replaces.
+    """
+    out = []
+    tools = {}
+    agents = {}
+    sources = {}
+    sampled = {}
+
+    for e in events:
+        session_id = e.get("session_id", "")
+        if session_id not in sampled:
+            sampled[session_id] = _session_sampled(session_id, raw_sample_rate)
+        event_type = e.get("event")
+        if sampled[session_id] or event_type in _ROLLUP_PASSTHROUGH:
+            out.append(e)
+            continue
+
+        data = e.get("data") or {}
+        ts = e.get("ts", "")
+        hour = ts[:13]
+        w = data.get("sample_weight", 1)
+        source_id = e.get("event_id") or json.dumps(e, sort_keys=True, default=str)
+
+        if event_type in ("tool_use", "tool_result"):
+            tool_name = data.get("tool_name", "unknown")
+            key = (session_id, tool_name, hour)
+            r = tools.get(key)
+            if r is None:
+                r = tools[key] = {
+                    "ts": ts,
+                    "tool_name": tool_name,
+                    "count": 0,
+                    "event_count": 0,
+                    "duration_ms": 0.0,
+                    "duration_histogram": [0] * (len(DURATION_BUCKETS_MS) + 1),
+                    "result_size_sum": 0,
+                }
+            sources.setdefault(("tool_rollup", key), []).append(source_id)
+            r["event_count"] += w * (2 if data.get("span") is True else 1)
+            if ts < r["ts"]:
+                r["ts"] = ts
+            if event_type == "tool_result":
+                r["count"] += w
+                dur = data.get("duration_ms")
+                if dur is not None:
+                    r["duration_ms"] += dur * w
+                    r["duration_histogram"][_duration_bucket(dur)] += w
+                r["result_size_sum"] += (data.get("result_size") or 0) * w
+
+        elif event_type == "subagent_stop":
+            agent_type = data.get("agent_type") or data.get("agent_name") or "unknown"
+            key = (session_id, agent_type, hour)
+            r = agents.get(key)
+            if r is None:
+                r = agents[key] = {
+                    "ts": ts,
+                    "agent_type": agent_type,
+                    "count": 0,
+                    "event_count": 0,
+                    "tool_counts": {},
+                    "tool_count_total": 0,
+                    "turns": 0,
+                }
+            sources.setdefault(("agent_rollup", key), []).append(source_id)
+            r["count"] += w
+            r["event_count"] += w
+            if ts < r["ts"]:
+                r["ts"] = ts
+            for tool, count in (data.get("tool_counts") or {}).items():
+                r["tool_counts"][tool] = r["tool_counts"].get(tool, 0) + count * w
+            r["tool_count_total"] += data.get("tool_count_total", 0) * w
+            r["turns"] += data.get("turns", 0) * w
+
+        else:
+            out.append(e)
+
+    for kind, rollups in (("tool_rollup", tools), ("agent_rollup", agents)):
+        for key, r in rollups.items():
+            ts = r.pop("ts")
+            # Sampling weights make the sums fractional; the SaaS stores integer counts
+            for field in ("count", "event_count", "result_size_sum", "tool_count_total", "turns"):
+                if field in r:
+                    r[field] = round(r[field])
+            if "duration_ms" in r:
+                r["duration_ms"] = round(r["duration_ms"], 1)
+                r["duration_histogram"] = [round(c) for c in r["duration_histogram"]]
+            if "tool_counts" in r:
+                r["tool_counts"] = {t: round(c) for t, c in r["tool_counts"].items()}
+            out.append({
+                "ts": ts,
+                "event": kind,
+                "session_id": key[0],
+                "seq": 0,
+                "data": r,
+                "event_id": _rollup_id(kind, key, sources[kind, key]),
+            })
+
+    return out
+
+
+def _post_batch(api_url: str, api_key: str, events: list) -> dict:
+    """POST a batch of events to the SaaS ingestion endpoint. Returns the response ``data``."""
     import urllib.request
 
     url = f"{api_url.rstrip('/')}/api/v1/events"
@@ -232,24 +1803,10 @@ def _post_batch(api_url: str, api_key: str, events: list) -> None:
     resp = urllib.request.urlopen(req, timeout=30)
     if resp.status not in (200, 201):
         raise RuntimeError(f"API returned {resp.status}")
-
-
-def _clear_push_queue() -> None:
-    """Remove the push queue file."""
     try:
-        PUSH_QUEUE_PATH.unlink(missing_ok=True)
-    except OSError:
-        pass
-
-
-def _rewrite_push_queue(events: list) -> None:
-    """Rewrite the push queue with only the given events."""
-    try:
-        with open(PUSH_QUEUE_PATH, "w") as f:
-            for event in events:
-                f.write(json.dumps(event, default=str) + "\n")
-    except OSError:
-        pass
+        return json.loads(resp.read()).get("data") or {}
+    except (ValueError, AttributeError):
+        return {}
 
 
 def _fire_webhook(url: str, event: dict) -> None:
@@ -276,30 +1833,95 @@ def _fire_webhook(url: str, event: dict) -> None:
 
 # --- Session index ---
 
-def update_session_index(session_id: str, data: dict) -> None:
-    """Update the lightweight session index."""
-    TELEMETRY_DIR.mkdir(parents=True, exist_ok=True)
+def _quarantine(path: Path) -> None:
+    """Move an unreadable snapshot aside so the next write does not destroy it."""
+    try:
+        os.replace(path, path.with_name(f"{path.name}.corrupt"))
+    except OSError:
+        pass
 
-    sessions = {}
-    if SESSIONS_PATH.exists():
-        try:
-            sessions = json.loads(SESSIONS_PATH.read_text())
-        except (json.JSONDecodeError, OSError):
-            sessions = {}
 
+def _load_session_index() -> dict:
+    try:
+        sessions = json.loads(SESSIONS_PATH.read_text())
+        if isinstance(sessions, dict):
+            return sessions
+    except ValueError:
+        pass
+    except OSError:
+        return {}
+    _quarantine(SESSIONS_PATH)
+    return {}
+
+
+def update_session_index(
+    session_id: str, data: dict, deadline: Deadline | None = None,
+    plan: SinkPlan | None = None,
+) -> None:
+    """Update the lightweight session index.
+
+    Rewriting a large index is deferred to the maintenance worker when the
+    hook's deadline is running low. A corrupt index is kept as
+    ``sessions.json.corrupt`` and a new one started.
+    """
+    plan = plan or load_plan()
+    if deadline and deadline.low():
+        _spill("sessions", json.dumps({"session_id": session_id, "data": data}, default=str) + "\n", plan)
+        deadline.degrade("session_index_deferred")
+        return
+
+    sessions = _load_session_index()
     if session_id in sessions:
         sessions[session_id].update(data)
     else:
         sessions[session_id] = data
 
-    SESSIONS_PATH.write_text(json.dumps(sessions, indent=2, default=str) + "\n")
+    atomic_write(SESSIONS_PATH, json.dumps(sessions, indent=2, default=str) + "\n", plan.fsync)
+
+
+def compact_session_index(
+    retention_days: int = 30, stale_after_s: float = 86400, plan: SinkPlan | None = None,
+) -> dict:
+    """Drop sessions older than retention and close out ones that never ended.
+
+    Sessions still "active" ``stale_after_s`` after they started are marked
+    "abandoned". Returns counts of removed and abandoned sessions.
+    """
+    try:
+        sessions = json.loads(SESSIONS_PATH.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"removed": 0, "abandoned": 0}
+
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(days=retention_days)).isoformat(timespec="milliseconds")
+    stale = (now - timedelta(seconds=stale_after_s)).isoformat(timespec="milliseconds")
+    kept = {}
+    abandoned = 0
+    for sid, info in sessions.items():
+        started = info.get("started_at") or ""
+        if started and started < cutoff:
+            continue
+        if info.get("status") == "active" and started and started < stale:
+            info["status"] = "abandoned"
+            abandoned += 1
+        kept[sid] = info
+
+    removed = len(sessions) - len(kept)
+    if removed or abandoned:
+        plan = plan or load_plan()
+        atomic_write(SESSIONS_PATH, json.dumps(kept, indent=2, default=str) + "\n", plan.fsync)
+    return {"removed": removed, "abandoned": abandoned}
 
 
 # --- Pre/Post correlation ---
 
-def push_pending(session_id: str, tool_name: str, correlation_id: str) -> None:
-    """Push a tool_start to the pending stack for later correlation."""
-    PENDING_DIR.mkdir(parents=True, exist_ok=True)
+def push_pending(
+    session_id: str, tool_name: str, correlation_id: str, input_preview: str | None = None,
+) -> None:
+    """Push a tool_start to the pending stack for later correlation.
+
+    In span mode the input preview rides along so PostToolUse can emit it.
+    """
     pending_file = PENDING_DIR / f"{session_id}.json"
 
     stack = []
@@ -309,14 +1931,17 @@ def push_pending(session_id: str, tool_name: str, correlation_id: str) -> None:
         except (json.JSONDecodeError, OSError):
             stack = []
 
-    stack.append({
+    entry = {
         "tool_name": tool_name,
         "correlation_id": correlation_id,
         "started_at": time.monotonic_ns(),
         "started_ts": _now_iso(),
-    })
+    }
+    if input_preview is not None:
+        entry["input_preview"] = input_preview
+    stack.append(entry)
 
-    pending_file.write_text(json.dumps(stack) + "\n")
+    atomic_write(pending_file, json.dumps(stack) + "\n")
 
 
 def pop_pending(session_id: str, tool_name: str) -> dict | None:
@@ -335,7 +1960,7 @@ def pop_pending(session_id: str, tool_name: str) -> dict | None:
     for i in range(len(stack) - 1, -1, -1):
         if stack[i].get("tool_name") == tool_name:
             entry = stack.pop(i)
-            pending_file.write_text(json.dumps(stack) + "\n")
+            atomic_write(pending_file, json.dumps(stack) + "\n")
             return entry
 
     return None
@@ -360,67 +1985,452 @@ def cleanup_old_events(retention_days: int = 30) -> int:
             f.unlink()
             deleted += 1
 
-    # Clean up stale pending files
-    for f in PENDING_DIR.glob("*.json"):
-        try:
-            age = time.time() - f.stat().st_mtime
-            if age > 86400:  # 24 hours
+    # Drop v2 intern tables and cached aggregates of deleted day files
+    for f in TELEMETRY_DIR.glob(".events-*.intern.json"):
+        if f.name[len(".events-"):len(".events-YYYY-MM-DD")] < cutoff_str:
+            try:
+                f.unlink()
+            except OSError:
+                pass
+    for f in CACHE_DIR.glob("events-*.json"):
+        if f.name[len("events-"):len("events-YYYY-MM-DD")] < cutoff_str:
+            try:
                 f.unlink()
+            except OSError:
+                pass
+
+    # Degradation counts age out with the events they describe
+    try:
+        lines = DEGRADED_PATH.read_text().splitlines(keepends=True)
+    except OSError:
+        lines = []
+    kept = []
+    for line in lines:
+        try:
+            if json.loads(line)["ts"][:10] >= cutoff_str:
+                kept.append(line)
+        except (ValueError, KeyError, TypeError):
+            continue
+    if len(kept) < len(lines):
+        try:
+            atomic_write(DEGRADED_PATH, "".join(kept))
         except OSError:
             pass
 
+    sweep_stale_pending()
     return deleted
 
 
+def sweep_stale_pending(max_age_s: float = 86400) -> int:
+    """Delete pending stacks untouched for ``max_age_s`` (sessions that never ended).
+
+    Group-commit marks of logs not written for as long go too; a missing
+    mark only means the next append to that log syncs straight away.
+    """
+    swept = 0
+    now = time.time()
+    for f in [*PENDING_DIR.glob("*.json"), *SYNC_DIR.glob("*")]:
+        try:
+            if now - f.stat().st_mtime > max_age_s:
+                f.unlink()
+                swept += 1
+        except OSError:
+            pass
+    return swept
+
+
 # --- Agent transcript parsing ---
 
-def parse_agent_transcript(transcript_path: str) -> dict:
+def parse_agent_transcript(transcript_path: str, deadline: Deadline | None = None) -> dict:
     """Parse a subagent's transcript JSONL to extract tool usage stats.
 
-    Returns dict with tool_counts, total_tools, and turns.
+    Returns dict with tool_counts, total_tools, and turns. With a
+    ``deadline`` the parse is skipped when time is already low, and cut
+    short (``truncated``) if it runs low mid-file.
     """
     from collections import Counter
 
+    if deadline and deadline.low():
+        deadline.degrade("transcript_skipped")
+        return {}
+
     path = Path(transcript_path)
     if not path.exists():
         return {}
 
     tool_counts = Counter()
     turns = 0
+    truncated = False
 
     try:
-        for line in path.read_text().splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                entry = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-
-            if entry.get("type") != "assistant":
-                continue
-
-            turns += 1
-            msg = entry.get("message", {})
-            for block in msg.get("content", []):
-                if isinstance(block, dict) and block.get("type") == "tool_use":
-                    tool_counts[block.get("name", "unknown")] += 1
+        with open(path) as f:
+            for i, line in enumerate(f):
+                if deadline and i % 256 == 0 and deadline.low():
+                    truncated = True
+                    deadline.degrade("transcript_truncated")
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if entry.get("type") != "assistant":
+                    continue
+
+                turns += 1
+                msg = entry.get("message", {})
+                for block in msg.get("content", []):
+                    if isinstance(block, dict) and block.get("type") == "tool_use":
+                        tool_counts[block.get("name", "unknown")] += 1
     except OSError:
         return {}
 
-    return {
+    result = {
         "tool_counts": dict(tool_counts.most_common()),
         "total_tools": sum(tool_counts.values()),
         "turns": turns,
     }
+    if truncated:
+        result["truncated"] = True
+    return result
 
 
 # --- Hook input helper ---
 
-def read_hook_input() -> dict:
-    """Read JSON from stdin (standard hook input protocol)."""
+# Top-level hook fields that are only ever measured, never materialized
+_MEASURED_FIELDS = {"tool_result", "tool_response"}
+# Top-level hook fields parsed only up to a preview-sized prefix
+_PREVIEWED_FIELDS = {"tool_input"}
+_STDIN_CHUNK = 256 * 1024
+
+_CONTAINER_STOP = re.compile(rb'["{}\[\]]')
+_SCALAR_END = re.compile(rb'[\s,}\]]')
+_WHITESPACE = b" \t\r\n"
+
+# Measuring raw JSON text the way json.dumps would re-encode it
+_UTF8_CONT = bytes(range(0x80, 0xC0))
+_UTF8_LEAD2 = bytes(range(0xC2, 0xE0))
+_UTF8_LEAD3 = bytes(range(0xE0, 0xF0))
+_UTF8_LEAD4 = bytes(range(0xF0, 0xF5))
+_UNICODE_OR_SLASH_ESCAPE = re.compile(rb'\\(u[0-9a-fA-F]{4}|/)')
+_SCALAR_TOKEN = re.compile(rb'[^\s,:]+')
+_STRETCH_END = re.compile(rb'[\s\S]*[\s,:]')
+
+
+def _preview_capture_bytes(plan: SinkPlan) -> int:
+    """Raw bytes of ``tool_input`` kept for its preview.
+
+    A JSON-encoded char takes at most 12 bytes (an escaped surrogate pair),
+    so this always holds more than ``tool_input_preview_chars`` chars.
+    """
+    return max(1024, 12 * plan.tool_input_preview_chars + 64)
+
+
+def _closing_quote(buf: bytes, start: int) -> int:
+    """Index of the first unescaped quote in ``buf[start:]``, or -1.
+
+    ``start`` is inside a string and never inside a run of backslashes.
+    """
+    quote = buf.find(b'"', start)
+    while quote >= 0:
+        # A quote is escaped iff an odd number of backslashes precede it
+        run = quote
+        while run > start and buf[run - 1] == 0x5C:
+            run -= 1
+        if (quote - run) % 2 == 0:
+            return quote
+        quote = buf.find(b'"', quote + 1)
+    return -1
+
+
+def _string_cut(buf: bytes, start: int) -> int:
+    """Where a string body fragment ``buf[start:cut]`` may end.
+
+    The cut never splits a run of backslashes, an escape sequence or an
+    escaped surrogate pair, so fragments can be measured one at a time.
+    """
+    end = len(buf)
+    # An escape is at most 6 bytes ("\\uXXXX"): back off to before the
+    # backslash run if the last backslash in that tail starts an escape
+    last = buf.rfind(b"\\", max(start, end - 6))
+    if last >= 0:
+        run = last
+        while run > start and buf[run - 1] == 0x5C:
+            run -= 1
+        if (last - run) % 2 == 0:  # the last backslash opens an escape
+            end = run
+    # A "\\uD8xx".."\\uDBxx" ending the fragment waits for its low half,
+    # so the pair is counted as one char by the next fragment
+    high = end - 6
+    if (high >= start and buf[high] == 0x5C and buf[high + 1] == 0x75
+            and buf[high + 2] in b"dD" and buf[high + 3] in b"89abAB"):
+        run = high
+        while run > start and buf[run - 1] == 0x5C:
+            run -= 1
+        if (high - run) % 2 == 0:  # a high surrogate whose low half may follow
+            end = run
+    return end
+
+
+def _string_sizes(body: bytes) -> tuple[int, int]:
+    """(decoded chars, json.dumps length without quotes) of a string body fragment."""
+    n = len(body)
+    backslashes = body.count(b"\\")
+    # One char per UTF-8 lead byte, minus one per escape (each escape's
+    # backslash; an escaped backslash "\\\\" counts once). "\\uXXXX" is
+    # settled below.
+    chars = len(body.translate(None, _UTF8_CONT)) - (backslashes - body.count(b"\\\\"))
+    # json.dumps keeps ASCII and escapes stay as written; non-ASCII grows to
+    # "\\uXXXX" (6 bytes for a 2- or 3-byte sequence, a 12-byte pair for
+    # 4 bytes) and DEL to "\\u007f"
+    dumped = (n + 4 * (n - len(body.translate(None, _UTF8_LEAD2)))
+              + 3 * (n - len(body.translate(None, _UTF8_LEAD3)))
+              + 8 * (n - len(body.translate(None, _UTF8_LEAD4)))
+              + 5 * body.count(b"\x7f"))
+    if backslashes and (b"\\u" in body or b"\\/" in body):
+        high_end = -1
+        for m in _UNICODE_OR_SLASH_ESCAPE.finditer(body):
+            run = m.start()
+            while run > 0 and body[run - 1] == 0x5C:
+                run -= 1
+            if (m.start() - run) % 2:
+                continue  # an escaped backslash followed by a literal "u" or "/"
+            escape = m.group(1)
+            if escape == b"/":
+                dumped -= 1
+                continue
+            chars -= 4
+            cp = int(escape[1:], 16)
+            if 0xDC00 <= cp <= 0xDFFF and high_end == m.start():
+                chars -= 1  # a surrogate pair decodes to one char
+            high_end = m.end() if 0xD800 <= cp <= 0xDBFF else -1
+            dumped += len(json.dumps(chr(cp))) - 2 - 6
+    return chars, dumped
+
+
+def _stretch_dumped(stretch: bytes) -> int:
+    """json.dumps length of the text between strings and brackets of a container."""
+    n = 2 * (stretch.count(b",") + stretch.count(b":"))
+    for token in _SCALAR_TOKEN.findall(stretch):
+        n += len(json.dumps(json.loads(token)))
+    return n
+
+
+class RawJSON:
+    """Bounded view of a hook input value that was too large to parse.
+
+    ``prefix`` holds the first bytes of the value's JSON text (decoded),
+    ``size`` the length of the full JSON text in bytes.
+    """
+
+    __slots__ = ("prefix", "size")
+
+    def __init__(self, prefix: str, size: int):
+        self.prefix = prefix
+        self.size = size
+
+    def __str__(self) -> str:
+        return self.prefix
+
+
+class _JSONStreamScanner:
+    """Incremental scanner over a JSON object on a byte stream.
+
+    Values are consumed chunk by chunk without building Python objects;
+    only up to ``keep`` bytes of each value's text are retained, so memory
+    and parsing cost are bounded by what the caller wants to keep.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buf = b""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.stream.read(_STDIN_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> int | None:
+        """Skip whitespace and return the next byte without consuming it."""
+        while True:
+            buf = self.buf
+            while self.pos < len(buf) and buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(buf):
+                return buf[self.pos]
+            if not self._fill():
+                return None
+
+    def expect(self, byte: bytes) -> None:
+        if self.peek() != byte[0]:
+            raise ValueError(f"expected {byte!r}")
+        self.pos += 1
+
+    def read_value(self, keep: int | None, measure: bool = False) -> tuple[bytes, int]:
+        """Consume one JSON value. Returns (first ``keep`` bytes, total size).
+
+        With ``measure``, ``self.chars`` and ``self.dumped`` are set to the
+        decoded length of a string value and the ``json.dumps`` length of
+        the value, as if it had been parsed.
+        """
+        if self.peek() is None:
+            raise ValueError("unexpected end of input")
+        kept = []
+        kept_len = 0
+        size = 0
+        depth = 0
+        in_string = False
+        self.chars = self.dumped = 0
+
+        def take(end: int) -> None:
+            nonlocal kept_len, size
+            n = end - self.pos
+            if keep is None or kept_len < keep:
+                piece = self.buf[self.pos:end] if keep is None else self.buf[self.pos:min(end, self.pos + keep - kept_len)]
+                kept.append(piece)
+                kept_len += len(piece)
+            size += n
+            self.pos = end
+
+        first = self.buf[self.pos]
+        if first not in b'"{[':
+            # Scalar: number, true, false, null
+            while True:
+                m = _SCALAR_END.search(self.buf, self.pos)
+                if m:
+                    take(m.start())
+                    return b"".join(kept), size
+                take(len(self.buf))
+                if not self._fill():
+                    return b"".join(kept), size
+
+        def take_body(end: int) -> None:
+            if measure:
+                chars, dumped = _string_sizes(self.buf[self.pos:end])
+                self.chars += chars
+                self.dumped += dumped
+            take(end)
+
+        def take_stretch(end: int) -> None:
+            if measure:
+                self.dumped += _stretch_dumped(self.buf[self.pos:end])
+            take(end)
+
+        # A string or container: the scanner is either inside a string
+        # (``in_string``, at any ``depth``) or between the tokens of the
+        # ``depth`` open containers. Bytes before ``self.pos`` are consumed.
+        while True:
+            if self.pos >= len(self.buf) and not self._fill():
+                raise ValueError("unterminated value")
+            if in_string:
+                # One find per quote; escapes are skipped by backslash parity
+                quote = _closing_quote(self.buf, self.pos)
+                if quote < 0:
+                    take_body(_string_cut(self.buf, self.pos))
+                    if not self._fill():
+                        raise ValueError("unterminated string")
+                    continue
+                take_body(quote)
+                take(quote + 1)
+                self.dumped += 1
+                in_string = False
+                if depth == 0:
+                    return b"".join(kept), size
+                continue
+            m = _CONTAINER_STOP.search(self.buf, self.pos)
+            if not m:
+                if not measure:
+                    take(len(self.buf))
+                    continue
+                # Outside strings: skip to the next quote or bracket; the stretch
+        # before it holds only scalars, commas, colons and whitespace.
+        # Never split a scalar between chunks
+                sep = _STRETCH_END.match(self.buf, self.pos)
+                if sep:
+                    take_stretch(sep.end())
+                if not self._fill():
+                    raise ValueError("unterminated value")
+                continue
+            # A quote opens a string, a bracket opens or closes a container
+            take_stretch(m.start())
+            c = self.buf[m.start()]
+            take(m.start() + 1)
+            self.dumped += 1
+            if c == 0x22:  # "
+                in_string = True
+            elif c in b"{[":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return b"".join(kept), size
+
+    def measure_value(self) -> int:
+        """Consume one value; returns the size ``sanitize_tool_result`` gives it parsed.
+
+        That is the decoded length of a string, 0 for null and the
+        ``json.dumps`` length of anything else.
+        """
+        c = self.peek()
+        if c is None:
+            raise ValueError("unexpected end of input")
+        if c not in b'"{[':
+            raw, _ = self.read_value(None)
+            value = json.loads(raw)
+            return 0 if value is None else len(json.dumps(value))
+        self.read_value(0, measure=True)
+        return self.chars if c == 0x22 else self.dumped
+
+
+def _scan_hook_object(stream, capture: int) -> dict:
+    scanner = _JSONStreamScanner(stream)
+    scanner.expect(b"{")
+    result = {}
+    while True:
+        c = scanner.peek()
+        if c == ord("}"):
+            return result
+        if c == ord(","):
+            scanner.pos += 1
+            continue
+        raw_key, _ = scanner.read_value(None)
+        key = json.loads(raw_key)
+        scanner.expect(b":")
+        if key in _MEASURED_FIELDS:
+            result[key] = RawJSON("", scanner.measure_value())
+        elif key in _PREVIEWED_FIELDS:
+            raw, size = scanner.read_value(capture)
+            if size <= capture:
+                result[key] = json.loads(raw)
+            else:
+                result[key] = RawJSON(raw.decode("utf-8", "ignore"), size)
+        else:
+            raw, _ = scanner.read_value(None)
+            result[key] = json.loads(raw)
+
+
+def read_hook_input(plan: SinkPlan | None = None) -> dict:
+    """Read the hook input object from stdin (standard hook input protocol).
+
+    Small top-level fields are parsed as usual. ``tool_result`` /
+    ``tool_response`` are only measured and ``tool_input`` is parsed only
+    when small enough for the plan's preview, so the cost stays bounded
+    however large the payload is. Measured and oversized values are
+    returned as ``RawJSON``.
+    """
+    stream = getattr(sys.stdin, "buffer", sys.stdin)
     try:
-        return json.load(sys.stdin)
-    except (json.JSONDecodeError, ValueError):
+        return _scan_hook_object(stream, _preview_capture_bytes(plan or load_plan()))
+    except (json.JSONDecodeError, ValueError, OSError):
         return {}
@@ -0,0 +1,25 @@
+"""Run the plugin against a throwaway HOME so tests never touch ~/.claude."""
+
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+os.environ["HOME"] = tempfile.mkdtemp(prefix="telemetry-tests-")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "lib"))
+
+import telemetry  # noqa: E402  (needs HOME set first)
+
+
+@pytest.fixture(autouse=True)
+def telemetry_dir():
+    """A fresh, empty telemetry directory per test."""
+    shutil.rmtree(telemetry.TELEMETRY_DIR, ignore_errors=True)
+    telemetry.TELEMETRY_DIR.mkdir(parents=True)
+    telemetry._plan_cache = None
+    telemetry._intern_cache.clear()
+    yield telemetry.TELEMETRY_DIR
+    telemetry._plan_cache = None
@@ -0,0 +1,44 @@
+import fcntl
+import os
+import time
+from datetime import datetime, timezone
+
+from telemetry import (
+    DEGRADED_PATH, LOCK_WAIT_BUDGET_S, PUSH_QUEUE_PATH, SPILL_DIR, TELEMETRY_DIR, Deadline, plan_from_config,
+    write_event,
+)
+
+
+def _hold_lock(path):
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return fd
+
+
+def test_lock_waits_share_one_budget():
+    plan = plan_from_config({"api_url": "http://127.0.0.1:9", "api_key": "ct_live_test"})
+    day_file = TELEMETRY_DIR / f"events-{datetime.now(timezone.utc):%Y-%m-%d}.jsonl"
+    held = [_hold_lock(day_file), _hold_lock(PUSH_QUEUE_PATH)]
+    try:
+        deadline = Deadline("post_tool_use")
+        started = time.monotonic()
+        for _ in range(3):
+            write_event("tool_end", "s1", {"tool_name": "Bash"}, plan=plan, deadline=deadline)
+        elapsed = time.monotonic() - started
+    finally:
+        for fd in held:
+            os.close(fd)
+    assert LOCK_WAIT_BUDGET_S <= elapsed < LOCK_WAIT_BUDGET_S + 0.5
+    assert deadline.lock_wait() == 0.0
+    assert deadline.degraded.count("event_spilled") == 3
+    assert len(list(SPILL_DIR.glob("*.jsonl"))) == 6
+
+
+def test_busy_lock_without_deadline_spills_without_degrading(monkeypatch):
+    import telemetry
+    monkeypatch.setattr(telemetry, "_flock", lambda fd, wait_s: False)
+    plan = plan_from_config({"api_url": "http://127.0.0.1:9", "api_key": "ct_live_test"})
+    write_event("tool_end", "s1", {"tool_name": "Bash"}, plan=plan)
+    kinds = sorted(f.name.split(".")[0] for f in SPILL_DIR.glob("*.jsonl"))
+    assert kinds == [f"events-{datetime.now(timezone.utc):%Y-%m-%d}", "push"]
+    assert not DEGRADED_PATH.exists()
@@ -0,0 +1,51 @@
+import builtins
+import json
+from datetime import datetime, timezone
+
+import telemetry
+from telemetry import TELEMETRY_DIR, _intern_path, iter_day_file, plan_from_config, write_event
+
+
+def test_v2_intern_sidecar_is_read_only_when_it_changes(monkeypatch):
+    plan = plan_from_config({"event_format": "v2"})
+    day_file = TELEMETRY_DIR / f"events-{datetime.now(timezone.utc):%Y-%m-%d}.jsonl"
+    sidecar = _intern_path(day_file)
+    write_event("tool_end", "s1", {"tool_name": "Bash"}, plan=plan)
+
+    reads = []
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == str(sidecar):
+            reads.append(file)
+        return builtins.open(file, *args, **kwargs)
+
+    monkeypatch.setattr(telemetry, "open", counting_open, raising=False)
+    for _ in range(5):
+        write_event("tool_end", "s1", {"tool_name": "Bash"}, plan=plan)
+    assert reads == []
+
+    # A new name rewrites the sidecar; a process without it cached reads it once
+    cached = json.loads(sidecar.read_text())
+    write_event("tool_end", "s2", {"tool_name": "Bash"}, plan=plan)
+    telemetry._intern_cache.clear()
+    write_event("tool_end", "s2", {"tool_name": "Read"}, plan=plan)
+    assert len(reads) == 1
+    assert json.loads(sidecar.read_text())["ids"].keys() > cached["ids"].keys()
+
+    events = list(iter_day_file(day_file))
+    assert [e["session_id"] for e in events] == ["s1"] * 6 + ["s2"] * 2
+    assert [e["data"]["tool_name"] for e in events] == ["Bash"] * 7 + ["Read"]
+
+
+def test_v2_span_start_is_stored_as_epoch_ms():
+    plan = plan_from_config({"event_format": "v2"})
+    day_file = TELEMETRY_DIR / f"events-{datetime.now(timezone.utc):%Y-%m-%d}.jsonl"
+    started = telemetry._now_iso()
+    data = {"tool_name": "Bash", "correlation_id": "c1", "duration_ms": 5, "started_ts": started}
+    write_event("tool_span", "s1", data, plan=plan)
+
+    line = json.loads(day_file.read_text().splitlines()[-1])
+    assert line["d"]["b"] == telemetry._ms_from_iso(started)
+    for iso in (True, False):
+        [event] = iter_day_file(day_file, iso=iso)
+        assert event["data"] == data
@@ -0,0 +1,117 @@
+import io
+import json
+import time
+
+import pytest
+
+import telemetry
+from telemetry import (
+    _closing_quote, _scan_hook_object, _string_cut, plan_from_config, sanitize_tool_input,
+    sanitize_tool_result,
+)
+
+PLAN = plan_from_config({})
+
+
+def scan(payload, plan=PLAN, ensure_ascii=True):
+    raw = json.dumps(payload, ensure_ascii=ensure_ascii).encode()
+    return _scan_hook_object(io.BytesIO(raw), telemetry._preview_capture_bytes(plan))
+
+
+def measured(value, ensure_ascii=True):
+    return scan({"tool_response": value}, ensure_ascii=ensure_ascii)["tool_response"].size
+
+
+def test_result_size_matches_parsed_value():
+    values = [
+        "line\n" * 1000,
+        "naïve café ünïcödé 中文 😀" * 50,
+        'quotes " and \\ backslashes \t tabs \x01 \x7f',
+        {"a": 1, "b": [1.5, None, True], "c": "x/y"},
+        {"stdout": "é\n" * 300, "stderr": "", "interrupted": False},
+        [], {}, 12345, None, "",
+    ]
+    for value in values:
+        for ensure_ascii in (True, False):
+            assert measured(value, ensure_ascii) == sanitize_tool_result(value)["size"], value
+
+
+def test_result_size_across_chunk_boundaries(monkeypatch):
+    value = {"s": "\\\\\"é😀\n" * 500, "t": list(range(200))}
+    for chunk in (3, 7, 64):
+        monkeypatch.setattr(telemetry, "_STDIN_CHUNK", chunk)
+        assert measured(value) == sanitize_tool_result(value)["size"]
+
+
+def test_large_string_input_preview():
+    text = 'echo "hi"\n' * 5000
+    preview = sanitize_tool_input(scan({"tool_input": text})["tool_input"], PLAN)
+    assert preview == text[:100] + "..."
+
+
+def test_preview_not_marked_truncated_when_short():
+    plan = plan_from_config({"privacy": {"tool_input_preview_chars": 100000}})
+    value = {"command": "x" * 5000}
+    preview = sanitize_tool_input(scan({"tool_input": value}, plan)["tool_input"], plan)
+    assert preview == json.dumps(value)
+
+
+def test_preview_honours_configured_length():
+    plan = plan_from_config({"privacy": {"tool_input_preview_chars": 5000}})
+    value = {"content": "é" * 50000}
+    preview = sanitize_tool_input(scan({"tool_input": value}, plan)["tool_input"], plan)
+    assert preview == sanitize_tool_input(value, plan)
+    assert len(preview) == 5003
+
+
+def test_nested_strings_with_escapes(monkeypatch):
+    value = {"a": {"b": ['x\\"y', "\\", "}]\"[{", {"c": "\\\\\"", "d": []}]}, "e": "\\/"}
+    assert _closing_quote(b'x\\"y"', 0) == 4
+    assert _closing_quote(b'\\\\"', 0) == 2
+    assert _closing_quote(b'\\"', 0) == -1
+    for chunk in range(1, 12):
+        monkeypatch.setattr(telemetry, "_STDIN_CHUNK", chunk)
+        assert measured(value) == sanitize_tool_result(value)["size"], chunk
+        assert scan({"tool_input": value})["tool_input"] == value
+
+
+def test_surrogate_pairs_split_across_chunks(monkeypatch):
+    assert _string_cut(b"ab\\ud83d\\ude00", 0) == 2
+    assert _string_cut(b"ab\\ud83d", 0) == 2
+    assert _string_cut(b"ab\\ud8", 0) == 2
+    assert _string_cut(b"ab\\\\", 0) == 4
+    value = "a😀b\\😀" * 20 + "\ud83d"  # and a lone high surrogate
+    for chunk in range(1, 16):
+        monkeypatch.setattr(telemetry, "_STDIN_CHUNK", chunk)
+        assert measured(value) == sanitize_tool_result(value)["size"], chunk
+
+
+def test_truncated_input_is_rejected():
+    raw = json.dumps({"tool_name": "Bash", "tool_input": {"command": "ls \"x\""},
+                      "tool_response": ["é😀", 1.5, None], "n": 12}).encode()
+    for cut in range(len(raw)):
+        with pytest.raises(ValueError):
+            _scan_hook_object(io.BytesIO(raw[:cut]), 1264)
+
+
+def test_large_list_input_previews_like_str():
+    value = [{"path": f"/tmp/é{i}", "ok": True, "n": None} for i in range(500)]
+    preview = sanitize_tool_input(scan({"tool_input": value})["tool_input"], PLAN)
+    assert preview == sanitize_tool_input(value, PLAN) == str(value)[:100] + "..."
+
+
+def test_escape_heavy_payload_is_not_slower_than_json():
+    payload = json.dumps({"tool_name": "Read", "tool_response": {"content": "line\n" * 1_000_000}}).encode()
+
+    def best(fn):
+        return min(_timed(fn) for _ in range(3))
+
+    scan_s = best(lambda: _scan_hook_object(io.BytesIO(payload), 1264))
+    json_s = best(lambda: json.dumps(json.loads(payload)["tool_response"]))
+    assert scan_s < 3 * json_s + 0.02
+
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
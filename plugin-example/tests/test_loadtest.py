@@ -0,0 +1,19 @@
+from loadtest import StandInServer, run_load, synthetic_events
+from telemetry import event_id
+
+
+def test_every_sweep_round_ingests_the_same_events():
+    events = [{**e, "event_id": event_id({**e, "seq": i})} for i, e in enumerate(synthetic_events(600, 5))]
+    server = StandInServer(latency_ms=0, per_event_us=0).start()
+    try:
+        inserted = []
+        for batch_size in (100, 250, 100):
+            server.reset_limits()
+            before = server.inserted
+            result = run_load(server.url, ["ct_live_test"], events, batch_size, clients=2)
+            assert result["events_failed"] == 0
+            inserted.append(server.inserted - before)
+    finally:
+        server.stop()
+    assert inserted == [600, 600, 600]
+    assert server.duplicates == 0
@@ -0,0 +1,34 @@
+import os
+import time
+
+from maintenance import run_maintenance
+from store import STORE_PATH
+from telemetry import SYNC_DIR, plan_from_config, sweep_stale_pending
+
+
+def test_force_skips_tasks_the_plan_disables():
+    plan = plan_from_config({"maintenance_intervals_s": {"retention": None}})
+    result = run_maintenance(force=True, plan=plan)
+    assert result["status"] == "ok"
+    assert "store_sync" not in result["tasks"]
+    assert "push_flush" not in result["tasks"]
+    assert "retention" not in result["tasks"]
+    assert "session_index" in result["tasks"]
+    assert not STORE_PATH.exists()
+
+
+def test_force_runs_store_sync_when_enabled():
+    result = run_maintenance(force=True, plan=plan_from_config({"sqlite_store": True}))
+    assert "store_sync" in result["tasks"]
+    assert STORE_PATH.exists()
+
+
+def test_pending_sweep_prunes_old_group_commit_marks():
+    old, fresh = SYNC_DIR / "events-2020-01-01.jsonl", SYNC_DIR / ".push_queue.jsonl"
+    SYNC_DIR.mkdir(parents=True)
+    for mark in (old, fresh):
+        mark.write_text(f"{time.time()} 0\n")
+    os.utime(old, (time.time() - 2 * 86400,) * 2)
+    assert sweep_stale_pending() == 1
+    assert not old.exists()
+    assert fresh.exists()
@@ -0,0 +1,128 @@
+import json
+import shutil
+from collections import Counter
+
+from loadtest import VALID_EVENT_TYPES, StandInServer, _validate_body
+from telemetry import (
+    PUSH_DROPPED_PATH, PUSH_QUEUE_PATH, PUSH_SEGMENTS_DIR, TELEMETRY_DIR, _drop_report,
+    _seal_active_segment, flush_push_queue, plan_from_config, rollup_events,
+    to_saas_event, write_event,
+)
+
+
+def test_drop_report_is_a_client_report():
+    report = _drop_report({"total": 3, "queue_full": {"tool_use": 3}}, "drop_oldest")
+    assert report["event"] == "client_report"
+    assert report["data"]["kind"] == "push_queue_dropped"
+    assert report["event_id"]
+    assert "client_report" in VALID_EVENT_TYPES
+    assert _validate_body({"events": [report]}) is None
+
+
+def _tool_events(session_id, n):
+    return [
+        to_saas_event({
+            "ts": f"2026-01-01T10:{i:02d}:00.000Z", "event": "tool_end", "session_id": session_id,
+            "seq": i, "data": {"tool_name": "Bash", "duration_ms": 5, "result_size": 10},
+        })
+        for i in range(n)
+    ]
+
+
+def test_rollup_ids_are_deterministic():
+    events = _tool_events("s1", 4) + _tool_events("s2", 4)
+    first = rollup_events(events, raw_sample_rate=0)
+    again = rollup_events(list(reversed(events)), raw_sample_rate=0)
+    ids = [e["event_id"] for e in first]
+    assert len(first) == 2 and len(set(ids)) == 2
+    assert sorted(ids) == sorted(e["event_id"] for e in again)
+    assert _validate_body({"events": first}) is None
+    # A rollup over other source events is a different rollup
+    partial = rollup_events(_tool_events("s1", 3), raw_sample_rate=0)
+    assert partial[0]["event_id"] not in ids
+
+
+def _push_calls(server, tool_event_mode, push_mode):
+    """Record 3 sessions of 4 tool calls in one mode and flush them to ``server``."""
+    plan = plan_from_config({
+        "api_url": server.url, "api_key": "ct_live_test", "tool_event_mode": tool_event_mode,
+        "push_mode": push_mode, "push_raw_sample_rate": 0,
+    })
+    shutil.rmtree(TELEMETRY_DIR)
+    TELEMETRY_DIR.mkdir()
+    before = Counter(server.totals)
+    for s in range(3):
+        session_id = f"{tool_event_mode}-{push_mode}-{s}"
+        write_event("session_start", session_id, {"cwd": "/tmp"}, plan=plan)
+        for i in range(4):
+            data = {"tool_name": "Bash", "duration_ms": 5.0}
+            if plan.span_mode:
+                write_event("tool_span", session_id, data, plan=plan)
+            else:
+                write_event("tool_start", session_id, {"tool_name": "Bash"}, plan=plan)
+                write_event("tool_end", session_id, data, plan=plan)
+    assert flush_push_queue(plan, force=True)["status"] == "ok"
+    return dict(Counter(server.totals) - before)
+
+
+def test_span_and_pair_modes_count_the_same_on_the_saas():
+    server = StandInServer(latency_ms=0, per_event_us=0).start()
+    try:
+        counts = {
+            (tool_mode, push_mode): _push_calls(server, tool_mode, push_mode)
+            for tool_mode in ("pair", "span") for push_mode in ("raw", "rollup")
+        }
+    finally:
+        server.stop()
+    assert counts[("pair", "raw")] == {"events": 27, "tool_uses": 24}
+    assert all(c == counts[("pair", "raw")] for c in counts.values()), counts
+
+
+def test_saas_counts_scale_sampled_events_like_local_reports():
+    from reporter import aggregate_days
+
+    server = StandInServer(latency_ms=0, per_event_us=0).start()
+    plan = plan_from_config({
+        "api_url": server.url, "api_key": "ct_live_test",
+        "rules": [{"event": "tool_*", "tool_name": "Read", "action": "sample", "rate": 0.25}],
+    })
+    try:
+        for i in range(200):
+            write_event("tool_end", "s1", {"tool_name": "Read" if i % 2 else "Bash"}, plan=plan)
+        assert flush_push_queue(plan, force=True)["status"] == "ok"
+    finally:
+        server.stop()
+    local = aggregate_days(1, plan=plan)
+    assert server.inserted < 200
+    assert server.totals["events"] == local["total_events"]
+    assert server.totals["tool_uses"] == sum(local["tool_counts"].values())
+
+
+def _fill_queue(policy, events=1000):
+    plan = plan_from_config({
+        "api_url": "http://127.0.0.1:9", "api_key": "ct_live_test",
+        "push_queue_max_bytes": 65536, "push_overflow_policy": policy,
+    })
+    for i in range(events):
+        write_event("tool_end", "s1", {"tool_name": "Bash", "i": i}, plan=plan)
+    queued = []
+    for path in [*sorted(PUSH_SEGMENTS_DIR.glob(".sealing-*.jsonl")), PUSH_QUEUE_PATH]:
+        queued += [json.loads(line)["data"]["i"] for line in path.read_text().splitlines()]
+    dropped = [json.loads(line) for line in PUSH_DROPPED_PATH.read_text().splitlines()]
+    return plan, queued, dropped
+
+
+def test_full_active_segment_follows_drop_oldest():
+    plan, queued, dropped = _fill_queue("drop_oldest")
+    assert queued[-1] == 999 and queued == sorted(queued)
+    assert sum(sum(d["events"].values()) for d in dropped) == queued[0]
+    assert all(d["reason"] == "queue_full" for d in dropped)
+    sealed = _seal_active_segment(plan, {"segments": {}})
+    assert sealed == len(queued) and not PUSH_QUEUE_PATH.exists()
+    assert not list(PUSH_SEGMENTS_DIR.glob(".sealing-*"))
+
+
+def test_full_active_segment_follows_stop():
+    _, queued, dropped = _fill_queue("stop")
+    assert queued == list(range(len(queued)))
+    assert sum(sum(d["events"].values()) for d in dropped) == 1000 - len(queued)
@@ -0,0 +1,64 @@
+import json
+import shutil
+from datetime import datetime, timezone
+
+import reporter
+from reporter import _cached_day_aggregate, aggregate_roots, text_report, window
+from telemetry import (
+    TELEMETRY_DIR, _append_event_line, iter_day_file, plan_from_config, write_event,
+)
+
+
+def _day_file():
+    return TELEMETRY_DIR / f"events-{datetime.now(timezone.utc):%Y-%m-%d}.jsonl"
+
+
+def _record_session(session_id, fmt, cwd="/tmp"):
+    plan = plan_from_config({"event_format": fmt})
+    if cwd:
+        write_event("session_start", session_id, {"cwd": cwd}, plan=plan)
+    for i in range(5):
+        write_event("tool_end", session_id, {"tool_name": "Bash", "correlation_id": f"c{i}"}, plan=plan)
+
+
+def test_aggregate_roots_dedups_overlap_across_v1_and_v2_copies(tmp_path):
+    _record_session("shared", "v1")
+    v1 = tmp_path / "v1"
+    shutil.copytree(TELEMETRY_DIR, v1)
+
+    # The same events re-encoded as v2, plus a session only this copy has
+    events = list(iter_day_file(_day_file()))
+    _day_file().unlink()
+    v2_plan = plan_from_config({"event_format": "v2"})
+    for e in events:
+        _append_event_line(_day_file(), e, v2_plan)
+    _record_session("only-v2", "v2")
+    v2 = tmp_path / "v2"
+    shutil.copytree(TELEMETRY_DIR, v2)
+
+    stats = aggregate_roots([v1, v2], days=1, workers=1)
+    assert stats["total_events"] == 12
+    assert stats["unique_sessions"] == 2
+
+
+def test_day_cache_follows_session_cwd_changes(tmp_path):
+    _record_session("s1", "v1", cwd=None)
+    first, _, _ = _cached_day_aggregate(_day_file(), False, {"s1": "/a"}, tmp_path)
+    again, _, _ = _cached_day_aggregate(_day_file(), False, {"s1": "/b"}, tmp_path)
+    assert set(first.cwd_tools) == {"/a\tBash"}
+    assert set(again.cwd_tools) == {"/b\tBash"}
+
+
+def test_report_compares_only_when_the_previous_period_has_files(monkeypatch):
+    _record_session("now", "v1")
+    scanned = []
+    real_scan = reporter.aggregate_windows
+    monkeypatch.setattr(reporter, "aggregate_windows", lambda windows, **kw: (
+        scanned.append(sorted(windows)) or real_scan(windows, **kw)))
+    assert "Compared to" not in text_report(days=3)
+    assert scanned == [["current"]]
+
+    start, end = window(3, 4)
+    shutil.copy(_day_file(), TELEMETRY_DIR / f"events-{end}.jsonl")
+    assert f"Compared to the Previous Period ({start} to {end})" in text_report(days=3)
+    assert scanned[-1] == ["current", "previous"]
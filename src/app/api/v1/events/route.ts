@@ -21,10 +21,14 @@ const eventSchema = z.object({
     "subagent_stop",
     "pre_compact",
     "error",
+    "tool_rollup",
+    "agent_rollup",
+    "client_report",
   ]),
   session_id: z.string().min(1),
   seq: z.number().int().min(0),
   data: z.record(z.string(), z.unknown()).default({}),
+  event_id: z.string().min(1).max(64).optional(),
 });
 
 const bodySchema = z.object({
@@ -7,18 +7,66 @@ import type { ServiceResult } from "./types";
 // Ingest
 // ---------------------------------------------------------------------------
 
+const ROLLUP_EVENTS = new Set(["tool_rollup", "agent_rollup"]);
+
+/**
+ * Plugin diagnostics (e.g. push queue drop counts). Stored as events but
+ * never attached to a session; aggregates weight them 0 (migration 012).
+ */
+const CLIENT_REPORT_EVENTS = new Set(["client_report"]);
+
+/**
+ * A tool_result with data.span stands for a whole tool call, which plugins in
+ * pair mode send as a tool_use + tool_result (migration 013).
+ */
+const SPAN_WEIGHT = 2;
+
+/**
+ * Number of raw client events an ingested event stands for. Events kept by a
+ * sampling rule carry data.sample_weight (1/rate); rollups already include it
+ * in their event_count (migration 014).
+ */
+function eventWeight(e: IngestEvent): number {
+  if (ROLLUP_EVENTS.has(e.event)) {
+    const count = e.data?.event_count;
+    return typeof count === "number" && count > 0 ? count : 1;
+  }
+  const sampleWeight = e.data?.sample_weight;
+  const base = e.data?.span === true ? SPAN_WEIGHT : 1;
+  return typeof sampleWeight === "number" && sampleWeight > 0 ? base * sampleWeight : base;
+}
+
+/**
+ * Drop events repeating an event_id earlier in the same batch. Ids already
+ * stored are skipped by insert_events (migration 015). Events without an
+ * event_id are always kept.
+ */
+function dropRepeatedEvents(events: IngestEvent[]): IngestEvent[] {
+  const seen = new Set<string>();
+  const unique: IngestEvent[] = [];
+  for (const e of events) {
+    if (e.event_id) {
+      if (seen.has(e.event_id)) continue;
+      seen.add(e.event_id);
+    }
+    unique.push(e);
+  }
+  return unique;
+}
+
 export async function ingestEvents(
   adminClient: SupabaseClient,
   userId: string,
-  events: IngestEvent[]
-): Promise<ServiceResult<{ inserted: number }>> {
-  if (events.length === 0) {
-    return { success: true, data: { inserted: 0 } };
+  received: IngestEvent[]
+): Promise<ServiceResult<{ inserted: number; skipped: number }>> {
+  if (received.length === 0) {
+    return { success: true, data: { inserted: 0, skipped: 0 } };
   }
 
+  const unique = dropRepeatedEvents(received);
+
   // Build rows for the events table
-  const rows = events.map((e) => ({
-    user_id: userId,
+  const rows = unique.map((e) => ({
     session_id: e.session_id,
     event_type: e.event,
     timestamp: e.ts,
@@ -26,11 +74,15 @@ export async function ingestEvents(
     tool_name: (e.data?.tool_name as string) ?? null,
     duration_ms: e.data?.duration_ms != null ? Math.round(e.data.duration_ms as number) : null,
     data: e.data,
+    event_id: e.event_id ?? null,
   }));
 
-  const { error: insertError } = await adminClient
-    .from("events")
-    .insert(rows);
+  // Ids are claimed under a unique key, so of concurrent pushes carrying the
+  // same event (a retry racing a backfill) exactly one stores it.
+  const { data: stored, error: insertError } = await adminClient.rpc("insert_events", {
+    p_user_id: userId,
+    p_rows: rows,
+  });
 
   if (insertError) {
     return {
@@ -43,6 +95,13 @@ export async function ingestEvents(
     };
   }
 
+  const storedIds = new Set(((stored ?? []) as (string | null)[]).filter((id) => id !== null));
+  const events = unique.filter((e) => !e.event_id || storedIds.has(e.event_id));
+  const skipped = received.length - events.length;
+  if (events.length === 0) {
+    return { success: true, data: { inserted: 0, skipped } };
+  }
+
   // -----------------------------------------------------------------------
   // Upsert session records
   // -----------------------------------------------------------------------
@@ -52,21 +111,24 @@ export async function ingestEvents(
   >();
 
   for (const e of events) {
+    if (CLIENT_REPORT_EVENTS.has(e.event)) continue;
     const existing = sessionMap.get(e.session_id);
-    const isTool = e.event === "tool_use" || e.event === "tool_result";
+    const isTool =
+      e.event === "tool_use" || e.event === "tool_result" || e.event === "tool_rollup";
+    const weight = eventWeight(e);
 
     if (!existing) {
       sessionMap.set(e.session_id, {
         minTs: e.ts,
         maxTs: e.ts,
-        eventCount: 1,
-        toolCount: isTool ? 1 : 0,
+        eventCount: weight,
+        toolCount: isTool ? weight : 0,
       });
     } else {
       if (e.ts < existing.minTs) existing.minTs = e.ts;
       if (e.ts > existing.maxTs) existing.maxTs = e.ts;
-      existing.eventCount += 1;
-      if (isTool) existing.toolCount += 1;
+      existing.eventCount += weight;
+      if (isTool) existing.toolCount += weight;
     }
   }
 
@@ -101,8 +163,8 @@ export async function ingestEvents(
           started_at: newStartedAt,
           ended_at: newEndedAt,
           duration_ms: durationMs > 0 ? durationMs : null,
-          event_count: newEventCount,
-          tool_count: newToolCount,
+          event_count: Math.round(newEventCount),
+          tool_count: Math.round(newToolCount),
         })
         .eq("id", existingSession.id);
     } else {
@@ -115,8 +177,8 @@ export async function ingestEvents(
         started_at: info.minTs,
         ended_at: info.maxTs,
         duration_ms: durationMs > 0 ? durationMs : null,
-        event_count: info.eventCount,
-        tool_count: info.toolCount,
+        event_count: Math.round(info.eventCount),
+        tool_count: Math.round(info.toolCount),
       });
     }
   }
@@ -137,7 +199,7 @@ export async function ingestEvents(
     });
   }
 
-  return { success: true, data: { inserted: rows.length } };
+  return { success: true, data: { inserted: events.length, skipped } };
 }
 
 // ---------------------------------------------------------------------------
@@ -7,7 +7,10 @@ export type EventType =
   | "assistant_stop"
   | "subagent_stop"
   | "pre_compact"
-  | "error";
+  | "error"
+  | "tool_rollup"
+  | "agent_rollup"
+  | "client_report";
 
 export interface TelemetryEvent {
   id: string;
@@ -19,6 +22,7 @@ export interface TelemetryEvent {
   tool_name: string | null;
   duration_ms: number | null;
   data: Record<string, unknown>;
+  event_id: string | null;
   created_at: string;
 }
 
@@ -28,6 +32,8 @@ export interface IngestEvent {
   session_id: string;
   seq: number;
   data: Record<string, unknown>;
+  /** Client-computed identity; re-sent events with a known id are skipped. */
+  event_id?: string;
 }
 
 export interface IngestPayload {
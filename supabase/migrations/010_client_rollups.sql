@@ -0,0 +1,164 @@
+-- 010: Client-side rollups
+-- Plugins in "rollup" push mode ship tool_rollup / agent_rollup events that
+-- each stand for data->>'event_count' raw events. Aggregates weight them
+-- accordingly so daily rollups match what raw shipping would have produced.
+
+create or replace function public.event_weight(
+  p_event_type text,
+  p_data jsonb
+) returns integer as $$
+  select case
+    when p_event_type in ('tool_rollup', 'agent_rollup')
+      then greatest(coalesce((p_data->>'event_count')::integer, 1), 1)
+    else 1
+  end;
+$$ language sql immutable;
+
+create or replace function public.update_daily_aggregate(
+  p_user_id uuid,
+  p_date date
+) returns void as $$
+declare
+  v_sessions integer;
+  v_events integer;
+  v_tool_uses integer;
+  v_agent_calls integer;
+  v_total_duration bigint;
+  v_tool_breakdown jsonb;
+  v_hourly jsonb;
+  v_stop_reasons jsonb;
+begin
+  -- Count sessions
+  select count(distinct session_id) into v_sessions
+  from public.events
+  where user_id = p_user_id
+    and timestamp::date = p_date;
+
+  -- Count events
+  select coalesce(sum(public.event_weight(event_type, data)), 0) into v_events
+  from public.events
+  where user_id = p_user_id
+    and timestamp::date = p_date;
+
+  -- Count tool uses
+  select coalesce(sum(public.event_weight(event_type, data)), 0) into v_tool_uses
+  from public.events
+  where user_id = p_user_id
+    and timestamp::date = p_date
+    and event_type in ('tool_use', 'tool_result', 'tool_rollup');
+
+  -- Count agent calls
+  select coalesce(sum(public.event_weight(event_type, data)), 0) into v_agent_calls
+  from public.events
+  where user_id = p_user_id
+    and timestamp::date = p_date
+    and event_type in ('subagent_stop', 'agent_rollup');
+
+  -- Total duration
+  select coalesce(sum(duration_ms), 0) into v_total_duration
+  from public.events
+  where user_id = p_user_id
+    and timestamp::date = p_date
+    and duration_ms is not null;
+
+  -- Tool breakdown
+  select coalesce(jsonb_object_agg(tool_name, cnt), '{}')
+  into v_tool_breakdown
+  from (
+    select tool_name, sum(public.event_weight(event_type, data)) as cnt
+    from public.events
+    where user_id = p_user_id
+      and timestamp::date = p_date
+      and tool_name is not null
+    group by tool_name
+  ) t;
+
+  -- Hourly distribution
+  select coalesce(
+    jsonb_agg(coalesce(hour_count, 0) order by h),
+    '[]'
+  ) into v_hourly
+  from generate_series(0, 23) as h
+  left join (
+    select extract(hour from timestamp)::integer as hour,
+           sum(public.event_weight(event_type, data)) as hour_count
+    from public.events
+    where user_id = p_user_id
+      and timestamp::date = p_date
+    group by extract(hour from timestamp)
+  ) ec on ec.hour = h;
+
+  -- Stop reasons
+  select coalesce(jsonb_object_agg(reason, cnt), '{}')
+  into v_stop_reasons
+  from (
+    select data->>'stop_reason' as reason, count(*) as cnt
+    from public.events
+    where user_id = p_user_id
+      and timestamp::date = p_date
+      and event_type in ('assistant_stop', 'session_end')
+      and data->>'stop_reason' is not null
+    group by data->>'stop_reason'
+  ) sr;
+
+  -- Upsert
+  insert into public.daily_aggregates (
+    user_id, date, sessions, events, tool_uses, agent_calls,
+    total_duration_ms, tool_breakdown, hourly_distribution, stop_reasons
+  ) values (
+    p_user_id, p_date, v_sessions, v_events, v_tool_uses, v_agent_calls,
+    v_total_duration, v_tool_breakdown, v_hourly, v_stop_reasons
+  )
+  on conflict (user_id, date) do update set
+    sessions = excluded.sessions,
+    events = excluded.events,
+    tool_uses = excluded.tool_uses,
+    agent_calls = excluded.agent_calls,
+    total_duration_ms = excluded.total_duration_ms,
+    tool_breakdown = excluded.tool_breakdown,
+    hourly_distribution = excluded.hourly_distribution,
+    stop_reasons = excluded.stop_reasons,
+    updated_at = now();
+end;
+$$ language plpgsql security definer;
+
+-- Top tools: rollups contribute to counts and averages. Percentiles can only
+-- be computed from raw rows, i.e. from the sessions shipped unaggregated.
+create or replace function public.get_top_tools(
+  p_user_id uuid,
+  p_from date,
+  p_to date,
+  p_limit integer default 20
+) returns json as $$
+declare
+  result json;
+begin
+  select coalesce(json_agg(t), '[]') into result
+  from (
+    select
+      tool_name,
+      sum(case when event_type = 'tool_rollup'
+               then coalesce((data->>'count')::integer, 0) else 1 end) as count,
+      round(
+        sum(duration_ms)::numeric / nullif(sum(case
+          when event_type = 'tool_rollup' then coalesce((data->>'count')::integer, 0)
+          when duration_ms is not null then 1
+          else 0 end), 0)
+      ) as avg_duration_ms,
+      percentile_cont(0.5) within group (order by duration_ms)
+        filter (where event_type = 'tool_result') as p50_duration_ms,
+      percentile_cont(0.99) within group (order by duration_ms)
+        filter (where event_type = 'tool_result') as p99_duration_ms
+    from public.events
+    where user_id = p_user_id
+      and timestamp::date between p_from and p_to
+      and tool_name is not null
+      and event_type in ('tool_result', 'tool_rollup')
+    group by tool_name
+    order by count desc
+    limit p_limit
+  ) t;
+
+  return result;
+end;
+$$ language plpgsql security definer;
@@ -0,0 +1,14 @@
+-- 011: Client event ids
+-- The plugin stamps every pushed event with a stable event_id (a hash of its
+-- local identity). Ingestion skips ids it has already stored, which makes
+-- retried pushes and historical backfills safe to re-run.
+--
+-- The events table is partitioned by created_at, so a unique constraint would
+-- have to include it and could not catch re-sends landing in a later month.
+-- Deduplication therefore happens at ingest; this index keeps the lookup cheap.
+
+alter table public.events add column if not exists event_id text;
+
+create index if not exists idx_events_user_event_id
+  on public.events(user_id, event_id)
+  where event_id is not null;
@@ -0,0 +1,17 @@
+-- 013: Tool spans
+-- Plugins in span mode send each tool call as one tool_result event with
+-- data->>'span' = 'true' instead of a tool_use + tool_result pair. Spans
+-- weigh 2 so event, tool-use and per-tool counts match pair mode.
+
+create or replace function public.event_weight(
+  p_event_type text,
+  p_data jsonb
+) returns integer as $$
+  select case
+    when p_event_type = 'client_report' then 0
+    when p_event_type in ('tool_rollup', 'agent_rollup')
+      then greatest(coalesce((p_data->>'event_count')::integer, 1), 1)
+    when p_data->>'span' = 'true' then 2
+    else 1
+  end;
+$$ language sql immutable;
@@ -0,0 +1,60 @@
+-- 015: Unique event ids
+-- Migration 011 skipped known event ids with a lookup before the insert, so a
+-- push and a backfill sending the same event concurrently could both store
+-- it. The events table is partitioned by created_at and cannot carry a unique
+-- index on (user_id, event_id) alone, so ids are claimed in an unpartitioned
+-- table instead. insert_events claims the ids and stores only the events it
+-- won, in one statement.
+
+create table if not exists public.event_ids (
+  user_id uuid not null references auth.users(id) on delete cascade,
+  event_id text not null,
+  primary key (user_id, event_id)
+);
+
+insert into public.event_ids (user_id, event_id)
+  select distinct user_id, event_id
+  from public.events
+  where event_id is not null
+on conflict do nothing;
+
+-- RLS
+alter table public.event_ids enable row level security;
+
+create policy "Service role full access event_ids"
+  on public.event_ids for all
+  using (auth.role() = 'service_role');
+
+-- Insert events (a jsonb array of rows shaped like public.events), skipping
+-- ids already claimed. Returns the event_id of every stored row (null for
+-- events sent without one).
+create or replace function public.insert_events(
+  p_user_id uuid,
+  p_rows jsonb
+) returns setof text as $$
+  with claimed as (
+    insert into public.event_ids (user_id, event_id)
+    select p_user_id, r->>'event_id'
+    from jsonb_array_elements(p_rows) r
+    where r->>'event_id' is not null
+    on conflict do nothing
+    returning event_id
+  )
+  insert into public.events (
+    user_id, session_id, event_type, timestamp, seq, tool_name, duration_ms, data, event_id
+  )
+  select
+    p_user_id,
+    r->>'session_id',
+    r->>'event_type',
+    (r->>'timestamp')::timestamptz,
+    coalesce((r->>'seq')::integer, 0),
+    r->>'tool_name',
+    (r->>'duration_ms')::integer,
+    coalesce(r->'data', '{}'),
+    r->>'event_id'
+  from jsonb_array_elements(p_rows) r
+  where r->>'event_id' is null
+     or r->>'event_id' in (select event_id from claimed)
+  returning event_id;
+$$ language sql security definer;